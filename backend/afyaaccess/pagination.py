@@ -0,0 +1,20 @@
+# afyaaccess/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination shared by the high-volume list endpoints.
+    Views name their ordering in `cursor_ordering` (a timestamp plus id, newest first) and back it
+    with a matching composite index, so page 500 costs the same as page 1 (no OFFSET scan).
+    An OrderingFilter on the view (?ordering=) still takes precedence.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("-created_at", "-id")
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = getattr(view, "cursor_ordering", self.ordering)
+        return super().get_ordering(request, queryset, view)
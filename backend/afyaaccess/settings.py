@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres", # pg_trgm similarity search
     
     #Third party apps
     "rest_framework",
@@ -184,5 +185,16 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # create-react-app default
 ]
 
+# How long stored responses for Idempotency-Key headers on payment endpoints are replayed
+BILLING_IDEMPOTENCY_TTL = timedelta(hours=24)
+
+# Price catalog: this deployment's facility code ("" = catalog-wide prices only) and how often
+# (seconds) each process re-checks the catalog version before reusing its in-memory prices
+BILLING_FACILITY = os.getenv("BILLING_FACILITY", "")
+BILLING_PRICE_CACHE_TTL = int(os.getenv("BILLING_PRICE_CACHE_TTL", "30"))
+
+# Country calling code assumed for local phone numbers (07..., 7...) when normalizing to E.164
+PATIENT_DEFAULT_COUNTRY_CODE = os.getenv("PATIENT_DEFAULT_COUNTRY_CODE", "254")
+
 # Custom user model
 AUTH_USER_MODEL = "users.User"
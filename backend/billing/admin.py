@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Billing, Payment
+from .models import Billing, Payment, ServicePrice
 
 
 # ---------------------------
@@ -80,3 +80,18 @@ class PaymentAdmin(admin.ModelAdmin):
         if not obj.created_by:
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
+
+
+# ---------------------------
+# Service price catalog Admin
+# ---------------------------
+@admin.register(ServicePrice)
+class ServicePriceAdmin(admin.ModelAdmin):
+    """
+    Finance maintains prices here; add a new row with a later effective_from to change a price.
+    Saving/deleting invalidates every worker's cached catalog.
+    """
+    list_display = ("service", "facility", "currency", "amount", "effective_from", "created_at")
+    list_filter = ("service", "facility", "currency")
+    readonly_fields = ("created_at",)
+    ordering = ("service", "facility", "currency", "-effective_from")
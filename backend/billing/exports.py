@@ -0,0 +1,99 @@
+"""
+Streaming exports of the billing ledger (bills or payments) as CSV or NDJSON.
+Rows are read as tuples via values_list().iterator(chunk_size=...) (a server-side cursor on
+PostgreSQL) and written out as they arrive, so memory stays flat however many rows match.
+"""
+import csv
+import json
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Billing, Payment, _start_of_day
+
+EXPORT_CHUNK_SIZE = 2000
+
+BILL_COLUMNS = (
+    "id",
+    "invoice_number",
+    "created_at",
+    "patient_id",
+    "patient_name",
+    "service",
+    "amount",
+    "amount_paid",
+    "balance",
+    "currency",
+    "status",
+    "charged_by_name",
+)
+PAYMENT_COLUMNS = (
+    "id",
+    "created_at",
+    "billing_id",
+    "billing__invoice_number",
+    "billing__patient_id",
+    "billing__service",
+    "billing__currency",
+    "amount",
+    "payment_method",
+    "reference_number",
+    "created_by_id",
+)
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_rows(dataset, date_from=None, date_to=None, service=None, currency=None):
+    """Return (columns, row iterator) for `dataset` ("bills" or "payments") within the filters."""
+    if dataset == "bills":
+        queryset = Billing.objects.report_filter(
+            date_from=date_from, date_to=date_to, service=service, currency=currency
+        ).order_by("created_at", "id")
+        columns = BILL_COLUMNS
+    else:
+        queryset = Payment.objects.order_by("created_at", "id")
+        if date_from:
+            queryset = queryset.filter(created_at__gte=_start_of_day(date_from))
+        if date_to:
+            queryset = queryset.filter(created_at__lt=_start_of_day(date_to + timedelta(days=1)))
+        if service:
+            queryset = queryset.filter(billing__service=service)
+        if currency:
+            queryset = queryset.filter(billing__currency=currency)
+        columns = PAYMENT_COLUMNS
+    return columns, queryset.values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class _Echo:
+    """File-like object whose write() hands the line back (csv.writer into a generator)."""
+
+    def write(self, value):
+        return value
+
+
+# Leading characters that make spreadsheets evaluate a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value):
+    """Neutralize formula injection: text cells starting like a formula get a leading quote."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([column.replace("__", "_") for column in columns])
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def stream_ndjson(columns, rows):
+    keys = [column.replace("__", "_") for column in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(keys, row)), cls=DjangoJSONEncoder) + "\n"
@@ -0,0 +1,99 @@
+"""
+`Idempotency-Key` support for payment endpoints.
+
+The first request with a key claims a row (one INSERT; the unique constraint settles races),
+runs the view and stores its response. Retries with the same key get that response back
+from a single SELECT, without running the view again:
+- same key, different body -> 422
+- same key while the first request is still running -> 409
+Server errors are not stored, so the client can retry them with the same key.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def _request_hash(request):
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _claim(key, scope, user, request_hash):
+    """Return (record, False) for a live key, else insert an in-flight row and return (record, True)."""
+    now = timezone.now()
+    lookup = {"key": key, "scope": scope, "user": user}
+    record = IdempotencyKey.objects.filter(**lookup).first()
+    if record is not None:
+        if record.expires_at > now:
+            return record, False
+        record.delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                request_hash=request_hash, expires_at=now + settings.BILLING_IDEMPOTENCY_TTL, **lookup
+            )
+        return record, True
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(**lookup).first(), False
+
+
+def idempotent(view_method):
+    """Make a ViewSet action replay its stored response for a repeated Idempotency-Key."""
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"detail": f"{HEADER} is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user if request.user.is_authenticated else None
+        scope = f"{getattr(self, 'basename', type(self).__name__)}:{self.action}:{kwargs.get('pk', '')}"
+        request_hash = _request_hash(request)
+        record, created = _claim(key, scope, user, request_hash)
+
+        if not created:
+            if record is None:
+                # Claimed and released by a failing concurrent request; let the client retry
+                return Response({"detail": f"{HEADER} is being reused, retry"}, status=status.HTTP_409_CONFLICT)
+            if record.request_hash != request_hash:
+                return Response(
+                    {"detail": f"{HEADER} was already used with a different request body"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if record.response_status is None:
+                return Response(
+                    {"detail": "A request with this Idempotency-Key is still being processed"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            response = Response(record.response_body, status=record.response_status)
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            record.response_status = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=["response_status", "response_body"])
+        return response
+
+    return wrapper
@@ -0,0 +1,51 @@
+"""
+Invoice numbers from a per-day counter table: INV-AA-YYYYMMDD-NNNNNN.
+
+One upsert (INSERT ... ON CONFLICT (day) DO UPDATE ... RETURNING) bumps the day's counter by
+the block size and returns the new high-water mark, so numbers are allocated without reading
+first and without retries. Numbers increase monotonically within a day and sort by creation
+order; a failed insert after allocation leaves a gap, as a database sequence would.
+"""
+from collections import defaultdict
+
+from django.db import connection
+from django.utils import timezone
+
+INVOICE_PREFIX = "INV-AA"
+
+
+def format_invoice_number(day, number):
+    return f"{INVOICE_PREFIX}-{day:%Y%m%d}-{number:06d}"
+
+
+def allocate_invoice_numbers(count=1, day=None):
+    """Reserve a block of `count` consecutive invoice numbers for `day` (default today) in one statement."""
+    from .models import InvoiceCounter  # local import: models imports this module
+
+    if count < 1:
+        return []
+    day = day or timezone.localdate()
+    qn = connection.ops.quote_name
+    table = qn(InvoiceCounter._meta.db_table)
+    sql = (
+        f"INSERT INTO {table} ({qn('day')}, {qn('last_number')}) VALUES (%s, %s) "
+        f"ON CONFLICT ({qn('day')}) DO UPDATE SET "
+        f"{qn('last_number')} = {table}.{qn('last_number')} + EXCLUDED.{qn('last_number')} "
+        f"RETURNING {qn('last_number')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [day, count])
+        last = cursor.fetchone()[0]
+    return [format_invoice_number(day, number) for number in range(last - count + 1, last + 1)]
+
+
+def assign_invoice_numbers(bills):
+    """Fill missing invoice numbers on unsaved bills (e.g. before bulk_create), one block per day."""
+    by_day = defaultdict(list)
+    for bill in bills:
+        if not bill.invoice_number:
+            by_day[timezone.localdate(bill.created_at) if bill.created_at else timezone.localdate()].append(bill)
+    for day, day_bills in by_day.items():
+        for bill, number in zip(day_bills, allocate_invoice_numbers(len(day_bills), day)):
+            bill.invoice_number = number
+    return bills
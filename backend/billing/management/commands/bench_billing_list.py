@@ -0,0 +1,99 @@
+"""
+Benchmark BillingViewSet list/search: query count and latency per page size.
+Seeds synthetic bills/payments inside a transaction that is always rolled back,
+so it is safe to run against a development database.
+
+Usage: python manage.py bench_billing_list --bills 2000 --page-sizes 10,50,100,500
+"""
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from billing.models import Billing, Payment
+from billing.views import BillingViewSet
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = "Measure query count and latency of the billing list/search endpoints across page sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bills", type=int, default=1000, help="Synthetic bills to seed (default 1000).")
+        parser.add_argument("--patients", type=int, default=50, help="Synthetic patients to spread bills over.")
+        parser.add_argument("--page-sizes", default="10,50,100,500", help="Comma separated page sizes.")
+        parser.add_argument("--repeat", type=int, default=5, help="Requests per page size (best time reported).")
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options["page_sizes"].split(",") if size.strip()]
+
+        with transaction.atomic():
+            user = self._seed(options["bills"], options["patients"])
+            self.stdout.write(f"{'endpoint':<8} {'page_size':>9} {'queries':>8} {'best_ms':>9}")
+            for endpoint in ("list", "search"):
+                for size in page_sizes:
+                    queries, best_ms = self._measure(endpoint, size, user, options["repeat"])
+                    self.stdout.write(f"{endpoint:<8} {size:>9} {queries:>8} {best_ms:>9.1f}")
+            # Never keep the synthetic rows
+            transaction.set_rollback(True)
+
+    def _seed(self, bill_count, patient_count):
+        """Bulk insert synthetic rows (bypasses save hooks; totals are set directly)."""
+        user = get_user_model().objects.create(username="bench-billing-list")
+        patients = Patient.objects.bulk_create(
+            [Patient(first_name=f"Bench{i}", last_name="Patient") for i in range(patient_count)]
+        )
+        amount = Decimal("1000.00")
+        bills = Billing.objects.bulk_create(
+            [
+                Billing(
+                    patient=patients[i % patient_count],
+                    patient_name=f"Bench{i % patient_count} Patient",
+                    amount=amount,
+                    amount_paid=Decimal("500.00"),
+                    balance=Decimal("500.00"),
+                    status=Billing.STATUS_PARTIAL,
+                    invoice_number=f"INV-BENCH-{i:08d}",
+                    charged_by=user,
+                )
+                for i in range(bill_count)
+            ]
+        )
+        Payment.objects.bulk_create(
+            [
+                Payment(billing=bill, amount=Decimal("250.00"), payment_method="cash", created_by=user)
+                for bill in bills
+                for _ in range(2)
+            ]
+        )
+        return user
+
+    def _measure(self, endpoint, page_size, user, repeat):
+        """Return (queries per request, best latency in ms) for one endpoint/page size."""
+        pagination = type("BenchPagination", (PageNumberPagination,), {"page_size": page_size})
+        view = BillingViewSet.as_view({"get": endpoint}, pagination_class=pagination)
+        factory = APIRequestFactory()
+        params = {"q": "Bench"} if endpoint == "search" else {}
+        # Pagination builds absolute next/previous links, so use a host the project accepts
+        host = next((h for h in settings.ALLOWED_HOSTS if h and h != "*" and not h.startswith(".")), "localhost")
+
+        queries, best = 0, None
+        for _ in range(repeat):
+            request = factory.get(
+                f"/api/billing/{'search/' if endpoint == 'search' else ''}", params, HTTP_HOST=host
+            )
+            force_authenticate(request, user=user)
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = view(request)
+                response.render()
+                elapsed = (time.perf_counter() - start) * 1000
+            queries = len(ctx)
+            best = elapsed if best is None else min(best, elapsed)
+        return queries, best
@@ -0,0 +1,16 @@
+"""
+Delete expired Idempotency-Key records (stored payment endpoint responses).
+Expired keys are also replaced lazily when reused; run this from cron to keep the table small.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from billing.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys whose TTL has passed."
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency key(s)."))
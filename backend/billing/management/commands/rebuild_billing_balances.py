@@ -0,0 +1,77 @@
+"""
+Rebuild Billing.amount_paid / Billing.balance from the Payment ledger and report drift.
+The BillingDailyRollup rows of the days the repaired bills belong to are rebuilt as well, so
+reports read the corrected totals. Safe to re-run: rows that already match the ledger are
+left untouched.
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+from billing.models import MONEY_FIELD, Billing
+from billing.rollups import _day, rebuild_rollups
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized billing totals from payments and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report drift, do not write.")
+        parser.add_argument("--limit", type=int, default=50, help="Max drifted rows to print (default 50).")
+
+    def handle(self, *args, **options):
+        # Rows whose stored totals disagree with the ledger sum (computed in SQL, one query)
+        drifted = (
+            Billing.objects.with_ledger_paid()
+            .annotate(
+                ledger_balance=Greatest(F("amount") - F("ledger_paid"), Value(Decimal("0.00")), output_field=MONEY_FIELD)
+            )
+            .filter(~Q(amount_paid=F("ledger_paid")) | ~Q(balance=F("ledger_balance")))
+            .order_by("pk")
+        )
+        rows = drifted.values_list(
+            "pk", "invoice_number", "amount_paid", "ledger_paid", "balance", "ledger_balance", "created_at"
+        )
+
+        count = 0
+        drifted_pks = []
+        days = set()
+        for pk, invoice, stored_paid, ledger_paid, stored_balance, ledger_balance, created_at in rows.iterator(
+            chunk_size=2000
+        ):
+            if count < options["limit"]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Drift on {invoice or pk}: amount_paid {stored_paid} -> {ledger_paid}, "
+                        f"balance {stored_balance} -> {ledger_balance}"
+                    )
+                )
+            drifted_pks.append(pk)
+            days.add(_day(created_at))
+            count += 1
+
+        if count == 0:
+            self.stdout.write(self.style.SUCCESS("No drift found: billing totals match the payment ledger."))
+        else:
+            self.stdout.write(f"{count} billing record(s) drifted from the payment ledger.")
+
+        if options["dry_run"]:
+            self.stdout.write("Dry run: no changes written.")
+            return
+
+        # Rewrite only the drifted rows, in batches, each as a single set-based UPDATE
+        updated = 0
+        with transaction.atomic():
+            for start in range(0, len(drifted_pks), BATCH_SIZE):
+                updated += Billing.objects.filter(pk__in=drifted_pks[start:start + BATCH_SIZE]).sync_ledger()
+            # Daily rollups summed the drifted totals: recompute the affected days from the tables
+            for day in sorted(days):
+                rebuild_rollups(day, day)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt totals on {updated} billing record(s) and rollups for {len(days)} day(s).")
+        )
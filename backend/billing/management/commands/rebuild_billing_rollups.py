@@ -0,0 +1,29 @@
+"""
+Backfill / repair BillingDailyRollup from the Billing and Payment tables.
+Rows are normally maintained incrementally; run this after imports, raw SQL fixes or
+set-based updates that bypass the model layer.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from billing.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute billing daily rollups for a date range (default: all history)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", help="First day to rebuild (YYYY-MM-DD, inclusive).")
+        parser.add_argument("--date-to", help="Last day to rebuild (YYYY-MM-DD, inclusive).")
+
+    def handle(self, *args, **options):
+        bounds = {}
+        for name in ("date_from", "date_to"):
+            raw = options.get(name)
+            if raw:
+                bounds[name] = parse_date(raw)
+                if bounds[name] is None:
+                    raise CommandError(f"--{name.replace('_', '-')} must be YYYY-MM-DD")
+
+        written = rebuild_rollups(**bounds)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} billing rollup row(s)."))
@@ -0,0 +1,101 @@
+"""
+Stress test concurrent payment application against a single bill.
+Fires --threads workers (own DB connection each) posting --payments small payments, then
+races one mark_paid-style pay_balance call per worker over what is left, and checks the bill:
+amount_paid must equal the ledger, nothing may be overpaid by the balance payers, and status
+must match the totals.
+Creates real rows (the workers need committed data) and deletes them afterwards.
+
+Usage: python manage.py stress_billing_payments --threads 16 --payments 400
+"""
+import queue
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from billing.models import Billing
+from billing.services import apply_payment, pay_balance
+
+
+class Command(BaseCommand):
+    help = "Race concurrent payments against one bill and report correctness and throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent workers (default 8).")
+        parser.add_argument("--payments", type=int, default=200, help="Partial payments to post (default 200).")
+        parser.add_argument("--amount", default="5.00", help="Amount of each partial payment (default 5.00).")
+
+    def handle(self, *args, **options):
+        if not connection.features.has_select_for_update:
+            raise CommandError("Needs a database with SELECT ... FOR UPDATE (PostgreSQL).")
+
+        threads, count = options["threads"], options["payments"]
+        amount = Decimal(options["amount"])
+        user, _ = get_user_model().objects.get_or_create(username="stress-billing-payments")
+        # The last partial payment leaves one unit outstanding for the balance payers to race over
+        bill = Billing.objects.create(service="other", amount=amount * count + Decimal("1.00"), charged_by=user)
+
+        errors = []
+
+        def race(jobs):
+            """Run `jobs` (callables taking a freshly loaded bill) on the worker threads."""
+            pending = queue.SimpleQueue()
+            for job in jobs:
+                pending.put(job)
+
+            def worker():
+                try:
+                    while True:
+                        try:
+                            job = pending.get_nowait()
+                        except queue.Empty:
+                            break
+                        job(Billing.objects.get(pk=bill.pk))
+                except Exception as exc:  # surfaced in the report below
+                    errors.append(exc)
+                finally:
+                    connections.close_all()
+
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+
+        def partial(job):
+            return lambda target: apply_payment(
+                target, amount, method="cash", reference=f"STRESS-{bill.pk}-{job}", user=user
+            )
+
+        start = time.perf_counter()
+        # Partial payments race each other (lost updates), then the balance payers race over the
+        # last unit once every partial payment has landed (overpayment)
+        race([partial(job) for job in range(count)])
+        race([lambda target: pay_balance(target, method="cash", user=user)] * threads)
+        elapsed = time.perf_counter() - start
+
+        try:
+            bill.refresh_from_db()
+            ledger = bill.ledger_paid_amount()
+            payments = bill.payments.count()
+            self.stdout.write(f"threads={threads} payments={payments} elapsed={elapsed:.2f}s "
+                              f"throughput={payments / elapsed:.1f} payments/s")
+            self.stdout.write(f"amount={bill.amount} amount_paid={bill.amount_paid} ledger={ledger} "
+                              f"balance={bill.balance} status={bill.status}")
+            problems = [f"{len(errors)} worker error(s): {errors[0]!r}"] if errors else []
+            if bill.amount_paid != ledger:
+                problems.append("stored amount_paid does not match the payment ledger")
+            if ledger != bill.amount:
+                problems.append("bill is over- or under-paid")
+            if bill.status != Billing.STATUS_PAID or payments != count + 1:
+                problems.append("expected a paid bill with exactly one balance payment")
+        finally:
+            bill.delete()
+
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("No lost updates or overpayment."))
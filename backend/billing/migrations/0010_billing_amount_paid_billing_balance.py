@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:57
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_ledger_columns(apps, schema_editor):
+    """Populate amount_paid/balance from existing payments in one UPDATE."""
+    Billing = apps.get_model("billing", "Billing")
+    Payment = apps.get_model("billing", "Payment")
+    money = DecimalField(max_digits=12, decimal_places=2)
+    ledger_sum = (
+        Payment.objects.filter(billing=OuterRef("pk"))
+        .order_by()
+        .values("billing")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    paid = Coalesce(
+        Subquery(ledger_sum, output_field=money), Value(Decimal("0.00")), output_field=money
+    )
+    Billing.objects.update(
+        amount_paid=paid,
+        balance=Greatest(F("amount") - paid, Value(Decimal("0.00")), output_field=money),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0009_alter_billing_amount_alter_billing_charged_by_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="billing",
+            name="amount_paid",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal("0.00"),
+                editable=False,
+                help_text="Sum of payments applied to this bill (denormalized from Payment)",
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="billing",
+            name="balance",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal("0.00"),
+                editable=False,
+                help_text="Outstanding balance, never negative (denormalized from Payment)",
+                max_digits=12,
+            ),
+        ),
+        migrations.RunPython(backfill_ledger_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0010_billing_amount_paid_billing_balance"),
+        ("lab", "0002_alter_labrequest_options_alter_labresult_options_and_more"),
+        ("patients", "0010_alter_patientstatushistory_options_and_more"),
+        ("pharmacy", "0002_alter_dispenseline_quantity_dispensed_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="billing",
+            index=models.Index(
+                fields=["patient", "-created_at", "-id"],
+                name="billing_bil_patient_b0eb5a_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0011_billing_patient_created_index"),
+        ("lab", "0002_alter_labrequest_options_alter_labresult_options_and_more"),
+        ("patients", "0010_alter_patientstatushistory_options_and_more"),
+        ("pharmacy", "0002_alter_dispenseline_quantity_dispensed_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="billing",
+            index=models.Index(
+                fields=["status", "created_at"], name="billing_bil_status_fb97cd_idx"
+            ),
+        ),
+    ]
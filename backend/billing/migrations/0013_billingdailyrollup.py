@@ -0,0 +1,145 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:04
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """Seed the rollup table from existing bills and payments (two grouped queries)."""
+    Billing = apps.get_model("billing", "Billing")
+    Payment = apps.get_model("billing", "Payment")
+    BillingDailyRollup = apps.get_model("billing", "BillingDailyRollup")
+    zero = Value(Decimal("0.00"))
+
+    bill_rows = (
+        Billing.objects.order_by()
+        .annotate(day=TruncDate("created_at"), service_key=Coalesce("service", Value("")))
+        .values("day", "service_key", "status", "currency")
+        .annotate(
+            bill_count=Count("id"),
+            billed_amount=Coalesce(Sum("amount"), zero),
+            paid_amount=Coalesce(Sum("amount_paid"), zero),
+            balance_amount=Coalesce(Sum("balance"), zero),
+        )
+    )
+    payment_rows = (
+        Payment.objects.order_by()
+        .annotate(
+            day=TruncDate("created_at"),
+            service_key=Coalesce("billing__service", Value("")),
+        )
+        .values("day", "service_key", "billing__currency", "payment_method")
+        .annotate(payment_count=Count("id"), payment_amount=Coalesce(Sum("amount"), zero))
+    )
+
+    objs = [
+        BillingDailyRollup(
+            day=row["day"],
+            service=row["service_key"],
+            status=row["status"],
+            currency=row["currency"],
+            payment_method="",
+            bill_count=row["bill_count"],
+            billed_amount=row["billed_amount"],
+            paid_amount=row["paid_amount"],
+            balance_amount=row["balance_amount"],
+        )
+        for row in bill_rows
+    ]
+    objs += [
+        BillingDailyRollup(
+            day=row["day"],
+            service=row["service_key"],
+            status="",
+            currency=row["billing__currency"],
+            payment_method=row["payment_method"] or "",
+            payment_count=row["payment_count"],
+            payment_amount=row["payment_amount"],
+        )
+        for row in payment_rows
+    ]
+    BillingDailyRollup.objects.bulk_create(objs, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0012_billing_status_created_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BillingDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "day",
+                    models.DateField(
+                        help_text="Bill creation day (bill rows) or payment day (payment rows)"
+                    ),
+                ),
+                ("service", models.CharField(blank=True, default="", max_length=100)),
+                ("status", models.CharField(blank=True, default="", max_length=12)),
+                ("currency", models.CharField(default="KES", max_length=6)),
+                (
+                    "payment_method",
+                    models.CharField(blank=True, default="", max_length=50),
+                ),
+                ("bill_count", models.IntegerField(default=0)),
+                (
+                    "billed_amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "paid_amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "balance_amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                ("payment_count", models.IntegerField(default=0)),
+                (
+                    "payment_amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Billing Daily Rollup",
+                "verbose_name_plural": "Billing Daily Rollups",
+                "ordering": ["-day"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "day",
+                            "service",
+                            "status",
+                            "currency",
+                            "payment_method",
+                        ),
+                        name="billing_daily_rollup_key",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
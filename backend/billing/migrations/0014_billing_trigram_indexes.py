@@ -0,0 +1,37 @@
+# Trigram (pg_trgm) GIN indexes behind billing search.
+# PostgreSQL only: other backends (local SQLite) keep the plain btree indexes.
+
+from django.db import migrations
+
+TRIGRAM_INDEXES = (
+    ("billing_patient_name_trgm", "patient_name"),
+    ("billing_invoice_number_trgm", "invoice_number"),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON billing_billing USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0013_billingdailyrollup"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
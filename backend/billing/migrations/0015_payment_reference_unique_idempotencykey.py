@@ -0,0 +1,109 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:11
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def suffix_duplicate_references(apps, schema_editor):
+    """Keep the oldest payment per (bill, reference); suffix the rest so the unique index applies."""
+    Payment = apps.get_model("billing", "Payment")
+    duplicates = (
+        Payment.objects.filter(reference_number__isnull=False)
+        .values("billing_id", "reference_number")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+    )
+    for dup in duplicates:
+        extra = Payment.objects.filter(
+            billing_id=dup["billing_id"], reference_number=dup["reference_number"]
+        ).order_by("created_at", "id")[1:]
+        for payment in extra:
+            payment.reference_number = f"{payment.reference_number}-dup{payment.pk}"[:128]
+            payment.save(update_fields=["reference_number"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0014_billing_trigram_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255)),
+                (
+                    "scope",
+                    models.CharField(
+                        help_text="Endpoint (and object) the key was used on",
+                        max_length=128,
+                    ),
+                ),
+                (
+                    "request_hash",
+                    models.CharField(
+                        help_text="SHA-256 of the request body", max_length=64
+                    ),
+                ),
+                (
+                    "response_status",
+                    models.PositiveSmallIntegerField(
+                        blank=True, help_text="Empty while in flight", null=True
+                    ),
+                ),
+                (
+                    "response_body",
+                    models.JSONField(
+                        blank=True,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        null=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Idempotency Key",
+                "verbose_name_plural": "Idempotency Keys",
+            },
+        ),
+        migrations.RunPython(suffix_duplicate_references, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="payment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("reference_number__isnull", False)),
+                fields=("billing", "reference_number"),
+                name="payment_unique_billing_reference",
+            ),
+        ),
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="idempotencykey",
+            constraint=models.UniqueConstraint(
+                fields=("key", "scope", "user"), name="billing_idempotency_key_unique"
+            ),
+        ),
+    ]
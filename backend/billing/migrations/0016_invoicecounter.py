@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:13
+
+from datetime import datetime
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    """
+    Start each day's counter above any legacy uuid-token invoice whose suffix happens to be
+    all digits, so new INV-AA-YYYYMMDD-NNNNNN numbers cannot collide with old ones.
+    """
+    Billing = apps.get_model("billing", "Billing")
+    InvoiceCounter = apps.get_model("billing", "InvoiceCounter")
+    highest = {}
+    numbers = Billing.objects.filter(invoice_number__startswith="INV-AA-").values_list(
+        "invoice_number", flat=True
+    )
+    for number in numbers.iterator(chunk_size=2000):
+        parts = number.split("-")
+        if len(parts) != 4 or not (parts[2].isdigit() and parts[3].isdigit()):
+            continue
+        try:
+            day = datetime.strptime(parts[2], "%Y%m%d").date()
+        except ValueError:
+            continue
+        highest[day] = max(highest.get(day, 0), int(parts[3]))
+    InvoiceCounter.objects.bulk_create(
+        [InvoiceCounter(day=day, last_number=last) for day, last in highest.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0015_payment_reference_unique_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoiceCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("last_number", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Invoice Counter",
+                "verbose_name_plural": "Invoice Counters",
+            },
+        ),
+        migrations.AlterField(
+            model_name="billing",
+            name="invoice_number",
+            field=models.CharField(
+                blank=True,
+                help_text="Invoice id like INV-AA-YYYYMMDD-NNNNNN",
+                max_length=64,
+                null=True,
+                unique=True,
+            ),
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:18
+
+from datetime import date
+from decimal import Decimal
+
+import django.core.validators
+
+from django.db import migrations, models
+
+# Prices that were hardcoded in SERVICE_DEFAULT_AMOUNTS (KES), effective for all history
+SEED_PRICES = {
+    "consultation": 1000,
+    "laboratory": 1200,
+    "imaging": 3000,
+    "pharmacy": 2500,
+    "minor_procedure": 3000,
+    "surgery": 100000,
+    "admission": 8000,
+    "maternity": 70000,
+    "physiotherapy": 2000,
+    "specialist_consultation": 4000,
+}
+
+
+def seed_prices(apps, schema_editor):
+    ServicePrice = apps.get_model("billing", "ServicePrice")
+    PriceCatalogVersion = apps.get_model("billing", "PriceCatalogVersion")
+    ServicePrice.objects.bulk_create(
+        [
+            ServicePrice(
+                service=service,
+                facility="",
+                currency="KES",
+                amount=Decimal(amount),
+                effective_from=date(2000, 1, 1),
+            )
+            for service, amount in SEED_PRICES.items()
+        ]
+    )
+    PriceCatalogVersion.objects.update_or_create(pk=1, defaults={"version": 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0017_billing_open_balance_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceCatalogVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ServicePrice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "service",
+                    models.CharField(
+                        choices=[
+                            ("consultation", "Consultation"),
+                            ("laboratory", "Laboratory"),
+                            ("imaging", "Imaging"),
+                            ("pharmacy", "Pharmacy"),
+                            ("minor_procedure", "Minor Procedure"),
+                            ("surgery", "Surgery"),
+                            ("admission", "Admission"),
+                            ("maternity", "Maternity"),
+                            ("physiotherapy", "Physiotherapy"),
+                            ("specialist_consultation", "Specialist Consultation"),
+                        ],
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "facility",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Facility code; blank = all facilities",
+                        max_length=64,
+                    ),
+                ),
+                ("currency", models.CharField(default="KES", max_length=6)),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=12,
+                        validators=[
+                            django.core.validators.MinValueValidator(Decimal("0.00"))
+                        ],
+                    ),
+                ),
+                (
+                    "effective_from",
+                    models.DateField(help_text="First day this price applies"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Service Price",
+                "verbose_name_plural": "Service Prices",
+                "ordering": ["service", "facility", "currency", "-effective_from"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("service", "facility", "currency", "effective_from"),
+                        name="billing_service_price_key",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(seed_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:13
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Replaced: raw-column trigram indexes from 0014 (unusable for UPPER(col) LIKE / similarity filters)
+OLD_TRIGRAM_INDEXES = (
+    ("billing_patient_name_trgm", "patient_name"),
+    ("billing_invoice_number_trgm", "invoice_number"),
+)
+
+
+def drop_old_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _column in OLD_TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def restore_old_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, column in OLD_TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON billing_billing USING gin ({column} gin_trgm_ops)"
+        )
+
+
+class AddTrigramIndex(migrations.AddIndex):
+    """AddIndex that only touches PostgreSQL: other backends (local SQLite) search with LIKE."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0019_payment_billing_payment_created_idx"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(drop_old_trigram_indexes, restore_old_trigram_indexes),
+        AddTrigramIndex(
+            model_name="billing",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("patient_name"),
+                    name="gin_trgm_ops",
+                ),
+                name="billing_patient_name_trgm",
+            ),
+        ),
+        AddTrigramIndex(
+            model_name="billing",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("invoice_number"),
+                    name="gin_trgm_ops",
+                ),
+                name="billing_invoice_number_trgm",
+            ),
+        ),
+        AddTrigramIndex(
+            model_name="billing",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("service"),
+                    name="gin_trgm_ops",
+                ),
+                name="billing_service_trgm",
+            ),
+        ),
+        AddTrigramIndex(
+            model_name="billing",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("charged_by_name"),
+                    name="gin_trgm_ops",
+                ),
+                name="billing_charged_by_name_trgm",
+            ),
+        ),
+    ]
@@ -1,13 +1,17 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
 from decimal import Decimal
-import uuid
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Sum
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Upper
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 
-# Keep your original default service prices mapping (KES)
+# Original service list and default prices (KES); seeds the ServicePrice catalog (migration 0018)
 SERVICE_DEFAULT_AMOUNTS = {
     "consultation": 1000,
     "laboratory": 1200,
@@ -22,6 +26,64 @@ SERVICE_DEFAULT_AMOUNTS = {
 }
 
 
+# Output type used by ledger expressions (matches Billing.amount)
+MONEY_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _start_of_day(day):
+    """Aware datetime for midnight (current timezone) at the start of `day`."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# Accounts-receivable aging buckets: (name, min age in days, max age in days or None)
+AGING_BUCKETS = (
+    ("days_0_30", 0, 30),
+    ("days_31_60", 31, 60),
+    ("days_61_90", 61, 90),
+    ("days_90_plus", 91, None),
+)
+
+
+def money_sum(field, condition=None):
+    """Sum(field, filter=condition) that yields 0.00 instead of NULL."""
+    return Coalesce(Sum(field, filter=condition), Value(Decimal("0.00")), output_field=MONEY_FIELD)
+
+
+def summarize_report_rows(rows):
+    """
+    Fold per-service rows (total/paid/unpaid/partial/cancelled/collected/outstanding)
+    into the dashboard response shape used by BillingViewSet.reports.
+    """
+    def total_of(key):
+        return sum((row[key] for row in rows), Decimal("0.00"))
+
+    return {
+        "total_paid": total_of("paid"),
+        "total_unpaid": total_of("unpaid"),
+        "total_partial": total_of("partial"),
+        "total_cancelled": total_of("cancelled"),
+        "total_collected": total_of("collected"),
+        "total_outstanding": total_of("outstanding"),
+        "by_service": sorted(
+            ({"service": row["service"] or None, "total": row["total"]} for row in rows),
+            key=lambda row: row["total"],
+            reverse=True,
+        ),
+    }
+
+
+def _ledger_paid_expression():
+    """Correlated subquery: SUM(payments.amount) for the outer Billing row (0.00 when none)."""
+    ledger_sum = (
+        Payment.objects.filter(billing=OuterRef("pk"))
+        .order_by()
+        .values("billing")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    return Coalesce(Subquery(ledger_sum, output_field=MONEY_FIELD), Value(Decimal("0.00")), output_field=MONEY_FIELD)
+
+
 class BillingQuerySet(models.QuerySet):
     """Custom queryset with helpful aggregation helpers used by reports/views."""
 
@@ -44,15 +106,79 @@ class BillingQuerySet(models.QuerySet):
         """Return totals grouped by service (list of dicts when evaluated)."""
         return self.values("service").annotate(total=Sum("amount")).order_by("-total")
 
-    def by_patient_name_or_id(self, search_term):
-        """Search helper by patient fields or cached patient_name (keeps search flexible)."""
-        return self.filter(
-            models.Q(patient__first_name__icontains=search_term)
-            | models.Q(patient__last_name__icontains=search_term)
-            | models.Q(patient__id__icontains=search_term)
-            | models.Q(patient_name__icontains=search_term)
+    def report_filter(self, date_from=None, date_to=None, service=None, currency=None):
+        """
+        Apply optional dashboard filters. Dates are inclusive and turned into a half-open
+        created_at range (no per-row date cast) so the (status, created_at) index applies.
+        """
+        qs = self
+        if date_from:
+            qs = qs.filter(created_at__gte=_start_of_day(date_from))
+        if date_to:
+            qs = qs.filter(created_at__lt=_start_of_day(date_to + timedelta(days=1)))
+        if service:
+            qs = qs.filter(service=service)
+        if currency:
+            qs = qs.filter(currency=currency)
+        return qs
+
+    def report_summary(self):
+        """
+        Dashboard totals in a single grouped scan: one row per service with conditional
+        (FILTER/CASE) sums per status; overall totals are summed from those rows in Python.
+        Returns a dict shaped like the BillingViewSet.reports response.
+        """
+        not_cancelled = ~Q(status=Billing.STATUS_CANCELLED)
+        rows = list(
+            self.order_by()
+            .values("service")
+            .annotate(
+                total=money_sum("amount"),
+                paid=money_sum("amount", Q(status=Billing.STATUS_PAID)),
+                unpaid=money_sum("amount", ~Q(status=Billing.STATUS_PAID)),
+                partial=money_sum("amount", Q(status=Billing.STATUS_PARTIAL)),
+                cancelled=money_sum("amount", Q(status=Billing.STATUS_CANCELLED)),
+                collected=money_sum("amount_paid", not_cancelled),
+                outstanding=money_sum("balance", not_cancelled),
+            )
+        )
+
+        return summarize_report_rows(rows)
+
+    def aging(self, *group_fields, as_of=None):
+        """
+        Accounts-receivable aging in one grouped scan: outstanding balance per group split into
+        AGING_BUCKETS by bill age on `as_of` (default today). Bucket edges are created_at
+        thresholds (index friendly, no per-row date math). Cancelled and settled bills are
+        skipped; balances are the stored ledger totals (kept in sync under the bill row lock).
+        """
+        as_of = as_of or timezone.localdate()
+        annotations = {"bill_count": models.Count("id"), "total": money_sum("balance")}
+        for name, low, high in AGING_BUCKETS:
+            condition = Q()
+            if low:
+                condition &= Q(created_at__lt=_start_of_day(as_of - timedelta(days=low - 1)))
+            if high is not None:
+                condition &= Q(created_at__gte=_start_of_day(as_of - timedelta(days=high)))
+            annotations[name] = money_sum("balance", condition)
+        return (
+            self.exclude(status=Billing.STATUS_CANCELLED)
+            .filter(balance__gt=0, created_at__lt=_start_of_day(as_of + timedelta(days=1)))
+            .values(*group_fields)
+            .annotate(**annotations)
+            .order_by("-total", *group_fields)
         )
 
+    def by_patient_name_or_id(self, search_term):
+        """
+        Search by cached patient_name, invoice number, service, cashier name, patient number or patient id.
+        Exact identifiers use their unique indexes; free text uses the pg_trgm indexes and
+        comes back ranked by similarity (see billing/search.py).
+        """
+        from .search import search_bills
+
+        return search_bills(self, search_term)
+
     def total_for_patient(self, patient_id):
         """
         Convenience: total expected billing amount for a given patient (sums all bills).
@@ -61,6 +187,47 @@ class BillingQuerySet(models.QuerySet):
         total = self.filter(patient__id=patient_id).aggregate(total=Sum("amount"))["total"]
         return total or Decimal("0.00")
 
+    def patient_bills_map(self, patient_ids):
+        """
+        All bills for the given patients in one query, grouped by patient_id.
+        Used by list endpoints so `patient_bills` costs one query per page, not one per row.
+        """
+        grouped = defaultdict(list)
+        rows = (
+            self.filter(patient_id__in=set(patient_ids))
+            .order_by("patient_id", "-created_at")
+            .values("patient_id", "service", "amount", "is_paid", "charged_at", "invoice_number", "status")
+        )
+        for row in rows:
+            grouped[row.pop("patient_id")].append(row)
+        return grouped
+
+    # -------------------------
+    # Denormalized ledger columns (amount_paid / balance)
+    # -------------------------
+    def with_ledger_paid(self):
+        """Annotate `ledger_paid`: the payment sum recomputed from the Payment ledger."""
+        return self.annotate(ledger_paid=_ledger_paid_expression())
+
+    def apply_payment_delta(self, delta):
+        """
+        Atomically shift the stored amount_paid/balance by `delta` in a single UPDATE.
+        Both right-hand sides see the pre-update row, so balance uses the old amount_paid.
+        """
+        delta = Value(Decimal(str(delta)), output_field=MONEY_FIELD)
+        return self.update(
+            amount_paid=F("amount_paid") + delta,
+            balance=Greatest(F("amount") - F("amount_paid") - delta, Value(Decimal("0.00")), output_field=MONEY_FIELD),
+        )
+
+    def sync_ledger(self):
+        """Rebuild amount_paid/balance from the Payment ledger (one UPDATE, no per-row queries)."""
+        paid = _ledger_paid_expression()
+        return self.update(
+            amount_paid=paid,
+            balance=Greatest(F("amount") - paid, Value(Decimal("0.00")), output_field=MONEY_FIELD),
+        )
+
 
 class BillingManager(models.Manager):
     """Expose BillingQuerySet helpers on Billing.objects."""
@@ -86,6 +253,21 @@ class BillingManager(models.Manager):
     def total_for_patient(self, patient_id):
         return self.get_queryset().total_for_patient(patient_id)
 
+    def with_ledger_paid(self):
+        return self.get_queryset().with_ledger_paid()
+
+    def report_filter(self, **filters):
+        return self.get_queryset().report_filter(**filters)
+
+    def report_summary(self):
+        return self.get_queryset().report_summary()
+
+    def patient_bills_map(self, patient_ids):
+        return self.get_queryset().patient_bills_map(patient_ids)
+
+    def aging(self, *group_fields, as_of=None):
+        return self.get_queryset().aging(*group_fields, as_of=as_of)
+
 
 class Billing(models.Model):
     """
@@ -106,7 +288,7 @@ class Billing(models.Model):
     # Cache patient name for display and quick search
     patient_name = models.CharField(max_length=200, null=True, blank=True)
 
-    # Service type (keeps original choices and defaults)
+    # Service type (keeps original choices; prices live in ServicePrice)
     service = models.CharField(
         max_length=100,
         choices=[(k, k.replace("_", " ").title()) for k in SERVICE_DEFAULT_AMOUNTS.keys()],
@@ -125,6 +307,22 @@ class Billing(models.Model):
         help_text="Total amount charged for this billing record",
     )
 
+    # Running totals maintained from Payment writes (see BillingQuerySet.apply_payment_delta)
+    amount_paid = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        editable=False,
+        help_text="Sum of payments applied to this bill (denormalized from Payment)",
+    )
+    balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        editable=False,
+        help_text="Outstanding balance, never negative (denormalized from Payment)",
+    )
+
     # Currency code (default KES)
     currency = models.CharField(max_length=6, default="KES", help_text="Currency code (e.g., KES)")
 
@@ -150,7 +348,7 @@ class Billing(models.Model):
     updated_at = models.DateTimeField(auto_now=True, help_text="Record last updated timestamp")
 
     # Human-friendly invoice number, unique. Auto-generated when missing.
-    invoice_number = models.CharField(max_length=64, unique=True, blank=True, null=True, help_text="Invoice id like INV-AA-YYYYMMDD-XXXXXX")
+    invoice_number = models.CharField(max_length=64, unique=True, blank=True, null=True, help_text="Invoice id like INV-AA-YYYYMMDD-NNNNNN")
 
     # Status lifecycle values and choices
     STATUS_PENDING = "pending"
@@ -196,6 +394,18 @@ class Billing(models.Model):
             models.Index(fields=["invoice_number"]),
             models.Index(fields=["patient"]),
             models.Index(fields=["status"]),
+            # Dashboard reports filtered by status over a date range
+            models.Index(fields=["status", "created_at"]),
+            # Keyset pagination of a patient's bills (newest first)
+            models.Index(fields=["patient", "-created_at", "-id"]),
+            # Receivables aging only reads bills that still owe something
+            models.Index(fields=["created_at"], condition=Q(balance__gt=0), name="billing_open_balance_idx"),
+            # Free-text search (billing.search): trigram GIN indexes on the upper-cased columns
+            # (PostgreSQL only: migration 0020 skips them elsewhere, where search uses icontains)
+            GinIndex(OpClass(Upper("patient_name"), name="gin_trgm_ops"), name="billing_patient_name_trgm"),
+            GinIndex(OpClass(Upper("invoice_number"), name="gin_trgm_ops"), name="billing_invoice_number_trgm"),
+            GinIndex(OpClass(Upper("service"), name="gin_trgm_ops"), name="billing_service_trgm"),
+            GinIndex(OpClass(Upper("charged_by_name"), name="gin_trgm_ops"), name="billing_charged_by_name_trgm"),
         ]
         ordering = ["-created_at"]
         verbose_name = "Billing"
@@ -210,24 +420,54 @@ class Billing(models.Model):
     def _generate_invoice_number(self):
         """
         Generate invoice string with project initials 'AA':
-        format: INV-AA-YYYYMMDD-XXXXXX
+        format: INV-AA-YYYYMMDD-NNNNNN (next number from the day's counter row, see billing/invoices.py)
         """
-        date_str = timezone.now().strftime("%Y%m%d")
-        short_token = uuid.uuid4().hex[:6].upper()
-        return f"INV-AA-{date_str}-{short_token}"
+        from .invoices import allocate_invoice_numbers  # local import: invoices imports this module
+
+        return allocate_invoice_numbers(1)[0]
+
+    # Columns owned by the payment ledger; full saves must not overwrite them with stale values
+    LEDGER_FIELDS = ("amount_paid",)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded values so saves can move this bill's daily rollup contribution."""
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_rollup()
+        return instance
+
+    def snapshot_rollup(self):
+        """Capture the current (key, measures) rollup contribution; skipped when fields are deferred."""
+        from .rollups import SNAPSHOT_FIELDS, bill_snapshot  # local import: rollups imports this module
+
+        deferred = self.get_deferred_fields()
+        self._rollup_snapshot = None if deferred.intersection(SNAPSHOT_FIELDS) else bill_snapshot(self)
+
+    def _balance_for(self, paid):
+        """Outstanding balance for a given paid amount (never negative)."""
+        return (self.amount - paid) if self.amount > paid else Decimal("0.00")
 
     def save(self, *args, **kwargs):
         """
         Save hook:
-        - Preserve original defaulting for amount from SERVICE_DEFAULT_AMOUNTS.
+        - Price the bill from the ServicePrice catalog on insert or when the service changes.
         - Auto-fill cached patient_name and charged_by_name.
         - Auto-generate invoice_number if missing.
         - Sync is_paid boolean to match status.
         - Ensure amount is Decimal.
+        - Recompute stored balance; leave amount_paid to the payment ledger on updates, reading it
+          under the bill row lock so stale instances cannot overwrite newer totals.
+        - Move this bill's contribution in BillingDailyRollup (same transaction).
         """
-        # Apply default amount from mapping when applicable (original flow)
-        if self.service in SERVICE_DEFAULT_AMOUNTS:
-            self.amount = Decimal(str(SERVICE_DEFAULT_AMOUNTS[self.service]))
+        # Price new bills (and bills whose service changed) from the cached ServicePrice catalog
+        snapshot = getattr(self, "_rollup_snapshot", None)
+        if self._state.adding or (snapshot is not None and snapshot[0]["service"] != (self.service or "")):
+            from .pricing import price_catalog  # local import: pricing imports this module
+
+            day = timezone.localdate(self.created_at) if self.created_at else None
+            price = price_catalog.price_for(self.service, self.currency, day)
+            if price is not None:
+                self.amount = price
 
         # Cache patient name to avoid extra joins
         if self.patient:
@@ -251,7 +491,41 @@ class Billing(models.Model):
             except Exception:
                 self.amount = Decimal("0.00")
 
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        updating = not adding and not kwargs.get("force_insert")
+        if updating and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in self.LEDGER_FIELDS
+            ]
+
+        from .rollups import SNAPSHOT_FIELDS, bill_snapshot, record_bill_change  # local import: rollups imports this module
+        from .services import lock_billing  # local import: services imports this module
+        from .signals import billing_status_changed  # local import: signals imports this module
+
+        old_snapshot = None if adding else getattr(self, "_rollup_snapshot", None)
+        with transaction.atomic():
+            locked = lock_billing(self.pk) if updating else None
+            if locked is not None:
+                # Payments may have moved the stored totals since this instance was loaded: take
+                # the unsaved columns and the rollup contribution from the locked row, so a stale
+                # instance neither writes a stale balance nor moves the rollups by stale amounts
+                written = set(kwargs["update_fields"])
+                for name in SNAPSHOT_FIELDS:
+                    if name not in written:
+                        setattr(self, name, getattr(locked, name))
+                old_snapshot = locked._rollup_snapshot
+            if locked is None or "balance" in kwargs["update_fields"]:
+                # Amount may have changed above, so keep the stored balance consistent with it
+                self.balance = self._balance_for(self.amount_paid)
+            super().save(*args, **kwargs)
+            # Bills loaded without their snapshot (e.g. deferred fields) are left to the rebuild command
+            if adding or old_snapshot is not None:
+                record_bill_change(old_snapshot, bill_snapshot(self))
+        self.snapshot_rollup()
+
+        old_status = old_snapshot[0]["status"] if old_snapshot else None
+        if (adding or old_snapshot is not None) and old_status != self.status:
+            billing_status_changed.send(sender=Billing, billing=self, old_status=old_status, new_status=self.status)
 
     # -------------------------
     # Payment-related helpers
@@ -261,64 +535,65 @@ class Billing(models.Model):
         return self.payments.all()
 
     def total_paid_amount(self):
-        """Return Decimal sum of all payments applied to this billing record."""
+        """Return Decimal sum of all payments applied to this billing record (stored column)."""
+        return self.amount_paid
+
+    def ledger_paid_amount(self):
+        """Recompute the payment sum from the Payment ledger (used for drift checks)."""
         total = self.payments.aggregate(total=Sum("amount"))["total"]
         return total or Decimal("0.00")
 
     def calculate_balance(self):
-        """Return outstanding balance (never negative)."""
-        paid = self.total_paid_amount()
-        balance = (self.amount - paid) if self.amount > paid else Decimal("0.00")
-        return balance
+        """Return outstanding balance (never negative, stored column)."""
+        return self.balance
 
-    def refresh_status_from_payments(self):
+    def refresh_ledger_fields(self):
+        """Reload amount_paid/balance after they were changed by a queryset UPDATE."""
+        self.refresh_from_db(fields=["amount_paid", "balance"])
+
+    def status_for_paid(self, paid):
         """
-        Recompute and persist the status based on payments:
+        Map a paid amount to a status:
         - 0 paid -> pending
         - 0 < paid < amount -> partial
         - paid >= amount -> paid
-        Only persists when status changes (reduces DB write churn).
         """
-        paid = self.total_paid_amount()
-        new_status = self.STATUS_PENDING
         if paid == Decimal("0.00"):
-            new_status = self.STATUS_PENDING
-        elif paid < self.amount:
-            new_status = self.STATUS_PARTIAL
-        else:
-            new_status = self.STATUS_PAID
+            return self.STATUS_PENDING
+        if paid < self.amount:
+            return self.STATUS_PARTIAL
+        return self.STATUS_PAID
 
-        if new_status != self.status:
-            # Save only status (and updated_at auto-updates). save() syncs is_paid
-            self.status = new_status
-            self.save(update_fields=["status", "updated_at"])
+    def refresh_status_from_payments(self):
+        """
+        Recompute and persist the status from the stored amount_paid.
+        Only persists when status changes (reduces DB write churn).
+        Payment writes settle status themselves (billing.services); this is for manual repair.
+        Reads amount_paid under the row lock so a concurrent payment cannot be missed.
+        """
+        from .services import lock_billing  # local import: services imports this module
+
+        with transaction.atomic():
+            locked = lock_billing(self.pk)
+            if locked is None:
+                return
+            self.amount_paid = locked.amount_paid
+            new_status = self.status_for_paid(self.amount_paid)
+            if new_status != self.status:
+                # Save only status (and updated_at auto-updates). save() syncs is_paid
+                self.status = new_status
+                self.save(update_fields=["status", "is_paid", "updated_at"])
 
     def create_payment(self, amount, method="cash", reference=None, user=None):
         """
-        Create a Payment record for this billing, then refresh status.
+        Create a Payment record for this billing via the payment service.
         - Validates positive amount.
+        - Updates this instance's totals/status in place.
         - Returns the created Payment instance.
         """
-        from .models import Payment  # local import to avoid circular import issues
-
-        try:
-            amount_dec = Decimal(str(amount))
-        except Exception:
-            raise ValueError("Invalid amount format for payment")
-
-        if amount_dec <= Decimal("0.00"):
-            raise ValueError("Payment amount must be positive")
-
-        payment = Payment.objects.create(
-            billing=self,
-            amount=amount_dec,
-            payment_method=method,
-            reference_number=reference,
-            created_by=user,
-        )
-        # Recompute status after creating a payment
-        self.refresh_status_from_payments()
-        return payment
+        from .services import apply_payment  # local import: services imports this module
+
+        return apply_payment(self, amount, method=method, reference=reference, user=user)
 
     def cancel(self, reason=None, user=None):
         """
@@ -373,31 +648,221 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination of the payments list (newest first)
+            models.Index(fields=["-created_at", "-id"], name="billing_payment_created_idx"),
+        ]
+        constraints = [
+            # The same gateway/receipt reference can only be posted once per bill
+            models.UniqueConstraint(
+                fields=["billing", "reference_number"],
+                condition=Q(reference_number__isnull=False),
+                name="payment_unique_billing_reference",
+            ),
+        ]
         verbose_name = "Payment"
         verbose_name_plural = "Payments"
 
     def __str__(self):
         return f"Payment {self.pk} - {self.amount} ({self.payment_method})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember loaded day/method/amount so edits can move the payment's daily rollup row."""
+        instance = super().from_db(db, field_names, values)
+        instance._rollup_values = (instance.created_at, instance.payment_method, instance.amount)
+        return instance
+
     def save(self, *args, **kwargs):
         """
-        Save the Payment and then refresh the parent Billing's status.
-        We call super() first so the payment exists in DB when aggregates run.
-        """
-        super().save(*args, **kwargs)
-        try:
-            self.billing.refresh_status_from_payments()
-        except Exception:
-            # Defensive: payment creation should not fail because status refresh fails
-            pass
-
-    def delete(self, *args, **kwargs):
-        """
-        When a payment is deleted (refund/mistake), refresh billing status afterwards.
+        Save the Payment through billing.services.save_payment: the bill row is locked once,
+        amount_paid/balance/status are recomputed once and one payment_applied event is sent.
+        Deletes are reversed by the post_delete signal (also covers queryset deletes).
         """
-        billing = self.billing
-        super().delete(*args, **kwargs)
-        try:
-            billing.refresh_status_from_payments()
-        except Exception:
-            pass
+        from .services import save_payment  # local import: services imports this module
+
+        save_payment(self, lambda: super(Payment, self).save(*args, **kwargs))
+
+
+class BillingDailyRollupQuerySet(models.QuerySet):
+    """Report helpers that sum a handful of pre-aggregated rows instead of the ledger."""
+
+    def report_filter(self, date_from=None, date_to=None, service=None, currency=None):
+        """Same filters as BillingQuerySet.report_filter, applied to the `day` key."""
+        qs = self
+        if date_from:
+            qs = qs.filter(day__gte=date_from)
+        if date_to:
+            qs = qs.filter(day__lte=date_to)
+        if service:
+            qs = qs.filter(service=service)
+        if currency:
+            qs = qs.filter(currency=currency)
+        return qs
+
+    def bill_rows(self):
+        return self.filter(payment_method="")
+
+    def payment_rows(self):
+        return self.filter(status="")
+
+    def report_summary(self):
+        """BillingViewSet.reports payload plus a by_payment_method breakdown (two small queries)."""
+        not_cancelled = ~Q(status=Billing.STATUS_CANCELLED)
+        rows = list(
+            self.bill_rows()
+            .order_by()
+            .values("service")
+            .annotate(
+                total=money_sum("billed_amount"),
+                paid=money_sum("billed_amount", Q(status=Billing.STATUS_PAID)),
+                unpaid=money_sum("billed_amount", ~Q(status=Billing.STATUS_PAID)),
+                partial=money_sum("billed_amount", Q(status=Billing.STATUS_PARTIAL)),
+                cancelled=money_sum("billed_amount", Q(status=Billing.STATUS_CANCELLED)),
+                collected=money_sum("paid_amount", not_cancelled),
+                outstanding=money_sum("balance_amount", not_cancelled),
+            )
+            # Drop keys whose bills have all moved to other statuses/services
+            .filter(~Q(total=0) | ~Q(collected=0) | ~Q(outstanding=0))
+        )
+        summary = summarize_report_rows(rows)
+        summary["by_payment_method"] = list(
+            self.payment_rows()
+            .order_by()
+            .values("payment_method")
+            .annotate(count=Sum("payment_count"), total=money_sum("payment_amount"))
+            .filter(count__gt=0)
+            .order_by("-total")
+        )
+        return summary
+
+    def bill_counts(self):
+        """Bill counts (total / paid / unpaid) for the reports app summary."""
+        counts = self.bill_rows().aggregate(
+            total=Sum("bill_count"),
+            paid=Sum("bill_count", filter=Q(status=Billing.STATUS_PAID)),
+        )
+        total, paid = counts["total"] or 0, counts["paid"] or 0
+        return {"total_bills": total, "paid_bills": paid, "unpaid_bills": total - paid}
+
+
+class BillingDailyRollup(models.Model):
+    """
+    Pre-aggregated billing totals keyed by (day, service, status, currency, payment_method).
+    Maintained incrementally by billing.rollups from bill and payment writes, and rebuilt by
+    `manage.py rebuild_billing_rollups`. Bill rows have payment_method=""; payment rows have status="".
+    """
+
+    day = models.DateField(help_text="Bill creation day (bill rows) or payment day (payment rows)")
+    service = models.CharField(max_length=100, blank=True, default="")
+    status = models.CharField(max_length=12, blank=True, default="")
+    currency = models.CharField(max_length=6, default="KES")
+    payment_method = models.CharField(max_length=50, blank=True, default="")
+
+    # Bill measures
+    bill_count = models.IntegerField(default=0)
+    billed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    balance_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    # Payment measures
+    payment_count = models.IntegerField(default=0)
+    payment_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BillingDailyRollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "service", "status", "currency", "payment_method"],
+                name="billing_daily_rollup_key",
+            ),
+        ]
+        ordering = ["-day"]
+        verbose_name = "Billing Daily Rollup"
+        verbose_name_plural = "Billing Daily Rollups"
+
+    def __str__(self):
+        return f"{self.day} {self.service or '-'} {self.status or self.payment_method} {self.currency}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response for a client-supplied `Idempotency-Key` header on a payment endpoint.
+    A retried request with the same key (and same body) gets the stored response back
+    without touching the ledger. Rows expire after settings.BILLING_IDEMPOTENCY_TTL;
+    `purge_idempotency_keys` deletes expired rows.
+    """
+
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=128, help_text="Endpoint (and object) the key was used on")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    request_hash = models.CharField(max_length=64, help_text="SHA-256 of the request body")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Empty while in flight")
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["key", "scope", "user"], name="billing_idempotency_key_unique"),
+        ]
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+
+class InvoiceCounter(models.Model):
+    """Last invoice number handed out per day (bumped atomically by billing.invoices)."""
+
+    day = models.DateField(unique=True)
+    last_number = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Invoice Counter"
+        verbose_name_plural = "Invoice Counters"
+
+    def __str__(self):
+        return f"{self.day}: {self.last_number}"
+
+
+class ServicePrice(models.Model):
+    """
+    Effective-dated price of a service, per facility and currency.
+    The row with the latest effective_from on or before a bill's date applies; a facility's own
+    row wins over the catalog-wide one (facility ""). Looked up through billing.pricing.
+    """
+
+    service = models.CharField(max_length=100, choices=Billing._meta.get_field("service").choices)
+    facility = models.CharField(max_length=64, blank=True, default="", help_text="Facility code; blank = all facilities")
+    currency = models.CharField(max_length=6, default="KES")
+    amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal("0.00"))])
+    effective_from = models.DateField(help_text="First day this price applies")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["service", "facility", "currency", "effective_from"],
+                name="billing_service_price_key",
+            ),
+        ]
+        ordering = ["service", "facility", "currency", "-effective_from"]
+        verbose_name = "Service Price"
+        verbose_name_plural = "Service Prices"
+
+    def __str__(self):
+        return f"{self.service} {self.amount} {self.currency} from {self.effective_from}"
+
+
+class PriceCatalogVersion(models.Model):
+    """Single-row counter bumped on every ServicePrice change (cache invalidation)."""
+
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Price catalog v{self.version}"
@@ -0,0 +1,14 @@
+# billing/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class PatientBillsCursorPagination(CursorPagination):
+    """
+    Keyset pagination for a patient's bills, newest first.
+    Backed by the (patient, -created_at, -id) index so deep pages cost the same as page 1.
+    """
+
+    page_size = 25
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = ("-created_at", "-id")
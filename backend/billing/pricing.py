@@ -0,0 +1,97 @@
+"""
+Service price lookups backed by the ServicePrice catalog.
+
+Each process keeps the whole (small) catalog in memory, keyed by (service, facility, currency)
+with prices sorted by effective_from, so pricing a bill costs no query. Writes to ServicePrice
+bump PriceCatalogVersion (billing.signals); a process re-checks that counter at most once every
+settings.BILLING_PRICE_CACHE_TTL seconds and reloads the catalog (one query) when it moved.
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PriceCatalogVersion, ServicePrice
+
+
+class PriceCatalog:
+    """In-process, version-checked cache of ServicePrice rows."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prices = None  # {(service, facility, currency): ([effective_from...], [amount...])}
+        self._version = None
+        self._checked_at = 0.0
+
+    def clear(self):
+        """Drop the cached catalog; the next lookup reloads it."""
+        with self._lock:
+            self._prices = None
+            self._version = None
+            self._checked_at = 0.0
+
+    def _current_version(self):
+        return PriceCatalogVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+    def _load(self):
+        prices = defaultdict(lambda: ([], []))
+        rows = ServicePrice.objects.order_by("effective_from").values_list(
+            "service", "facility", "currency", "effective_from", "amount"
+        )
+        for service, facility, currency, effective_from, amount in rows:
+            days, amounts = prices[(service, facility, currency)]
+            days.append(effective_from)
+            amounts.append(amount)
+        return dict(prices)
+
+    def _catalog(self):
+        now = time.monotonic()
+        if self._prices is not None and now - self._checked_at < settings.BILLING_PRICE_CACHE_TTL:
+            return self._prices
+        with self._lock:
+            if self._prices is None or now - self._checked_at >= settings.BILLING_PRICE_CACHE_TTL:
+                version = self._current_version()
+                if self._prices is None or version != self._version:
+                    self._prices, self._version = self._load(), version
+                self._checked_at = now
+            return self._prices
+
+    def price_for(self, service, currency="KES", day=None, facility=None):
+        """
+        Amount in effect for `service` on `day` (default today), preferring the facility's own
+        price over the catalog-wide one (facility ""). Returns None when nothing is priced.
+        """
+        day = day or timezone.localdate()
+        facility = settings.BILLING_FACILITY if facility is None else facility
+        catalog = self._catalog()
+        for key in ((service, facility, currency), (service, "", currency)):
+            entry = catalog.get(key)
+            if entry:
+                index = bisect.bisect_right(entry[0], day)
+                if index:
+                    return entry[1][index - 1]
+        return None
+
+
+price_catalog = PriceCatalog()
+
+
+def bump_price_version():
+    """Tell every process its cached catalog is stale (call after raw/bulk ServicePrice writes)."""
+    if not PriceCatalogVersion.objects.filter(pk=1).update(version=F("version") + 1):
+        PriceCatalogVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+    price_catalog.clear()
+
+
+def price_bills(bills, facility=None):
+    """Set `amount` on unsaved bills from the catalog (at most one catalog query for the batch)."""
+    for bill in bills:
+        day = timezone.localdate(bill.created_at) if bill.created_at else None
+        amount = price_catalog.price_for(bill.service, bill.currency, day, facility)
+        if amount is not None:
+            bill.amount = amount
+    return bills
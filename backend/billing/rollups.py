@@ -0,0 +1,183 @@
+"""
+Incremental maintenance of BillingDailyRollup (dashboard totals without scanning the ledger).
+
+Two kinds of rows share the (day, service, status, currency, payment_method) key:
+- bill rows (payment_method=""): bill_count, billed/paid/balance amounts per bill creation day and status
+- payment rows (status=""): payment_count/payment_amount per payment day and payment method
+
+Every change is applied as a delta (old contribution out, new contribution in) through a single
+multi-row upsert, so a status move touches two small rows in one statement.
+`rebuild_rollups` recomputes a date range from raw rows.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Billing, BillingDailyRollup, Payment, _start_of_day
+
+# Billing fields a rollup snapshot depends on (snapshots are skipped when any are deferred)
+SNAPSHOT_FIELDS = ("created_at", "service", "status", "currency", "amount", "amount_paid", "balance")
+BILL_MEASURES = ("bill_count", "billed_amount", "paid_amount", "balance_amount")
+PAYMENT_MEASURES = ("payment_count", "payment_amount")
+
+
+def _day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def bill_snapshot(bill):
+    """Return (key, measures) for a bill's current in-memory values, or None if unsaved."""
+    if bill.pk is None or bill.created_at is None:
+        return None
+    key = {
+        "day": _day(bill.created_at),
+        "service": bill.service or "",
+        "status": bill.status,
+        "currency": bill.currency,
+        "payment_method": "",
+    }
+    measures = {
+        "bill_count": 1,
+        "billed_amount": bill.amount,
+        "paid_amount": bill.amount_paid,
+        "balance_amount": bill.balance,
+    }
+    return key, measures
+
+
+KEY_FIELDS = ("day", "service", "status", "currency", "payment_method")
+MEASURES = BILL_MEASURES + PAYMENT_MEASURES
+
+
+def apply_deltas(deltas):
+    """
+    Add a list of (key, measures) deltas to the rollup table in one statement:
+    INSERT ... ON CONFLICT (key) DO UPDATE SET m = m + EXCLUDED.m (PostgreSQL and SQLite).
+    Deltas for the same key are merged first, since one upsert may touch a row only once.
+    """
+    merged = {}
+    for key, measures in deltas:
+        row = merged.setdefault(tuple(key[f] for f in KEY_FIELDS), dict.fromkeys(MEASURES, 0))
+        for field, value in measures.items():
+            row[field] += value
+    rows = [(key, measures) for key, measures in merged.items() if any(measures.values())]
+    if not rows:
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(BillingDailyRollup._meta.db_table)
+    columns = KEY_FIELDS + MEASURES + ("updated_at",)
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    now = timezone.now()
+    params = []
+    for key, measures in rows:
+        params.extend(key)
+        params.extend(measures[m] for m in MEASURES)
+        params.append(now)
+    sql = (
+        f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) "
+        f"VALUES {', '.join([placeholders] * len(rows))} "
+        f"ON CONFLICT ({', '.join(qn(c) for c in KEY_FIELDS)}) DO UPDATE SET "
+        + ", ".join(f"{qn(m)} = {table}.{qn(m)} + EXCLUDED.{qn(m)}" for m in MEASURES)
+        + f", {qn('updated_at')} = EXCLUDED.{qn('updated_at')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def bill_change_deltas(old, new):
+    """Deltas moving a bill's contribution from snapshot `old` to snapshot `new` (either may be None)."""
+    deltas = []
+    if old:
+        deltas.append((old[0], {m: -old[1][m] for m in BILL_MEASURES}))
+    if new:
+        deltas.append(new)
+    return deltas
+
+
+def payment_delta(bill, created_at, payment_method, amount, sign=1):
+    """Delta adding (sign=1) or removing (sign=-1) a payment on its day/method row."""
+    key = {
+        "day": _day(created_at),
+        "service": bill.service or "",
+        "status": "",
+        "currency": bill.currency,
+        "payment_method": payment_method or "",
+    }
+    return key, {"payment_count": sign, "payment_amount": amount * sign}
+
+
+def record_bill_change(old, new):
+    """Move a bill's contribution from snapshot `old` to snapshot `new`."""
+    apply_deltas(bill_change_deltas(old, new))
+
+
+def record_payment(bill, created_at, payment_method, amount, sign=1):
+    """Add (sign=1) or remove (sign=-1) a payment on its day/method row."""
+    apply_deltas([payment_delta(bill, created_at, payment_method, amount, sign)])
+
+
+@transaction.atomic
+def rebuild_rollups(date_from=None, date_to=None):
+    """
+    Recompute rollup rows for an inclusive day range (everything when open-ended) from the
+    Billing and Payment tables with two grouped queries. Returns the number of rows written.
+    """
+    bills = Billing.objects.order_by()
+    payments = Payment.objects.order_by()
+    rollups = BillingDailyRollup.objects.all()
+    if date_from:
+        bills = bills.filter(created_at__gte=_start_of_day(date_from))
+        payments = payments.filter(created_at__gte=_start_of_day(date_from))
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to:
+        bills = bills.filter(created_at__lt=_start_of_day(date_to + timedelta(days=1)))
+        payments = payments.filter(created_at__lt=_start_of_day(date_to + timedelta(days=1)))
+        rollups = rollups.filter(day__lte=date_to)
+
+    zero = Value(Decimal("0.00"))
+    bill_rows = (
+        bills.annotate(day=TruncDate("created_at"), service_key=Coalesce("service", Value("")))
+        .values("day", "service_key", "status", "currency")
+        .annotate(
+            bill_count=Count("id"),
+            billed_amount=Coalesce(Sum("amount"), zero),
+            paid_amount=Coalesce(Sum("amount_paid"), zero),
+            balance_amount=Coalesce(Sum("balance"), zero),
+        )
+    )
+    payment_rows = (
+        payments.annotate(day=TruncDate("created_at"), service_key=Coalesce("billing__service", Value("")))
+        .values("day", "service_key", "billing__currency", "payment_method")
+        .annotate(payment_count=Count("id"), payment_amount=Coalesce(Sum("amount"), zero))
+    )
+
+    rollups.delete()
+    objs = [
+        BillingDailyRollup(
+            day=row["day"],
+            service=row["service_key"],
+            status=row["status"],
+            currency=row["currency"],
+            payment_method="",
+            **{m: row[m] for m in BILL_MEASURES},
+        )
+        for row in bill_rows
+    ]
+    objs += [
+        BillingDailyRollup(
+            day=row["day"],
+            service=row["service_key"],
+            status="",
+            currency=row["billing__currency"],
+            payment_method=row["payment_method"] or "",
+            **{m: row[m] for m in PAYMENT_MEASURES},
+        )
+        for row in payment_rows
+    ]
+    BillingDailyRollup.objects.bulk_create(objs, batch_size=1000)
+    return len(objs)
@@ -0,0 +1,74 @@
+# billing/search.py
+"""
+Billing search backend.
+
+- Exact fast paths (unique btree indexes): invoice numbers (INV-...), patient numbers (PAT-...)
+  and bare numeric patient ids.
+- Free text over SEARCH_FIELDS (cached patient name, invoice number, service, cashier name).
+  On PostgreSQL each field has a pg_trgm GIN index on UPPER(field) (Billing.Meta.indexes), and
+  both predicates are written against that same expression so the planner can use it:
+  UPPER(field) LIKE '%TERM%' for substrings and UPPER(field) % 'TERM' (pg_trgm.similarity_threshold,
+  default 0.3) for misspellings. Only matching rows are ranked by similarity.
+  Other databases fall back to plain icontains.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Greatest, Upper
+from rest_framework import filters
+
+SEARCH_FIELDS = ("patient_name", "invoice_number", "service", "charged_by_name")
+
+INVOICE_RE = re.compile(r"^INV-[A-Z]{2}-\d{8}-[0-9A-F]+$", re.IGNORECASE)
+PATIENT_NUMBER_RE = re.compile(r"^PAT-\d+$", re.IGNORECASE)
+
+
+def _is_postgres(queryset):
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def search_bills(queryset, term):
+    """Filter and rank a Billing queryset by a free-text search term."""
+    term = (term or "").strip()
+    if not term:
+        return queryset
+
+    # Exact fast paths: single index probe, no ranking needed
+    if INVOICE_RE.match(term):
+        return queryset.filter(invoice_number=term.upper())
+    if PATIENT_NUMBER_RE.match(term):
+        return queryset.filter(patient__patient_number=term.upper())
+    if term.isdigit():
+        return queryset.filter(patient_id=int(term))
+
+    if not _is_postgres(queryset):
+        return queryset.filter(reduce(or_, (Q(**{f"{field}__icontains": term}) for field in SEARCH_FIELDS)))
+
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    folded = term.upper()
+    aliases = {f"{field}_upper": Upper(field) for field in SEARCH_FIELDS}
+    condition = reduce(
+        or_,
+        (Q(**{f"{alias}__contains": folded}) | Q(**{f"{alias}__trigram_similar": folded}) for alias in aliases),
+    )
+    rank = Greatest(*(TrigramSimilarity(alias, folded) for alias in aliases))
+    return (
+        queryset.alias(**aliases)
+        .filter(condition)
+        .annotate(rank=rank)
+        .order_by("-rank", "-created_at")
+    )
+
+
+class BillingSearchFilter(filters.SearchFilter):
+    """DRF SearchFilter that routes `?search=` through the indexed billing search backend."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search_bills(queryset, " ".join(terms))
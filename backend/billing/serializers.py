@@ -1,7 +1,7 @@
 # billing/serializers.py
 """
 Serializers for Billing and Payment models.
-- BillingSerializer exposes nested payments (read-only) and computed balance.
+- BillingSerializer exposes nested payments (read-only) and the stored amount_paid/balance.
 - PaymentSerializer records created_by from request for audit.
 """
 
@@ -10,6 +10,14 @@ from rest_framework import serializers
 from .models import Billing, Payment, SERVICE_DEFAULT_AMOUNTS
 
 
+def requested_expansions(request):
+    """Parse `?expand=a,b` into a set of field names (empty when no request)."""
+    params = getattr(request, "query_params", None)
+    if not params:
+        return set()
+    return {name.strip() for name in params.get("expand", "").split(",") if name.strip()}
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     """Serializer for Payment ledger entries."""
 
@@ -34,11 +42,33 @@ class PaymentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class PatientBillSerializer(serializers.ModelSerializer):
+    """Compact bill row for the per-patient bills endpoint (no nested payments)."""
+
+    class Meta:
+        model = Billing
+        fields = [
+            "id",
+            "invoice_number",
+            "service",
+            "amount",
+            "amount_paid",
+            "balance",
+            "currency",
+            "status",
+            "is_paid",
+            "charged_at",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+
 class BillingSerializer(serializers.ModelSerializer):
     """
     Billing serializer:
     - payments: nested list (read-only)
-    - balance: computed from model helper
+    - amount_paid/balance: denormalized columns maintained by Payment writes
+    - patient_bills: opt-in via `?expand=patient_bills` (see /api/billing/patient/<id>/ for paging)
     - most server-generated fields are read-only to avoid accidental overrides
     """
 
@@ -64,6 +94,7 @@ class BillingSerializer(serializers.ModelSerializer):
             "updated_at",
             "is_paid",
             "payments",
+            "amount_paid",
             "balance",
             "patient_bills",
             "lab_request",
@@ -81,21 +112,40 @@ class BillingSerializer(serializers.ModelSerializer):
             "updated_at",
             "is_paid",
             "payments",
+            "amount_paid",
             "balance",
         ]
 
+    # Heavy fields only rendered when the client asks with ?expand=<name>
+    EXPANDABLE_FIELDS = ("patient_bills",)
+
+    def get_fields(self):
+        """Drop expandable fields unless requested, keeping default payloads bounded."""
+        fields = super().get_fields()
+        expand = requested_expansions(self.context.get("request"))
+        for name in self.EXPANDABLE_FIELDS:
+            if name not in expand:
+                fields.pop(name, None)
+        return fields
+
     def get_patient_bills(self, obj):
-        """Return a quick list of this patient's bills (keeps your original idea)."""
-        if obj.patient:
-            bills_qs = obj.patient.billings.all().order_by("-created_at").values(
+        """
+        Return a quick list of this patient's bills (keeps your original idea).
+        List views pass a pre-grouped `patient_bills` map in context (one query per page).
+        """
+        bills_map = self.context.get("patient_bills")
+        if bills_map is not None:
+            return bills_map.get(obj.patient_id, [])
+        if obj.patient_id:
+            bills_qs = Billing.objects.filter(patient_id=obj.patient_id).order_by("-created_at").values(
                 "service", "amount", "is_paid", "charged_at", "invoice_number", "status"
             )
             return list(bills_qs)
         return []
 
     def get_balance(self, obj):
-        """Return outstanding balance for this billing."""
-        return obj.calculate_balance()
+        """Return outstanding balance for this billing (stored column, no aggregate)."""
+        return obj.balance
 
     def validate(self, attrs):
         """
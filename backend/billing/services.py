@@ -0,0 +1,400 @@
+"""
+Billing service functions: the single path through which payments touch a bill.
+Every payment write locks the bill row once, recomputes amount_paid/balance/status once,
+persists them with one UPDATE and emits one `payment_applied` event.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Concat
+from django.utils import timezone
+
+from .invoices import assign_invoice_numbers
+from .models import Billing, Payment
+from .pricing import price_bills
+from .rollups import apply_deltas, bill_change_deltas, bill_snapshot, payment_delta
+from .signals import billing_status_changed, payment_applied
+
+
+def parse_payment_amount(amount):
+    """Return `amount` as a positive Decimal or raise ValueError (shared by views and models)."""
+    try:
+        amount_dec = Decimal(str(amount))
+    except Exception:
+        raise ValueError("Invalid amount format for payment")
+    if amount_dec <= Decimal("0.00"):
+        raise ValueError("Payment amount must be positive")
+    return amount_dec
+
+
+def lock_billing(billing_id):
+    """SELECT ... FOR UPDATE the bill row; callers must already be inside a transaction."""
+    return Billing.objects.select_for_update().filter(pk=billing_id).first()
+
+
+SETTLEMENT_FIELDS = ("amount_paid", "balance", "status", "is_paid", "updated_at")
+
+
+def settlement_values(bill, paid):
+    """Stored columns a bill takes once `paid` has been applied to it."""
+    new_status = bill.status_for_paid(paid)
+    return {
+        "amount_paid": paid,
+        "balance": bill._balance_for(paid),
+        "status": new_status,
+        "is_paid": new_status == Billing.STATUS_PAID,
+        "updated_at": timezone.now(),
+    }
+
+
+def settle_billing(bill, paid, payment, rollup_deltas=()):
+    """
+    Persist new totals/status for a locked bill in one UPDATE and emit one event.
+    The in-memory bill (and the payment's cached bill, if any) are updated in place
+    so callers can serialize them without re-fetching. Daily rollups (plus any payment-row
+    `rollup_deltas` from the caller) move in one upsert in the same transaction.
+    """
+    old_status = bill.status
+    values = settlement_values(bill, paid)
+    new_status = values["status"]
+    Billing.objects.filter(pk=bill.pk).update(**values)
+
+    targets = [bill]
+    if Payment.billing.is_cached(payment) and payment.billing is not bill:
+        targets.append(payment.billing)
+    for target in targets:
+        for field, value in values.items():
+            setattr(target, field, value)
+
+    # Move the bill's daily rollup contribution to its new status/totals
+    apply_deltas(list(rollup_deltas) + bill_change_deltas(bill._rollup_snapshot, bill_snapshot(bill)))
+    for target in targets:
+        target.snapshot_rollup()
+
+    payment_applied.send(
+        sender=Payment,
+        payment=payment,
+        billing=targets[-1],
+        old_status=old_status,
+        new_status=new_status,
+    )
+    if new_status != old_status:
+        billing_status_changed.send(sender=Billing, billing=targets[-1], old_status=old_status, new_status=new_status)
+    return targets[-1]
+
+
+@transaction.atomic
+def save_payment(payment, write):
+    """
+    Write a Payment row (via `write`) under the bill lock and settle the bill.
+    New payments add to the stored total; edited payments resync from the ledger.
+    """
+    adding = payment._state.adding
+    bill = lock_billing(payment.billing_id)
+    write()
+    if bill is None:
+        return
+    deltas = [payment_delta(bill, payment.created_at, payment.payment_method, payment.amount)]
+    if adding:
+        paid = bill.amount_paid + payment.amount
+    else:
+        paid = bill.ledger_paid_amount()
+        old_values = getattr(payment, "_rollup_values", None)
+        if old_values:
+            deltas.append(payment_delta(bill, *old_values, sign=-1))
+    payment._rollup_values = (payment.created_at, payment.payment_method, payment.amount)
+    settle_billing(bill, paid, payment, deltas)
+
+
+@transaction.atomic
+def reverse_payment(payment):
+    """Take a deleted payment back out of its bill's stored totals (refund/mistake)."""
+    bill = lock_billing(payment.billing_id)
+    if bill is None:
+        return
+    deltas = [payment_delta(bill, payment.created_at, payment.payment_method, payment.amount, sign=-1)]
+    paid = bill.amount_paid - payment.amount
+    settle_billing(bill, paid if paid > Decimal("0.00") else Decimal("0.00"), payment, deltas)
+
+
+def apply_payment(billing, amount, method="cash", reference=None, user=None):
+    """
+    Record a payment against `billing` and update the bill in place.
+    - Validates positive amount (ValueError otherwise).
+    - Returns the created Payment instance.
+    """
+    payment = Payment(
+        billing=billing,
+        amount=parse_payment_amount(amount),
+        payment_method=method,
+        reference_number=reference,
+        created_by=user,
+    )
+    payment.save()
+    return payment
+
+
+@transaction.atomic
+def pay_balance(billing, method="manual", reference=None, user=None):
+    """
+    Pay whatever is still outstanding on `billing` (mark_paid).
+    The balance is read under the row lock, so concurrent calls cannot both pay it:
+    the first settles the bill, the rest find nothing due and return None.
+    `billing` is updated in place either way.
+    """
+    bill = lock_billing(billing.pk)
+    if bill is None:
+        return None
+    if bill.balance <= Decimal("0.00"):
+        for field in SETTLEMENT_FIELDS:
+            setattr(billing, field, getattr(bill, field))
+        billing.snapshot_rollup()
+        return None
+    return apply_payment(billing, bill.balance, method=method, reference=reference, user=user)
+
+
+# Per-line outcomes of a bulk payment batch
+LINE_MATCHED = "matched"
+LINE_UNMATCHED = "unmatched"
+LINE_DUPLICATE = "duplicate"
+LINE_INVALID = "invalid"
+
+MAX_BULK_PAYMENT_LINES = 5000
+
+
+def _clean(value):
+    return str(value).strip() if value not in (None, "") else ""
+
+
+def _match_bills(accounts):
+    """
+    Lock and return {account: [bills]} for a set of account references, in two set-based queries:
+    - invoice numbers match their bill directly (any status, so cancelled bills can be reported);
+    - patient numbers match that patient's open (pending/partial) bills, oldest first.
+    """
+    matched = defaultdict(list)
+    for bill in Billing.objects.select_for_update().filter(invoice_number__in=accounts).order_by("pk"):
+        matched[bill.invoice_number].append(bill)
+    patient_numbers = accounts - matched.keys()
+    if patient_numbers:
+        open_bills = (
+            Billing.objects.select_for_update(of=("self",))
+            .filter(
+                patient__patient_number__in=patient_numbers,
+                status__in=[Billing.STATUS_PENDING, Billing.STATUS_PARTIAL],
+            )
+            .annotate(account=F("patient__patient_number"))
+            .order_by("created_at", "pk")
+        )
+        for bill in open_bills:
+            matched[bill.account].append(bill)
+    return matched
+
+
+@transaction.atomic
+def post_bulk_payments(lines, user=None):
+    """
+    Post a batch of statement lines (dicts with invoice_number or reference, amount,
+    payment_method/method, reference_number) in one transaction:
+    - bills are matched and locked with set-based queries;
+    - lines whose reference_number is already on the ledger (or earlier in the batch) are duplicates,
+      so re-posting the same statement is a no-op;
+    - payments are inserted with one bulk_create and every touched bill is settled in one bulk UPDATE,
+      with one rollup upsert for the whole batch.
+    Returns (report, summary): one dict per input line plus counts/totals per outcome.
+    """
+    methods = {choice for choice, _label in Payment.PAYMENT_METHODS}
+    parsed = []
+    for number, line in enumerate(lines, start=1):
+        account = _clean(line.get("invoice_number") or line.get("reference")).upper()
+        entry = {
+            "line": number,
+            "account": account,
+            "reference_number": _clean(line.get("reference_number")) or None,
+            "status": LINE_INVALID,
+            "billing_id": None,
+            "payment_id": None,
+            "detail": "",
+        }
+        parsed.append(entry)
+        method = _clean(line.get("payment_method") or line.get("method") or "mpesa").lower()
+        try:
+            entry["amount"] = parse_payment_amount(line.get("amount"))
+        except ValueError as exc:
+            entry["detail"] = str(exc)
+            continue
+        if not account:
+            entry["detail"] = "invoice_number or reference is required"
+        elif method not in methods:
+            entry["detail"] = f"Unknown payment method '{method}'"
+        else:
+            entry["method"] = method
+            entry["status"] = None
+
+    pending = [entry for entry in parsed if entry["status"] is None]
+    bills = _match_bills({entry["account"] for entry in pending}) if pending else {}
+    references = {entry["reference_number"] for entry in pending if entry["reference_number"]}
+    seen = set(
+        Payment.objects.filter(reference_number__in=references).values_list("reference_number", flat=True)
+    ) if references else set()
+
+    payments, to_post = [], []
+    outstanding = {bill.pk: bill.balance for candidates in bills.values() for bill in candidates}
+    for entry in pending:
+        # Patient-number lines go to the oldest bill the batch has not already settled
+        candidates = bills.get(entry["account"], [])
+        bill = next((b for b in candidates if outstanding[b.pk] > 0), candidates[-1] if candidates else None)
+        reference = entry["reference_number"]
+        if reference and reference in seen:
+            entry["status"] = LINE_DUPLICATE
+            entry["detail"] = "reference_number already posted"
+            continue
+        if bill is None:
+            entry["status"] = LINE_UNMATCHED
+            entry["detail"] = "No open bill for this invoice/patient number"
+            continue
+        if bill.status == Billing.STATUS_CANCELLED:
+            entry["status"] = LINE_UNMATCHED
+            entry["detail"] = "Bill is cancelled"
+            continue
+        if reference:
+            seen.add(reference)
+        entry["status"] = LINE_MATCHED
+        entry["billing_id"] = bill.pk
+        outstanding[bill.pk] -= entry["amount"]
+        payments.append(
+            Payment(
+                billing=bill,
+                amount=entry["amount"],
+                payment_method=entry["method"],
+                reference_number=reference,
+                created_by=user,
+            )
+        )
+        to_post.append(entry)
+
+    if payments:
+        Payment.objects.bulk_create(payments)
+        _settle_bulk(payments)
+        for entry, payment in zip(to_post, payments):
+            entry["payment_id"] = payment.pk
+
+    summary = {outcome: 0 for outcome in (LINE_MATCHED, LINE_UNMATCHED, LINE_DUPLICATE, LINE_INVALID)}
+    for entry in parsed:
+        summary[entry["status"]] += 1
+    summary["total_amount"] = sum((p.amount for p in payments), Decimal("0.00"))
+    report = [
+        {key: entry[key] for key in ("line", "account", "reference_number", "status", "billing_id", "payment_id", "detail")}
+        for entry in parsed
+    ]
+    return report, summary
+
+
+def _settle_bulk(payments):
+    """Settle every bill touched by freshly inserted `payments` with one UPDATE and one rollup upsert."""
+    by_bill = defaultdict(list)
+    for payment in payments:
+        by_bill[payment.billing_id].append(payment)
+
+    deltas, changed = [], []
+    for bill_payments in by_bill.values():
+        bill = bill_payments[0].billing
+        old_snapshot, old_status = bill._rollup_snapshot, bill.status
+        paid = bill.amount_paid + sum(p.amount for p in bill_payments)
+        for field, value in settlement_values(bill, paid).items():
+            setattr(bill, field, value)
+        deltas += [payment_delta(bill, p.created_at, p.payment_method, p.amount) for p in bill_payments]
+        deltas += bill_change_deltas(old_snapshot, bill_snapshot(bill))
+        bill.snapshot_rollup()
+        changed.append((bill, bill_payments[-1], old_status))
+
+    Billing.objects.bulk_update([bill for bill, _payment, _old in changed], SETTLEMENT_FIELDS)
+    apply_deltas(deltas)
+    for bill, payment, old_status in changed:
+        payment_applied.send(
+            sender=Payment, payment=payment, billing=bill, old_status=old_status, new_status=bill.status
+        )
+        if bill.status != old_status:
+            billing_status_changed.send(sender=Billing, billing=bill, old_status=old_status, new_status=bill.status)
+
+
+MAX_BATCH_BILLS = 5000
+
+
+@transaction.atomic
+def batch_mark_paid(bills, method="manual", reference=None, user=None):
+    """
+    Pay the outstanding balance of every open bill in the `bills` queryset:
+    one locking SELECT, one bulk_create of payments, one bulk UPDATE of the bills
+    and one rollup upsert. Returns a compact summary (no serialized bills).
+    """
+    open_bills = list(
+        bills.select_for_update()
+        .filter(status__in=[Billing.STATUS_PENDING, Billing.STATUS_PARTIAL], balance__gt=0)
+        .order_by("pk")
+    )
+    payments = [
+        Payment(billing=bill, amount=bill.balance, payment_method=method, reference_number=reference, created_by=user)
+        for bill in open_bills
+    ]
+    if payments:
+        Payment.objects.bulk_create(payments)
+        _settle_bulk(payments)
+    return {
+        "paid": len(payments),
+        "total_amount": sum((p.amount for p in payments), Decimal("0.00")),
+        "billing_ids": [bill.pk for bill in open_bills],
+    }
+
+
+@transaction.atomic
+def batch_cancel(bills, reason=None):
+    """
+    Cancel every not-yet-cancelled bill in the `bills` queryset with one UPDATE
+    (reason appended to report_reference like Billing.cancel) and one rollup upsert.
+    Payments are kept for audit. Returns a compact summary.
+    """
+    targets = list(bills.select_for_update().exclude(status=Billing.STATUS_CANCELLED).order_by("pk"))
+    if not targets:
+        return {"cancelled": 0, "billing_ids": []}
+
+    now = timezone.now()
+    values = {"status": Billing.STATUS_CANCELLED, "is_paid": False, "updated_at": now}
+    if reason:
+        note = f" CANCELLED[{now.isoformat()}]:{reason}"
+        values["report_reference"] = Concat(Coalesce("report_reference", Value("")), Value(note))
+    Billing.objects.filter(pk__in=[bill.pk for bill in targets]).update(**values)
+
+    deltas, old_statuses = [], []
+    for bill in targets:
+        old_snapshot = bill._rollup_snapshot
+        old_statuses.append(bill.status)
+        bill.status, bill.is_paid = Billing.STATUS_CANCELLED, False
+        deltas += bill_change_deltas(old_snapshot, bill_snapshot(bill))
+    apply_deltas(deltas)
+    for bill, old_status in zip(targets, old_statuses):
+        billing_status_changed.send(sender=Billing, billing=bill, old_status=old_status, new_status=bill.status)
+    return {"cancelled": len(targets), "billing_ids": [bill.pk for bill in targets]}
+
+
+@transaction.atomic
+def create_bills(bills, batch_size=1000):
+    """
+    Bulk billing path: price unsaved bills from the catalog (one query at most), give them
+    invoice numbers (one counter upsert per day), insert them with bulk_create and record
+    their rollup contribution in one upsert. Returns the saved bills.
+    """
+    price_bills(bills)
+    assign_invoice_numbers(bills)
+    for bill in bills:
+        if bill.patient_id and not bill.patient_name:
+            bill.patient_name = f"{bill.patient.first_name} {bill.patient.last_name}".strip()
+        bill.is_paid = bill.status == Billing.STATUS_PAID
+        bill.balance = bill._balance_for(bill.amount_paid)
+    Billing.objects.bulk_create(bills, batch_size=batch_size)
+    apply_deltas([delta for bill in bills for delta in bill_change_deltas(None, bill_snapshot(bill))])
+    for bill in bills:
+        bill.snapshot_rollup()
+    return bills
@@ -1,20 +1,49 @@
 # billing/signals.py
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from .models import Payment
-
-@receiver(post_save, sender=Payment)
-def payment_post_save(sender, instance, created, **kwargs):
-    """Ensure billing status refresh after payment save (safe duplicate call)."""
-    try:
-        instance.billing.refresh_status_from_payments()
-    except Exception:
-        pass
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from .models import Billing, Payment, ServicePrice
+
+# Sent once per payment write after the bill's totals/status are settled.
+# kwargs: payment, billing, old_status, new_status
+payment_applied = Signal()
+
+# Sent (sender=Billing) whenever a bill's status actually changes, whichever path changed it:
+# Billing.save, payment settlement or the batch actions. kwargs: billing, old_status, new_status
+billing_status_changed = Signal()
+
 
 @receiver(post_delete, sender=Payment)
-def payment_post_delete(sender, instance, **kwargs):
-    """Ensure billing status refresh after payment deletion."""
-    try:
-        instance.billing.refresh_status_from_payments()
-    except Exception:
-        pass
+def payment_post_delete(sender, instance, origin=None, **kwargs):
+    """
+    Take the deleted payment out of the bill's stored totals and status.
+    When the delete cascades from the bill (or its patient) the bill is going away too,
+    so only the payment's rollup row is reversed; the bill's own row goes in billing_post_delete.
+    """
+    from .rollups import record_payment  # local import: rollups imports models
+    from .services import reverse_payment  # local import: services imports this module
+
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is None or origin_model is Payment:
+        reverse_payment(instance)
+        return
+    bill = Billing.objects.filter(pk=instance.billing_id).only("service", "currency").first()
+    if bill is not None:
+        record_payment(bill, instance.created_at, instance.payment_method, instance.amount, sign=-1)
+
+
+@receiver(post_delete, sender=Billing)
+def billing_post_delete(sender, instance, **kwargs):
+    """Remove a deleted bill's contribution from the daily rollups."""
+    from .rollups import bill_snapshot, record_bill_change
+
+    record_bill_change(bill_snapshot(instance), None)
+
+
+@receiver(post_save, sender=ServicePrice)
+@receiver(post_delete, sender=ServicePrice)
+def service_price_changed(sender, instance, **kwargs):
+    """Invalidate every process's cached price catalog."""
+    from .pricing import bump_price_version
+
+    bump_price_version()
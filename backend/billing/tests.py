@@ -1,3 +1,582 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from patients.models import Patient
+from .models import Billing, BillingDailyRollup, Payment, ServicePrice
+from .invoices import allocate_invoice_numbers, assign_invoice_numbers
+from .rollups import rebuild_rollups
+from .pricing import price_catalog
+from .services import create_bills, pay_balance
+
+User = get_user_model()
+
+
+def rollup_rows():
+    """Non-empty rollup rows without ids/timestamps, for comparing incremental vs rebuilt tables."""
+    fields = ("day", "service", "status", "currency", "payment_method", "bill_count", "billed_amount",
+              "paid_amount", "balance_amount", "payment_count", "payment_amount")
+    rows = BillingDailyRollup.objects.exclude(bill_count=0, payment_count=0).values_list(*fields)
+    return sorted(rows, key=str)
+
+
+class BillingLedgerColumnsTests(TestCase):
+    """Stored amount_paid/balance must follow Payment writes without per-row aggregates."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="cashier", password="pass")
+        self.patient = Patient.objects.create(first_name="Jane", last_name="Doe")
+        self.bill = Billing.objects.create(patient=self.patient, service="consultation", charged_by=self.user)
+
+    def test_new_bill_has_full_balance(self):
+        self.assertEqual(self.bill.amount_paid, Decimal("0.00"))
+        self.assertEqual(self.bill.balance, Decimal("1000.00"))
+
+    def test_payment_create_and_delete_move_stored_totals(self):
+        payment = self.bill.create_payment(amount="400", method="cash", user=self.user)
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.amount_paid, Decimal("400.00"))
+        self.assertEqual(self.bill.balance, Decimal("600.00"))
+        self.assertEqual(self.bill.status, Billing.STATUS_PARTIAL)
+
+        payment.delete()
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.amount_paid, Decimal("0.00"))
+        self.assertEqual(self.bill.balance, Decimal("1000.00"))
+        self.assertEqual(self.bill.status, Billing.STATUS_PENDING)
+
+    def test_full_save_does_not_clobber_amount_paid(self):
+        stale = Billing.objects.get(pk=self.bill.pk)
+        self.bill.create_payment(amount="1000", user=self.user)
+        stale.cancel(reason="duplicate charge")
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.amount_paid, Decimal("1000.00"))
+        self.assertEqual(self.bill.balance, Decimal("0.00"))
+        self.assertEqual(self.bill.status, Billing.STATUS_CANCELLED)
+
+    def test_stale_full_save_keeps_balance_and_rollups(self):
+        stale = Billing.objects.get(pk=self.bill.pk)
+        self.bill.create_payment(amount="400", user=self.user)
+        stale.amount = Decimal("1500.00")
+        stale.save()
+        self.bill.refresh_from_db()
+        self.assertEqual((self.bill.amount_paid, self.bill.balance), (Decimal("400.00"), Decimal("1100.00")))
+
+        incremental = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, rollup_rows())
+
+    def test_rebuild_command_reports_and_fixes_drift(self):
+        Payment.objects.create(billing=self.bill, amount=Decimal("250.00"))
+        Billing.objects.filter(pk=self.bill.pk).update(amount_paid=Decimal("0.00"), balance=Decimal("1000.00"))
+        # The rollups summed the drifted bill totals too
+        skewed = BillingDailyRollup.objects.filter(payment_method="", bill_count=1).update(
+            paid_amount=Decimal("0.00"), balance_amount=Decimal("1000.00")
+        )
+        self.assertEqual(skewed, 1)
+
+        out = StringIO()
+        call_command("rebuild_billing_balances", "--dry-run", stdout=out)
+        self.assertIn("1 billing record(s) drifted", out.getvalue())
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.amount_paid, Decimal("0.00"))
+
+        call_command("rebuild_billing_balances", stdout=StringIO())
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.amount_paid, Decimal("250.00"))
+        self.assertEqual(self.bill.balance, Decimal("750.00"))
+
+        # The repaired totals reach the daily rollups too
+        incremental = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, rollup_rows())
+
+
+class AddPaymentQueryCountTests(APITestCase):
+    """Pin the query budget of BillingViewSet.add_payment so status refresh stays single-pass."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.patient = Patient.objects.create(first_name="Jane", last_name="Doe")
+        self.bill = Billing.objects.create(patient=self.patient, service="consultation", charged_by=self.user)
+        self.url = reverse("billing-add-payment", args=[self.bill.pk])
+        self.client.force_authenticate(user=self.user)
+
+    def test_add_payment_query_count(self):
+        # get_object, savepoint, row lock, payment INSERT, one bill UPDATE, one rollup upsert,
+        # release, then response serialization (payments, payer)
+        with self.assertNumQueries(9):
+            resp = self.client.post(self.url, {"amount": "400", "payment_method": "mpesa"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["billing"]["status"], Billing.STATUS_PARTIAL)
+        self.assertEqual(Decimal(resp.data["billing"]["amount_paid"]), Decimal("400.00"))
+
+    def test_settling_payment_moves_patient_once(self):
+        resp = self.client.post(self.url, {"amount": "1000"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(resp.data["billing"]["is_paid"])
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.status, "ready_for_doctor")
+        self.assertEqual(self.patient.status_history.filter(new_status="ready_for_doctor").count(), 1)
+
+
+class BillingListQueryCountTests(APITestCase):
+    """List/search must cost the same number of queries whatever the page holds."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("billing-list")
+
+    def _seed(self, count):
+        for i in range(count):
+            patient = Patient.objects.create(first_name=f"P{i}", last_name="Doe")
+            bill = Billing.objects.create(patient=patient, service="consultation", charged_by=self.user)
+            bill.create_payment(amount="100", user=self.user)
+
+    def test_list_query_count_is_constant(self):
+        self._seed(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url, {"expand": "patient_bills"})
+        self._seed(8)
+        with CaptureQueriesContext(connection) as large:
+            resp = self.client.get(self.url, {"expand": "patient_bills"})
+        self.assertEqual(len(resp.data), 10)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(resp.data[0]["patient_bills"]), 1)
+
+
+class PatientBillsEndpointTests(APITestCase):
+    """patient_bills is opt-in on the list and paged separately per patient."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.patient = Patient.objects.create(first_name="Long", last_name="Stay")
+        for _ in range(5):
+            Billing.objects.create(patient=self.patient, service="admission", charged_by=self.user)
+
+    def test_list_omits_patient_bills_by_default(self):
+        resp = self.client.get(reverse("billing-list"))
+        self.assertNotIn("patient_bills", resp.data[0])
+        resp = self.client.get(reverse("billing-list"), {"expand": "patient_bills"})
+        self.assertEqual(len(resp.data[0]["patient_bills"]), 5)
+
+    def test_patient_endpoint_pages_with_cursor(self):
+        url = reverse("billing-patient-bills", kwargs={"patient_id": self.patient.pk})
+        first = self.client.get(url, {"page_size": 3})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data["results"]), 3)
+        second = self.client.get(first.data["next"])
+        self.assertEqual(len(second.data["results"]), 2)
+        seen = {row["id"] for row in first.data["results"] + second.data["results"]}
+        self.assertEqual(len(seen), 5)
+
+    def test_patient_endpoint_unknown_patient(self):
+        url = reverse("billing-patient-bills", kwargs={"patient_id": 999999})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BillingReportsTests(APITestCase):
+    """reports is computed in one grouped query and honours the optional filters."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("billing-reports")
+        paid = Billing.objects.create(service="consultation", charged_by=self.user)
+        paid.create_payment(amount="1000", user=self.user)
+        partial = Billing.objects.create(service="laboratory", charged_by=self.user)
+        partial.create_payment(amount="200", user=self.user)
+        Billing.objects.create(service="imaging", charged_by=self.user).cancel(reason="wrong patient")
+
+    def test_summary_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            summary = Billing.objects.report_summary()
+        self.assertEqual(summary["total_paid"], Decimal("1000.00"))
+        self.assertEqual(summary["total_unpaid"], Decimal("4200.00"))
+        self.assertEqual(summary["total_partial"], Decimal("1200.00"))
+        self.assertEqual(summary["total_cancelled"], Decimal("3000.00"))
+        self.assertEqual(summary["total_collected"], Decimal("1200.00"))
+        self.assertEqual(summary["total_outstanding"], Decimal("1000.00"))
+        self.assertEqual(summary["by_service"][0], {"service": "imaging", "total": Decimal("3000.00")})
+
+    def test_filters(self):
+        resp = self.client.get(self.url, {"service": "laboratory"})
+        self.assertEqual(Decimal(str(resp.data["total_partial"])), Decimal("1200.00"))
+        self.assertEqual(Decimal(str(resp.data["total_paid"])), Decimal("0.00"))
+        resp = self.client.get(self.url, {"date_from": "2000-01-01", "date_to": "2000-01-31"})
+        self.assertEqual(resp.data["by_service"], [])
+        resp = self.client.get(self.url, {"date_from": "not-a-date"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BillingDailyRollupTests(TestCase):
+    """Incremental rollups must match a from-scratch rebuild after any mix of writes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="cashier", password="pass")
+        self.patient = Patient.objects.create(first_name="Jane", last_name="Doe")
+
+    def test_incremental_matches_rebuild(self):
+        paid = Billing.objects.create(patient=self.patient, service="consultation", charged_by=self.user)
+        paid.create_payment(amount="1000", method="mpesa", user=self.user)
+        partial = Billing.objects.create(patient=self.patient, service="laboratory", charged_by=self.user)
+        refund = partial.create_payment(amount="300", method="cash", user=self.user)
+        partial.create_payment(amount="200", method="cash", user=self.user)
+        refund.delete()
+        Billing.objects.create(patient=self.patient, service="imaging").cancel(reason="duplicate")
+        gone = Billing.objects.create(patient=self.patient, service="pharmacy")
+        gone.create_payment(amount="100", user=self.user)
+        gone.delete()
+
+        incremental = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, rollup_rows())
+
+        summary = BillingDailyRollup.objects.report_summary()
+        ledger = Billing.objects.report_summary()
+        for key in ("total_paid", "total_unpaid", "total_partial", "total_cancelled", "total_collected",
+                    "total_outstanding", "by_service"):
+            self.assertEqual(summary[key], ledger[key])
+        self.assertEqual(
+            {row["payment_method"]: row["total"] for row in summary["by_payment_method"]},
+            {"mpesa": Decimal("1000.00"), "cash": Decimal("200.00")},
+        )
+
+    def test_patient_delete_cascade_keeps_rollups_consistent(self):
+        bill = Billing.objects.create(patient=self.patient, service="consultation")
+        bill.create_payment(amount="400", user=self.user)
+        self.patient.delete()
+        self.assertEqual(rollup_rows(), [])
+
+
+class BillingSearchTests(APITestCase):
+    """Exact identifiers take the indexed fast path; free text matches the cached name."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.jane = Patient.objects.create(first_name="Jane", last_name="Wanjiru")
+        self.john = Patient.objects.create(first_name="John", last_name="Otieno")
+        self.jane_bill = Billing.objects.create(patient=self.jane, service="consultation")
+        self.john_bill = Billing.objects.create(patient=self.john, service="laboratory")
+
+    def _ids(self, resp):
+        return {row["id"] for row in resp.data}
+
+    def test_exact_fast_paths(self):
+        bills = Billing.objects.by_patient_name_or_id(self.jane_bill.invoice_number.lower())
+        self.assertEqual(list(bills), [self.jane_bill])
+        self.jane.refresh_from_db()
+        self.assertEqual(list(Billing.objects.by_patient_name_or_id(self.jane.patient_number)), [self.jane_bill])
+        self.assertEqual(list(Billing.objects.by_patient_name_or_id(str(self.john.pk))), [self.john_bill])
+
+    def test_search_action_and_filter_share_backend(self):
+        resp = self.client.get(reverse("billing-search"), {"q": "wanji"})
+        self.assertEqual(self._ids(resp), {self.jane_bill.pk})
+        resp = self.client.get(reverse("billing-list"), {"search": "otieno"})
+        self.assertEqual(self._ids(resp), {self.john_bill.pk})
+        resp = self.client.get(reverse("billing-list"), {"search": self.john_bill.invoice_number})
+        self.assertEqual(self._ids(resp), {self.john_bill.pk})
+
+    def test_search_covers_service_and_cashier(self):
+        Billing.objects.filter(pk=self.jane_bill.pk).update(charged_by_name="Mary Cashier")
+        resp = self.client.get(reverse("billing-list"), {"search": "laboratory"})
+        self.assertEqual(self._ids(resp), {self.john_bill.pk})
+        resp = self.client.get(reverse("billing-list"), {"search": "cashier"})
+        self.assertEqual(self._ids(resp), {self.jane_bill.pk})
+
+    def test_misspelled_name_matches_on_postgres(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("trigram similarity needs pg_trgm")
+        resp = self.client.get(reverse("billing-search"), {"q": "wanjiro"})
+        self.assertEqual(self._ids(resp), {self.jane_bill.pk})
+
+
+class BulkPaymentTests(APITestCase):
+    """Statement batches are matched set-based, reported per line and idempotent on reference_number."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("billing-bulk-payments")
+        self.patient = Patient.objects.create(first_name="Jane", last_name="Doe")
+        self.bill = Billing.objects.create(patient=self.patient, service="consultation")
+        self.other = Billing.objects.create(patient=self.patient, service="laboratory")
+        self.patient.refresh_from_db()
+
+    def _lines(self):
+        return [
+            {"invoice_number": self.bill.invoice_number, "amount": "600", "method": "mpesa", "reference_number": "QAB1"},
+            {"invoice_number": self.bill.invoice_number, "amount": "400", "method": "mpesa", "reference_number": "QAB2"},
+            {"reference": self.patient.patient_number, "amount": "100", "method": "bank_transfer", "reference_number": "BNK9"},
+            {"invoice_number": "INV-AA-20000101-FFFFFF", "amount": "50", "reference_number": "QAB3"},
+            {"invoice_number": self.bill.invoice_number, "amount": "-5", "reference_number": "QAB4"},
+        ]
+
+    def test_batch_report_and_idempotency(self):
+        resp = self.client.post(self.url, {"lines": self._lines()}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["status"] for row in resp.data["lines"]],
+                         ["matched", "matched", "matched", "unmatched", "invalid"])
+        self.assertEqual(resp.data["summary"]["total_amount"], Decimal("1100.00"))
+
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.status, Billing.STATUS_PAID)
+        self.assertEqual(self.bill.amount_paid, Decimal("1000.00"))
+        self.assertEqual(Billing.objects.get(pk=self.other.pk).status, Billing.STATUS_PARTIAL)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.status, "ready_for_doctor")
+
+        again = self.client.post(self.url, self._lines(), format="json")
+        self.assertEqual(again.data["summary"]["duplicate"], 3)
+        self.assertEqual(Payment.objects.count(), 3)
+        incremental = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, rollup_rows())
+
+    def test_csv_upload(self):
+        content = (
+            "invoice_number,amount,method,reference_number\n"
+            f"{self.bill.invoice_number},1000,mpesa,QXY1\n"
+            f"{self.bill.invoice_number},1000,mpesa,QXY1\n"
+        )
+        upload = SimpleUploadedFile("statement.csv", content.encode(), content_type="text/csv")
+        resp = self.client.post(self.url, {"file": upload}, format="multipart")
+        self.assertEqual([row["status"] for row in resp.data["lines"]], ["matched", "duplicate"])
+
+
+class IdempotencyKeyTests(APITestCase):
+    """Retried payment requests replay the stored response instead of posting again."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.bill = Billing.objects.create(service="consultation", charged_by=self.user)
+        self.url = reverse("billing-add-payment", args=[self.bill.pk])
+
+    def test_repeated_key_replays_without_touching_ledger(self):
+        body = {"amount": "400", "payment_method": "mpesa", "reference_number": "QWE123"}
+        first = self.client.post(self.url, body, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(1):
+            again = self.client.post(self.url, body, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(again.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual(again.data["payment"]["id"], first.data["payment"]["id"])
+        self.assertEqual(Payment.objects.count(), 1)
+
+        other = self.client.post(self.url, {"amount": "1"}, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(other.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        mark = self.client.post(reverse("billing-mark-paid", args=[self.bill.pk]), {}, format="json",
+                                HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(mark.status_code, status.HTTP_200_OK)
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.amount_paid, Decimal("1000.00"))
+
+    def test_duplicate_reference_is_rejected_by_the_database(self):
+        body = {"amount": "100", "reference_number": "QWE999"}
+        self.assertEqual(self.client.post(self.url, body, format="json").status_code, status.HTTP_201_CREATED)
+        resp = self.client.post(self.url, body, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.amount_paid, Decimal("100.00"))
+
+
+class ConcurrentPaymentTests(TransactionTestCase):
+    """Balances are read under the bill row lock, so racing cashiers cannot overpay."""
+
+    # Keep the seeded price catalog across the table flushes between tests
+    serialized_rollback = True
+
+    def test_stale_mark_paid_pays_once(self):
+        bill = Billing.objects.create(service="consultation")
+        first, second = Billing.objects.get(pk=bill.pk), Billing.objects.get(pk=bill.pk)
+        self.assertIsNotNone(pay_balance(first))
+        self.assertIsNone(pay_balance(second))
+        self.assertEqual(second.status, Billing.STATUS_PAID)
+        self.assertEqual(bill.payments.count(), 1)
+        bill.refresh_from_db()
+        self.assertEqual(bill.amount_paid, Decimal("1000.00"))
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_concurrent_payment_threads(self):
+        out = StringIO()
+        call_command("stress_billing_payments", "--threads", "8", "--payments", "40", stdout=out)
+        self.assertIn("No lost updates or overpayment.", out.getvalue())
+
+
+class InvoiceNumberTests(TestCase):
+    """Invoice numbers come from a per-day counter: monotonic, block-allocated, no retries."""
+
+    def test_numbers_are_sequential_per_day(self):
+        first = Billing.objects.create(service="consultation")
+        second = Billing.objects.create(service="laboratory")
+        prefix, number = first.invoice_number.rsplit("-", 1)
+        self.assertEqual(second.invoice_number, f"{prefix}-{int(number) + 1:06d}")
+        self.assertLess(first.invoice_number, second.invoice_number)
+
+    def test_block_allocation_for_bulk_create(self):
+        with self.assertNumQueries(1):
+            block = allocate_invoice_numbers(3, day=date(2026, 1, 5))
+        self.assertEqual(block, ["INV-AA-20260105-000001", "INV-AA-20260105-000002", "INV-AA-20260105-000003"])
+
+        bills = assign_invoice_numbers([Billing(service="other", amount=Decimal("10.00")) for _ in range(4)])
+        Billing.objects.bulk_create(bills)
+        numbers = [int(bill.invoice_number.rsplit("-", 1)[1]) for bill in bills]
+        self.assertEqual(numbers, list(range(numbers[0], numbers[0] + 4)))
+        self.assertEqual(allocate_invoice_numbers(1, day=date(2026, 1, 5)), ["INV-AA-20260105-000004"])
+
+
+class BillingExportTests(APITestCase):
+    """Exports stream plain rows (CSV or NDJSON) without serializing nested payments."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("billing-export")
+        self.bill = Billing.objects.create(service="consultation", charged_by=self.user)
+        self.bill.create_payment(amount="250", method="mpesa", reference="QEX1", user=self.user)
+        Billing.objects.create(service="laboratory", charged_by=self.user)
+
+    def test_csv_bills(self):
+        resp = self.client.get(self.url, {"service": "consultation"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "invoice_number", "created_at"])
+        self.assertEqual(len(lines), 2)
+        self.assertIn(self.bill.invoice_number, lines[1])
+
+    def test_csv_escapes_formula_cells(self):
+        Billing.objects.filter(pk=self.bill.pk).update(patient_name="=HYPERLINK(\"http://x\")", charged_by_name="@SUM(1)")
+        resp = self.client.get(self.url, {"service": "consultation"})
+        rows = list(csv.DictReader(io.StringIO(b"".join(resp.streaming_content).decode())))
+        self.assertEqual(rows[0]["patient_name"], "'=HYPERLINK(\"http://x\")")
+        self.assertEqual(rows[0]["charged_by_name"], "'@SUM(1)")
+        self.assertEqual(rows[0]["amount"], "1000.00")
+
+    def test_ndjson_payments(self):
+        resp = self.client.get(self.url, {"dataset": "payments", "output": "ndjson"})
+        rows = [json.loads(line) for line in b"".join(resp.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["billing_invoice_number"], self.bill.invoice_number)
+        self.assertEqual(Decimal(rows[0]["amount"]), Decimal("250.00"))
+
+    def test_bad_params(self):
+        self.assertEqual(self.client.get(self.url, {"output": "xlsx"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"date_to": "soon"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchActionTests(APITestCase):
+    """Batch actions work set-based and answer with a compact summary."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.bills = [Billing.objects.create(service="consultation") for _ in range(3)]
+        self.bills[0].create_payment(amount="400", user=self.user)
+        Billing.objects.create(service="laboratory")
+
+    def test_batch_mark_paid_by_ids(self):
+        ids = [bill.pk for bill in self.bills]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(reverse("billing-batch-mark-paid"), {"ids": ids, "payment_method": "insurance"},
+                                    format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["paid"], 3)
+        self.assertEqual(resp.data["total_amount"], Decimal("2600.00"))
+        self.assertNotIn("payments", resp.data)
+        self.assertEqual(Billing.objects.filter(pk__in=ids, status=Billing.STATUS_PAID).count(), 3)
+        self.assertEqual(Payment.objects.filter(payment_method="insurance").count(), 3)
+
+        again = self.client.post(reverse("billing-batch-mark-paid"), {"ids": ids}, format="json")
+        self.assertEqual(again.data["paid"], 0)
+        self.assertLess(len(ctx), 20)
+
+    def test_batch_cancel_by_filter(self):
+        resp = self.client.post(reverse("billing-batch-cancel"),
+                                {"filter": {"service": "consultation"}, "reason": "wrong clinic"}, format="json")
+        self.assertEqual(resp.data["cancelled"], 3)
+        self.assertEqual(Billing.objects.filter(status=Billing.STATUS_CANCELLED).count(), 3)
+        self.assertIn("wrong clinic", Billing.objects.get(pk=self.bills[1].pk).report_reference)
+        incremental = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, rollup_rows())
+
+    def test_requires_a_selection(self):
+        resp = self.client.post(reverse("billing-batch-cancel"), {}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rejects_malformed_ids_and_patient_id(self):
+        for body in ({"ids": [True]}, {"ids": [self.bills[0].pk, "2"]},
+                     {"filter": {"patient_id": "abc"}}, {"filter": {"patient_id": False}}):
+            resp = self.client.post(reverse("billing-batch-cancel"), body, format="json")
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, body)
+        self.assertFalse(Billing.objects.filter(status=Billing.STATUS_CANCELLED).exists())
+
+
+class ServicePriceCatalogTests(TestCase):
+    """Prices come from the effective-dated catalog, cached in-process and invalidated by version."""
+
+    def setUp(self):
+        price_catalog.clear()
+        self.addCleanup(price_catalog.clear)
+        self.today = timezone.localdate()
+
+    def test_effective_dated_price_and_invalidation(self):
+        self.assertEqual(Billing.objects.create(service="consultation").amount, Decimal("1000.00"))
+        ServicePrice.objects.create(service="consultation", amount=Decimal("1500.00"),
+                                    effective_from=self.today + timedelta(days=1))
+        self.assertEqual(Billing.objects.create(service="consultation").amount, Decimal("1000.00"))
+        ServicePrice.objects.create(service="consultation", amount=Decimal("1200.00"), effective_from=self.today)
+        self.assertEqual(Billing.objects.create(service="consultation").amount, Decimal("1200.00"))
+
+    def test_warm_lookup_costs_no_query(self):
+        price_catalog.price_for("laboratory")
+        with self.assertNumQueries(0):
+            self.assertEqual(price_catalog.price_for("laboratory"), Decimal("1200.00"))
+            self.assertIsNone(price_catalog.price_for("laboratory", currency="USD"))
+
+    @override_settings(BILLING_FACILITY="KNH")
+    def test_facility_price_wins(self):
+        ServicePrice.objects.create(service="imaging", facility="KNH", amount=Decimal("3500.00"),
+                                    effective_from=date(2020, 1, 1))
+        self.assertEqual(price_catalog.price_for("imaging"), Decimal("3500.00"))
+        self.assertEqual(price_catalog.price_for("imaging", facility=""), Decimal("3000.00"))
+
+    def test_existing_bill_keeps_its_price_on_resave(self):
+        bill = Billing.objects.create(service="consultation")
+        ServicePrice.objects.create(service="consultation", amount=Decimal("1300.00"), effective_from=date(2001, 1, 1))
+        bill.save()
+        self.assertEqual(bill.amount, Decimal("1000.00"))
+        bill.service = "laboratory"
+        bill.save()
+        self.assertEqual(bill.amount, Decimal("1200.00"))
+
+    def test_bulk_path_prices_in_one_query(self):
+        price_catalog.price_for("consultation")
+        bills = [Billing(service=service) for service in ("consultation", "laboratory", "imaging") * 10]
+        # counter upsert, bulk insert, rollup upsert (+ savepoint/release)
+        with self.assertNumQueries(5):
+            create_bills(bills)
+        self.assertEqual(Billing.objects.filter(service="imaging", amount=Decimal("3000.00")).count(), 10)
+        incremental = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, rollup_rows())
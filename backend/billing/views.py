@@ -3,23 +3,109 @@
 ViewSets for Billing and Payment.
 
 - BillingViewSet: list/create/retrieve/update/destroy plus custom actions:
-  - reports: aggregated metrics
+  - reports: aggregated metrics from BillingDailyRollup (optional date/service/currency filters)
   - search: search by patient/invoice
+  - export: stream bills/payments as CSV or NDJSON (/api/billing/export/)
+  - patient_bills: keyset-paginated bills for one patient (/api/billing/patient/<id>/)
   - add_payment: create a payment for a given bill
   - mark_paid: create payment for outstanding balance
+  - bulk_payments: post a batch of statement lines (/api/billing/payments/bulk/)
   - cancel: mark bill cancelled
-- PaymentViewSet: list/create/retrieve/update/delete payments directly (each action refreshes billing status)
+  - batch_mark_paid / batch_cancel: settle or cancel many bills (ids or filter) in one transaction
+- PaymentViewSet: list/create/retrieve/update/delete payments directly (each write settles the bill
+  once through billing.services)
 """
 
+import csv
+import io
 from decimal import Decimal
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import filters
-from django.db.models import Sum
+from django.db import IntegrityError
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from .models import Billing, Payment
-from .serializers import BillingSerializer, PaymentSerializer
+from afyaaccess.pagination import KeysetPagination
+from patients.models import Patient
+from .models import Billing, BillingDailyRollup, Payment
+from .exports import FORMATS, export_rows, stream_csv, stream_ndjson
+from .idempotency import idempotent
+from .pagination import PatientBillsCursorPagination
+from .search import BillingSearchFilter
+from .serializers import BillingSerializer, PatientBillSerializer, PaymentSerializer, requested_expansions
+from .services import (
+    MAX_BATCH_BILLS,
+    MAX_BULK_PAYMENT_LINES,
+    apply_payment,
+    batch_cancel,
+    batch_mark_paid,
+    pay_balance,
+    post_bulk_payments,
+)
+
+
+def report_filters(params):
+    """Parse the shared report/export filters; returns (filters, None) or (None, 400 response)."""
+    filters_ = {"service": params.get("service") or None, "currency": params.get("currency") or None}
+    for name in ("date_from", "date_to"):
+        raw = params.get(name)
+        value = parse_date(raw) if raw else None
+        if raw and value is None:
+            return None, Response({"detail": f"{name} must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        filters_[name] = value
+    return filters_, None
+
+
+def _is_int(value):
+    # JSON true/false arrive as bool, a subclass of int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def batch_selection(data):
+    """
+    Bills targeted by a batch action: {"ids": [...]} or {"filter": {...}} where the filter takes
+    the report filters plus patient_id and status. Returns (queryset, None) or (None, 400 response).
+    """
+    ids, filter_ = data.get("ids"), data.get("filter")
+    if ids:
+        if not isinstance(ids, list) or not all(_is_int(pk) for pk in ids):
+            return None, Response({"detail": "ids must be a list of integers"}, status=status.HTTP_400_BAD_REQUEST)
+        bills = Billing.objects.filter(pk__in=ids)
+    elif isinstance(filter_, dict) and filter_:
+        patient_id = filter_.get("patient_id")
+        if patient_id is not None and not _is_int(patient_id):
+            return None, Response(
+                {"detail": "filter.patient_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        filters_, error = report_filters(filter_)
+        if error:
+            return None, error
+        bills = Billing.objects.report_filter(**filters_)
+        if patient_id is not None:
+            bills = bills.filter(patient_id=patient_id)
+        if filter_.get("status"):
+            bills = bills.filter(status=filter_["status"])
+    else:
+        return None, Response({"detail": "Provide ids or a non-empty filter"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if bills.count() > MAX_BATCH_BILLS:
+        return None, Response(
+            {"detail": f"At most {MAX_BATCH_BILLS} bills per batch; narrow the selection"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return bills, None
+
+
+def duplicate_reference_response():
+    """409 for a payment whose reference_number is already on the same bill (unique index)."""
+    return Response(
+        {"detail": "A payment with this reference_number is already recorded for this bill"},
+        status=status.HTTP_409_CONFLICT,
+    )
 
 
 class BillingViewSet(viewsets.ModelViewSet):
@@ -27,45 +113,139 @@ class BillingViewSet(viewsets.ModelViewSet):
 
     queryset = Billing.objects.all().order_by("-created_at")
     serializer_class = BillingSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["invoice_number", "patient_name", "service", "charged_by_name"]
-    ordering_fields = ["created_at", "amount"]
+    filter_backends = [BillingSearchFilter, filters.OrderingFilter]
+    ordering_fields = ["created_at", "amount", "balance"]
+
+    # Read-only collection actions that render many bills at once
+    LIST_ACTIONS = ("list", "search")
+
+    def get_queryset(self):
+        """
+        For list actions, prefetch payments together with the user who recorded them
+        (one extra query per page). Detail actions that add payments skip it so the
+        rendered bill never shows a stale prefetched payment list.
+        """
+        queryset = super().get_queryset()
+        if self.action in self.LIST_ACTIONS:
+            queryset = queryset.prefetch_related(
+                Prefetch("payments", queryset=Payment.objects.select_related("created_by"))
+            )
+        return queryset
+
+    def list_response(self, queryset):
+        """
+        Paginate and serialize bills with a constant number of queries:
+        the page itself, the payments prefetch and (with ?expand=patient_bills)
+        one grouped patient_bills query.
+        """
+        page = self.paginate_queryset(queryset)
+        rows = list(page if page is not None else queryset)
+        context = self.get_serializer_context()
+        if "patient_bills" in requested_expansions(self.request):
+            context["patient_bills"] = Billing.objects.patient_bills_map(
+                [bill.patient_id for bill in rows if bill.patient_id]
+            )
+        serializer = self.get_serializer(rows, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        """List bills (search/ordering filters applied) without per-row queries."""
+        return self.list_response(self.filter_queryset(self.get_queryset()))
 
     @action(detail=False, methods=["get"])
     def reports(self, request):
-        """Return aggregated billing metrics for dashboards."""
-        total_paid = Billing.objects.paid_total()
-        total_unpaid = Billing.objects.unpaid_total()
-        total_partial = Billing.objects.filter(status=Billing.STATUS_PARTIAL).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
-        total_cancelled = Billing.objects.cancelled_total()
-        by_service = list(Billing.objects.total_by_service())
-
-        return Response(
-            {
-                "total_paid": total_paid,
-                "total_unpaid": total_unpaid,
-                "total_partial": total_partial,
-                "total_cancelled": total_cancelled,
-                "by_service": by_service,
-            }
-        )
+        """
+        Return aggregated billing metrics for dashboards from the daily rollup table,
+        so any date range sums a few hundred pre-aggregated rows instead of the ledger.
+        Optional filters: date_from, date_to (YYYY-MM-DD, inclusive), service, currency.
+        """
+        filters_, error = report_filters(request.query_params)
+        if error:
+            return error
+        return Response(BillingDailyRollup.objects.report_filter(**filters_).report_summary())
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Stream bills or payments for finance as CSV or NDJSON (constant memory, no serializers).
+        Query params: dataset=bills|payments, output=csv|ndjson, plus the reports filters
+        (date_from, date_to, service, currency).
+        """
+        params = request.query_params
+        dataset = params.get("dataset", "bills")
+        output = params.get("output", "csv")
+        if dataset not in ("bills", "payments") or output not in FORMATS:
+            return Response(
+                {"detail": "dataset must be bills|payments and output must be csv|ndjson"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        filters_, error = report_filters(params)
+        if error:
+            return error
+
+        columns, rows = export_rows(dataset, **filters_)
+        stream = stream_csv if output == "csv" else stream_ndjson
+        response = StreamingHttpResponse(stream(columns, rows), content_type=FORMATS[output])
+        filename = f"billing-{dataset}-{timezone.localdate():%Y%m%d}.{output}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
     @action(detail=False, methods=["get"])
     def search(self, request):
-        """Search bills by patient name/ID or invoice (preserves your earlier helper)."""
+        """Search bills by patient name/number/ID or invoice; free-text hits come back best match first."""
         q = request.query_params.get("q", None)
+        bills = self.get_queryset().order_by("-created_at")
         if q:
-            bills = Billing.objects.by_patient_name_or_id(q).order_by("-created_at")
+            bills = bills.by_patient_name_or_id(q)
+        return self.list_response(bills)
+
+    @action(detail=False, methods=["post"], url_path="payments/bulk")
+    def bulk_payments(self, request):
+        """
+        Post a batch of M-Pesa/bank statement lines in one request.
+        Body: a CSV upload in `file` (header: invoice_number|reference, amount, method, reference_number)
+        or JSON {"lines": [{...}, ...]} (a bare JSON list also works).
+        Lines already posted under the same reference_number come back as duplicates.
+        """
+        upload = request.FILES.get("file")
+        if upload is not None:
+            try:
+                lines = list(csv.DictReader(io.TextIOWrapper(upload.file, encoding="utf-8-sig")))
+            except (UnicodeDecodeError, csv.Error) as exc:
+                return Response({"detail": f"Unreadable CSV: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
         else:
-            bills = Billing.objects.all().order_by("-created_at")
-        page = self.paginate_queryset(bills)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(bills, many=True)
-        return Response(serializer.data)
+            lines = request.data.get("lines") if isinstance(request.data, dict) else request.data
+        if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+            return Response({"detail": "Provide a CSV file or a list of lines"}, status=status.HTTP_400_BAD_REQUEST)
+        if not lines:
+            return Response({"detail": "No lines to post"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(lines) > MAX_BULK_PAYMENT_LINES:
+            return Response(
+                {"detail": f"At most {MAX_BULK_PAYMENT_LINES} lines per batch"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        report, summary = post_bulk_payments(lines, user=request.user)
+        return Response({"summary": summary, "lines": report}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path=r"patient/(?P<patient_id>\d+)")
+    def patient_bills(self, request, patient_id=None):
+        """
+        Bills for one patient, newest first, with keyset (cursor) pagination.
+        Replaces embedding every bill of the patient into each billing row.
+        """
+        if not Patient.objects.filter(pk=patient_id).exists():
+            raise Http404("Patient not found.")
+        bills = Billing.objects.filter(patient_id=patient_id)
+        paginator = PatientBillsCursorPagination()
+        page = paginator.paginate_queryset(bills, request, view=self)
+        serializer = PatientBillSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["post"])
+    @idempotent
     def add_payment(self, request, pk=None):
         """
         Add a payment to this billing record.
@@ -86,25 +266,56 @@ class BillingViewSet(viewsets.ModelViewSet):
         if amount_dec <= Decimal("0.00"):
             return Response({"detail": "amount must be positive"}, status=status.HTTP_400_BAD_REQUEST)
 
-        payment = billing.create_payment(amount=amount_dec, method=method, reference=reference, user=request.user)
+        try:
+            payment = apply_payment(billing, amount_dec, method=method, reference=reference, user=request.user)
+        except IntegrityError:
+            return duplicate_reference_response()
         payment_data = PaymentSerializer(payment, context={"request": request}).data
         billing_data = BillingSerializer(billing, context={"request": request}).data
         return Response({"payment": payment_data, "billing": billing_data}, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=["post"])
+    @idempotent
     def mark_paid(self, request, pk=None):
         """Pay outstanding balance in full (creates Payment entry and updates billing status)."""
         billing = self.get_object()
-        balance = billing.calculate_balance()
-        if balance <= Decimal("0.00"):
+        method = request.data.get("payment_method", "manual")
+        reference = request.data.get("reference_number", None)
+        try:
+            # Balance is read under the bill lock, so concurrent mark_paid calls pay it once
+            payment = pay_balance(billing, method=method, reference=reference, user=request.user)
+        except IntegrityError:
+            return duplicate_reference_response()
+        if payment is None:
             serializer = BillingSerializer(billing, context={"request": request})
             return Response(serializer.data, status=status.HTTP_200_OK)
+        serializer = BillingSerializer(billing, context={"request": request})
+        return Response({"payment_id": payment.id, "billing": serializer.data}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["post"])
+    def batch_mark_paid(self, request):
+        """
+        Settle many bills at once (e.g. an insurance batch).
+        POST body: {"ids": [1, 2]} or {"filter": {...}}, optional payment_method, reference_number.
+        """
+        bills, error = batch_selection(request.data)
+        if error:
+            return error
         method = request.data.get("payment_method", "manual")
         reference = request.data.get("reference_number", None)
-        payment = billing.create_payment(amount=balance, method=method, reference=reference, user=request.user)
-        serializer = BillingSerializer(billing, context={"request": request})
-        return Response({"payment_id": payment.id, "billing": serializer.data}, status=status.HTTP_200_OK)
+        try:
+            summary = batch_mark_paid(bills, method=method, reference=reference, user=request.user)
+        except IntegrityError:
+            return duplicate_reference_response()
+        return Response(summary, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"])
+    def batch_cancel(self, request):
+        """Cancel many bills at once. POST body: {"ids": [...]} or {"filter": {...}}, optional reason."""
+        bills, error = batch_selection(request.data)
+        if error:
+            return error
+        return Response(batch_cancel(bills, reason=request.data.get("reason")), status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["post"])
     def cancel(self, request, pk=None):
@@ -127,7 +338,9 @@ class PaymentViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ["reference_number", "payment_method"]
     ordering_fields = ["created_at", "amount"]
+    pagination_class = KeysetPagination
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Ensure created_by is set from request user (audit) and return updated billing in response.
@@ -137,7 +350,10 @@ class PaymentViewSet(viewsets.ModelViewSet):
             request_data["created_by"] = request.user.pk
         serializer = self.get_serializer(data=request_data)
         serializer.is_valid(raise_exception=True)
-        payment = serializer.save()
+        try:
+            payment = serializer.save()
+        except IntegrityError:
+            return duplicate_reference_response()
         billing_data = BillingSerializer(payment.billing, context={"request": request}).data
         payment_data = serializer.data
         return Response({"payment": payment_data, "billing": billing_data}, status=status.HTTP_201_CREATED)
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultation", "0006_alter_prescriptionitem_dose_and_more"),
+        ("patients", "0011_patient_patients_created_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="consultation",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="consultation_created_idx"
+            ),
+        ),
+    ]
@@ -65,6 +65,12 @@ class Consultation(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the consultation list (newest first)
+            models.Index(fields=["-created_at", "-id"], name="consultation_created_idx"),
+        ]
+
     def __str__(self):
         return f"Consultation #{self.id} for {self.patient}"
 
@@ -1,5 +1,7 @@
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
+
+from afyaaccess.pagination import KeysetPagination
 from .models import Consultation, Prescription, PrescriptionItem, Investigation, Diagnosis
 from .serializers import (
     ConsultationSerializer,
@@ -18,6 +20,7 @@ class ConsultationViewSet(viewsets.ModelViewSet):
     queryset = Consultation.objects.all().order_by("-created_at")
     serializer_class = ConsultationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
 
 # ViewSet for Prescriptions
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultation", "0007_consultation_consultation_created_idx"),
+        ("lab", "0002_alter_labrequest_options_alter_labresult_options_and_more"),
+        ("patients", "0011_patient_patients_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="labrequest",
+            index=models.Index(
+                fields=["-requested_at", "-id"], name="lab_request_requested_idx"
+            ),
+        ),
+    ]
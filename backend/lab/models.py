@@ -89,6 +89,10 @@ class LabRequest(models.Model):
 
     class Meta:
         ordering = ["-requested_at"]              # newest requests first by default
+        indexes = [
+            # Keyset pagination of the request list (newest first)
+            models.Index(fields=["-requested_at", "-id"], name="lab_request_requested_idx"),
+        ]
         verbose_name = "Lab Request"
         verbose_name_plural = "Lab Requests"
 
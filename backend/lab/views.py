@@ -12,11 +12,15 @@ from .serializers import LabRequestSerializer, LabResultSerializer
 from .permissions import IsDoctor, IsLabTechOrReadOnly
 from rest_framework.permissions import IsAuthenticated
 
+from afyaaccess.pagination import KeysetPagination
+
 # ViewSet for LabRequest
 class LabRequestViewSet(viewsets.ModelViewSet):
     queryset = LabRequest.objects.all().select_related("patient", "investigation")
     serializer_class = LabRequestSerializer
     permission_classes = [IsAuthenticated]  # creation guarded more strictly via action-level permissions
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-requested_at", "-id")
 
     def get_permissions(self):
         # POST (create) allowed only for doctors
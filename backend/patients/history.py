@@ -0,0 +1,158 @@
+"""
+PatientStatusHistory storage helpers.
+
+On PostgreSQL the history table is range-partitioned by month on changed_at (migration 0014):
+one partition per month named <table>_pYYYYMM, plus a DEFAULT partition that catches rows no
+monthly partition covers. `manage.py archive_status_history` keeps partitions created ahead of
+time and archives old months: rows are written to a gzipped CSV, then the whole partition is
+detached and dropped (no row-by-row DELETE, so no table bloat). Other databases (local SQLite)
+archive the same months with a single range DELETE.
+"""
+import csv
+import gzip
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from .models import PATIENT_STATUS_CODES, PatientStatusHistory
+
+HISTORY_TABLE = PatientStatusHistory._meta.db_table
+DEFAULT_PARTITION = f"{HISTORY_TABLE}_default"
+ARCHIVE_COLUMNS = ("id", "patient_id", "old_status", "new_status", "changed_at", "changed_by_id")
+ARCHIVE_CHUNK_SIZE = 5000
+
+
+def status_code_sql(column):
+    """SQL CASE turning a status string column into its PATIENT_STATUS_CODES code."""
+    whens = " ".join(f"WHEN '{status}' THEN {code}" for code, status, _label in PATIENT_STATUS_CODES)
+    return f"CASE {column} {whens} END"
+
+
+def month_start(value):
+    """First instant (UTC) of the month containing a date/datetime."""
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f"{HISTORY_TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [HISTORY_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def monthly_partitions():
+    """Existing monthly partitions as a sorted list of month starts (PostgreSQL only)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+            [HISTORY_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f"{HISTORY_TABLE}_p"
+    return sorted(
+        datetime.strptime(name[len(prefix):], "%Y%m").replace(tzinfo=dt_timezone.utc)
+        for name in names
+        if name.startswith(prefix)
+    )
+
+
+def _default_has_rows(month, following):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE changed_at >= %s AND changed_at < %s)",
+            [month, following],
+        )
+        return cursor.fetchone()[0]
+
+
+def months_between(first, last):
+    """Month starts from the month of `first` to the month of `last`, inclusive."""
+    month = month_start(first)
+    while month <= month_start(last):
+        yield month
+        month = add_months(month, 1)
+
+
+def create_partitions(first, last):
+    """
+    Create monthly partitions for every month from `first` to `last` (inclusive) that is missing.
+    Rows the DEFAULT partition already holds for a month are moved into the new partition before
+    it is attached (PostgreSQL refuses to attach a range the default partition has rows for).
+    """
+    existing = set(monthly_partitions())
+    created = []
+    for month in months_between(first, last):
+        if month in existing:
+            continue
+        following = add_months(month, 1)
+        name = partition_name(month)
+        bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        if _default_has_rows(month, following):
+            with transaction.atomic():
+                # Writers wait while the month's rows move, so none land in the default meanwhile
+                _execute(f"LOCK TABLE {DEFAULT_PARTITION} IN EXCLUSIVE MODE")
+                _execute(f"CREATE TABLE {name} (LIKE {HISTORY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+                _execute(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE changed_at >= %s AND changed_at < %s "
+                    f"RETURNING *) INSERT INTO {name} SELECT * FROM moved",
+                    [month, following],
+                )
+                _execute(f"ALTER TABLE {HISTORY_TABLE} ATTACH PARTITION {name} {bounds}")
+        else:
+            _execute(f"CREATE TABLE {name} PARTITION OF {HISTORY_TABLE} {bounds}")
+        created.append(month)
+    return created
+
+
+def _execute(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _write_archive(rows, path):
+    """Write history rows (ARCHIVE_COLUMNS tuples) to a gzipped CSV; returns the row count."""
+    count = 0
+    with gzip.open(path, "wt", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(ARCHIVE_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def archive_month(month, directory):
+    """
+    Archive one month of history to <directory>/<table>_pYYYYMM.csv.gz and remove it from the
+    table: detach + drop the partition when partitioned, otherwise one range DELETE.
+    Returns the number of rows archived.
+    """
+    following = add_months(month, 1)
+    path = Path(directory) / f"{partition_name(month)}.csv.gz"
+    rows = (
+        PatientStatusHistory.objects.filter(changed_at__gte=month, changed_at__lt=following)
+        .order_by()
+        .values_list(*ARCHIVE_COLUMNS)
+    )
+    with transaction.atomic():
+        count = _write_archive(rows.iterator(chunk_size=ARCHIVE_CHUNK_SIZE), path)
+        if is_partitioned() and month in monthly_partitions():
+            _execute(f"ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {partition_name(month)}")
+            _execute(f"DROP TABLE {partition_name(month)}")
+        else:
+            # No partition for this month (or not PostgreSQL): rows live in the default partition
+            PatientStatusHistory.objects.filter(changed_at__gte=month, changed_at__lt=following).delete()
+    return count
@@ -0,0 +1,226 @@
+"""
+Bulk patient registration from CSV (facility onboarding, outreach camps).
+
+Rows are processed in batches, each in its own transaction:
+1. parse/validate each row and compute its normalized matching/search columns in Python;
+2. drop rows that duplicate an earlier row of the same file;
+3. find rows that match existing patients with one query: the batch is staged as a VALUES
+   CTE and joined against the indexed national ID, phone and name+dob columns;
+4. reserve a block of patient numbers from the sequence with one query and insert the remaining
+   patients with one multi-row INSERT (without the sequence, number them with one UPDATE);
+5. write their registered -> sent_to_billing status history with one multi-row INSERT.
+Patient signals do not fire (no per-row saves); imported patients start in 'sent_to_billing'
+with the same history row as patients registered one by one, and rejected rows are reported
+to `on_reject`.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .matching import match_keys
+from .models import GENDER_CHOICES, MATCH_KEY_FIELDS, STATUS_TO_CODE, Patient, PatientStatusHistory
+from .numbering import allocate_patient_numbers, patient_number_expression
+from .phonetic import search_columns
+from .queues import queue_board
+
+IMPORT_FIELDS = ("first_name", "last_name", "gender", "dob", "national_id", "phone_number", "address")
+REJECT_COLUMNS = ("row", "reason", "patient_id") + IMPORT_FIELDS
+# Columns written by the import INSERT; 1000 rows x 21 columns stays under SQLite's 32766 parameters
+INSERT_FIELDS = IMPORT_FIELDS + ("patient_number", "created_by", "status", "created_at", "updated_at") + MATCH_KEY_FIELDS
+INSERT_CHUNK_SIZE = 1000
+HISTORY_FIELDS = ("patient", "old_status", "new_status", "changed_at", "changed_by")
+IMPORT_BATCH_SIZE = 2000
+
+GENDERS = {value for value, _label in GENDER_CHOICES}
+
+# Reject reasons
+REJECT_MISSING_NAME = "missing_name"
+REJECT_INVALID_DOB = "invalid_dob"
+REJECT_INVALID_GENDER = "invalid_gender"
+REJECT_DUPLICATE_IN_FILE = "duplicate_in_file"  # suffixed with the first row, e.g. duplicate_in_file:12
+REJECT_DUPLICATE = "duplicate"  # suffixed with the matched signal, e.g. duplicate:national_id
+
+# (reason, patient column, staged column) probed by the duplicate join; each uses a btree index
+DUPLICATE_SIGNALS = (
+    ("national_id", "national_id_normalized", "nid"),
+    ("phone", "phone_normalized", "phone"),
+)
+
+
+def _clean(row):
+    return {field: (str(row.get(field) or "").strip() or None) for field in IMPORT_FIELDS}
+
+
+def _build_record(values, created_by_id):
+    """Return (record, None) for a valid row, where record maps INSERT_FIELDS to values, or (None, reason)."""
+    if not values["first_name"] and not values["last_name"]:
+        return None, REJECT_MISSING_NAME
+    dob = None
+    if values["dob"]:
+        try:
+            dob = parse_date(values["dob"])
+        except ValueError:
+            dob = None
+        if dob is None:
+            return None, REJECT_INVALID_DOB
+    gender = (values["gender"] or "other").lower()
+    if gender not in GENDERS:
+        return None, REJECT_INVALID_GENDER
+    record = dict(values, gender=gender, dob=dob, patient_number=None, created_by=created_by_id, status="sent_to_billing")
+    record.update(match_keys(record))
+    record.update(search_columns(record["first_name"], record["last_name"]))
+    return record, None
+
+
+def _existing_matches(staged):
+    """
+    Match staged rows against existing patients in one query.
+    `staged` is a list of (row_no, record); returns {row_no: (patient_id, signal)}.
+    A name+dob hit also needs the first name to sound the same (twins share surname and dob).
+    """
+    qn = connection.ops.quote_name
+    table = qn(Patient._meta.db_table)
+    params = []
+    for row_no, record in staged:
+        params += [row_no, record["national_id_normalized"], record["phone_normalized"], record["name_dob_key"]]
+    selects = [
+        f"SELECT s.row_no, p.{qn('id')}, '{signal}', NULL FROM staged s "
+        f"JOIN {table} p ON p.{qn(column)} = s.{alias}"
+        for signal, column, alias in DUPLICATE_SIGNALS
+    ]
+    # Joined on the blocking key only (so its index is used); first names are compared below
+    selects.append(
+        f"SELECT s.row_no, p.{qn('id')}, 'name_dob', p.{qn('first_name_phonetic_alt')} FROM staged s "
+        f"JOIN {table} p ON p.{qn('name_dob_key')} = s.dkey"
+    )
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(staged))
+    sql = f"WITH staged (row_no, nid, phone, dkey) AS (VALUES {values}) " + " UNION ALL ".join(selects)
+    first_names = {row_no: record["first_name_phonetic_alt"] for row_no, record in staged}
+    matches = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for row_no, patient_id, signal, first_name in cursor.fetchall():
+            if signal == "name_dob" and (first_name is None or first_name != first_names[row_no]):
+                continue
+            matches.setdefault(row_no, (patient_id, signal))
+    return matches
+
+
+def _insert_rows(model, field_names, rows, returning=None):
+    """
+    Multi-row INSERT of parameter tuples (already adapted), INSERT_CHUNK_SIZE rows per statement.
+    Returns the `returning` column of the inserted rows when given.
+    """
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(model._meta.get_field(name).column) for name in field_names)
+    row_sql = "(" + ", ".join(["%s"] * len(field_names)) + ")"
+    suffix = f" RETURNING {qn(returning)}" if returning else ""
+    inserted = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            chunk = rows[start:start + INSERT_CHUNK_SIZE]
+            cursor.execute(
+                f"INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES {', '.join([row_sql] * len(chunk))}{suffix}",
+                [value for row in chunk for value in row],
+            )
+            if returning:
+                inserted += [row[0] for row in cursor.fetchall()]
+    return inserted
+
+
+def _insert(records, now):
+    """
+    Multi-row INSERT of new patients; returns their ids. Plain parameter tuples rather than
+    bulk_create: per-field model/compiler work would otherwise cost more than the database does.
+    """
+    rows = []
+    for record in records:
+        record["dob"] = connection.ops.adapt_datefield_value(record["dob"])
+        record["created_at"] = record["updated_at"] = now
+        rows.append([record[name] for name in INSERT_FIELDS])
+    return _insert_rows(Patient, INSERT_FIELDS, rows, returning="id")
+
+
+def _insert_history(patient_ids, now, created_by_id):
+    """registered -> sent_to_billing history rows for new patients, stamped with their insert time."""
+    codes = (STATUS_TO_CODE["registered"], STATUS_TO_CODE["sent_to_billing"])
+    rows = [(patient_id, *codes, now, created_by_id) for patient_id in patient_ids]
+    _insert_rows(PatientStatusHistory, HISTORY_FIELDS, rows)
+
+
+def _file_keys(record):
+    keys = [("nid", record["national_id_normalized"]), ("phone", record["phone_normalized"])]
+    if record["name_dob_key"] and record["first_name_phonetic_alt"]:
+        keys.append(("name", (record["name_dob_key"], record["first_name_phonetic_alt"])))
+    return [key for key in keys if key[1]]
+
+
+@transaction.atomic
+def _import_batch(staged, on_reject, rows_by_no):
+    matches = _existing_matches(staged) if staged else {}
+    new = []
+    for row_no, record in staged:
+        if row_no in matches:
+            patient_id, signal = matches[row_no]
+            on_reject(row_no, f"{REJECT_DUPLICATE}:{signal}", rows_by_no[row_no], patient_id)
+        else:
+            new.append(record)
+    if not new:
+        return 0
+    numbers = allocate_patient_numbers(len(new))
+    for record, number in zip(new, numbers or []):
+        record["patient_number"] = number
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    patient_ids = _insert(new, now)
+    _insert_history(patient_ids, now, new[0]["created_by"])
+    if numbers is None:
+        # Only rows inserted in this transaction (or registrations still in flight) lack a number
+        Patient.objects.filter(patient_number__isnull=True).update(patient_number=patient_number_expression())
+    # New patients wait in the billing queue: reload the board rather than publishing row by row
+    transaction.on_commit(queue_board.invalidate)
+    return len(new)
+
+
+def import_patients(rows, created_by=None, on_reject=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Register patients from an iterable of dicts (e.g. csv.DictReader), batch by batch.
+    on_reject(row_no, reason, values, patient_id) is called for every row not imported
+    (row_no counts data rows from 1). Returns {"rows", "created", "rejected"}.
+    """
+    on_reject = on_reject or (lambda *args: None)
+    summary = {"rows": 0, "created": 0, "rejected": 0}
+    seen = {}  # (key kind, value) -> row_no of its first occurrence in this file
+
+    def reject(row_no, reason, values, patient_id=None):
+        summary["rejected"] += 1
+        on_reject(row_no, reason, values, patient_id)
+
+    created_by_id = getattr(created_by, "pk", None)
+    staged, rows_by_no = [], {}
+    for row_no, row in enumerate(rows, start=1):
+        summary["rows"] += 1
+        values = _clean(row)
+        record, reason = _build_record(values, created_by_id)
+        if reason:
+            reject(row_no, reason, values)
+            continue
+        keys = _file_keys(record)
+        first_seen = next((seen[key] for key in keys if key in seen), None)
+        if first_seen is not None:
+            reject(row_no, f"{REJECT_DUPLICATE_IN_FILE}:{first_seen}", values)
+            continue
+        for key in keys:
+            seen[key] = row_no
+        staged.append((row_no, record))
+        rows_by_no[row_no] = values
+        if len(staged) >= batch_size:
+            summary["created"] += _import_batch(staged, reject, rows_by_no)
+            staged, rows_by_no = [], {}
+    if staged:
+        summary["created"] += _import_batch(staged, reject, rows_by_no)
+    return summary
+
+
+def reject_record(row_no, reason, values, patient_id=None):
+    """A rejected row as a dict with REJECT_COLUMNS keys (for the rejects file/response)."""
+    return {"row": row_no, "reason": reason, "patient_id": patient_id, **values}
@@ -0,0 +1,55 @@
+"""
+Maintain PatientStatusHistory storage (run monthly from cron):
+- on PostgreSQL, create the monthly partitions for the coming months;
+- archive every month older than --keep-months to a gzipped CSV in --output-dir and drop it
+  from the table (whole partitions are detached and dropped).
+
+Usage: python manage.py archive_status_history --keep-months 24 --output-dir /var/backups/history
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from patients.history import add_months, archive_month, create_partitions, is_partitioned, month_start, partition_name
+from patients.models import PatientStatusHistory
+
+
+class Command(BaseCommand):
+    help = "Create upcoming status-history partitions and archive months older than the retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-months", type=int, default=24, help="Months of history kept online.")
+        parser.add_argument("--output-dir", default=".", help="Directory for the archived CSV files.")
+        parser.add_argument("--ahead", type=int, default=3, help="Monthly partitions to keep created ahead.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be done.")
+
+    def handle(self, *args, **options):
+        if options["keep_months"] < 1:
+            raise CommandError("--keep-months must be at least 1")
+        output_dir = Path(options["output_dir"])
+        dry_run = options["dry_run"]
+        this_month = month_start(timezone.now())
+
+        if is_partitioned() and not dry_run:
+            last = add_months(this_month, options["ahead"])
+            created = create_partitions(this_month, last)
+            self.stdout.write(f"Created {len(created)} partition(s); partitions exist up to {partition_name(last)}")
+
+        cutoff = add_months(this_month, -options["keep_months"])
+        oldest = PatientStatusHistory.objects.aggregate(oldest=Min("changed_at"))["oldest"]
+        if oldest is None or oldest >= cutoff:
+            self.stdout.write(f"Nothing older than {cutoff:%Y-%m} to archive.")
+            return
+        if not dry_run:
+            output_dir.mkdir(parents=True, exist_ok=True)
+
+        month = month_start(oldest)
+        while month < cutoff:
+            if dry_run:
+                self.stdout.write(f"Would archive {month:%Y-%m} to {output_dir / partition_name(month)}.csv.gz")
+            else:
+                count = archive_month(month, output_dir)
+                self.stdout.write(f"Archived {count} rows from {month:%Y-%m}")
+            month = add_months(month, 1)
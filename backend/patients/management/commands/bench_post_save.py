@@ -0,0 +1,75 @@
+"""
+Benchmark save throughput with and without the old catch-all post_save receiver.
+The legacy receiver (no sender, apps.get_model + patient check on every save) is connected
+temporarily for the "before" run; the "after" run uses only the current sender-scoped receivers.
+Seeds rows inside a transaction that is always rolled back.
+
+Usage: python manage.py bench_post_save --rows 2000
+"""
+import time
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from billing.models import Billing
+from patients.models import Patient
+from pharmacy.models import AuditLog
+
+
+def legacy_catch_all(sender, instance, **kwargs):
+    """Replica of the removed generic_post_save receiver."""
+    billing_model = apps.get_model("billing", "Billing")
+    if sender is not billing_model:
+        return
+    patient = getattr(instance, "patient", None)
+    if patient and instance.is_paid and patient.status != "ready_for_doctor":
+        patient.status = "ready_for_doctor"
+        patient.save()
+
+
+class Command(BaseCommand):
+    help = "Measure post_save overhead: legacy catch-all receiver vs sender-scoped patient flow."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="Saves per model and mode (default 1000).")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        self.stdout.write(f"{'mode':<8} {'model':<10} {'saves':>6} {'queries':>8} {'saves/s':>9}")
+        with transaction.atomic():
+            user = get_user_model().objects.create(username="bench-post-save")
+            patient = Patient.objects.create(first_name="Bench", last_name="Patient")
+            bills = [Billing.objects.create(patient=patient, service="consultation", charged_by=user)
+                     for _ in range(min(rows, 200))]
+            Billing.objects.filter(pk__in=[b.pk for b in bills]).update(status=Billing.STATUS_PAID, is_paid=True)
+            bills = list(Billing.objects.filter(pk__in=[b.pk for b in bills]))
+
+            for mode in ("before", "after"):
+                if mode == "before":
+                    post_save.connect(legacy_catch_all, dispatch_uid="bench_legacy_catch_all")
+                try:
+                    self._report(mode, "AuditLog", rows, lambda i: AuditLog(
+                        user=user, action=AuditLog.ACTION_DISPENSE_CONFIRMED, details={"n": i}).save())
+                    self._report(mode, "Billing", rows, lambda i: self._resave(bills[i % len(bills)]))
+                finally:
+                    post_save.disconnect(dispatch_uid="bench_legacy_catch_all")
+            # Never keep the synthetic rows
+            transaction.set_rollback(True)
+
+    def _resave(self, bill):
+        # Paid bill re-saved (e.g. a note edit): the legacy receiver re-checks the patient every time
+        bill.patient = Patient.objects.get(pk=bill.patient_id) if bill.patient_id else None
+        bill.save()
+
+    def _report(self, mode, label, rows, save):
+        connection.queries_log.clear()  # keep each run under the query-log cap
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for i in range(rows):
+                save(i)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(f"{mode:<8} {label:<10} {rows:>6} {len(ctx):>8} {rows / elapsed:>9.0f}")
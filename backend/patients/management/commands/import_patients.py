@@ -0,0 +1,56 @@
+"""
+Register patients in bulk from a CSV file (header: first_name,last_name,gender,dob,national_id,
+phone_number,address). Rows that fail validation or duplicate an existing patient (or an
+earlier row) are written to a rejects CSV with the reason and matched patient id.
+
+Usage: python manage.py import_patients records.csv --rejects records-rejects.csv --created-by reception1
+"""
+import csv
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.imports import IMPORT_BATCH_SIZE, REJECT_COLUMNS, import_patients, reject_record
+
+
+class Command(BaseCommand):
+    help = "Bulk-register patients from a CSV file, writing rejected rows to a rejects CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to import.")
+        parser.add_argument("--rejects", help="Rejects CSV path (default: <path>-rejects.csv).")
+        parser.add_argument("--created-by", help="Username recorded as the registering user.")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        source = Path(options["path"])
+        if not source.exists():
+            raise CommandError(f"{source} does not exist")
+        rejects_path = Path(options["rejects"] or source.with_name(f"{source.stem}-rejects.csv"))
+
+        created_by = None
+        if options["created_by"]:
+            created_by = get_user_model().objects.filter(username=options["created_by"]).first()
+            if created_by is None:
+                raise CommandError(f"Unknown user {options['created_by']}")
+
+        start = time.perf_counter()
+        with source.open(newline="", encoding="utf-8-sig") as infile, rejects_path.open("w", newline="") as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=REJECT_COLUMNS)
+            writer.writeheader()
+            summary = import_patients(
+                csv.DictReader(infile),
+                created_by=created_by,
+                on_reject=lambda *reject: writer.writerow(reject_record(*reject)),
+                batch_size=options["batch_size"],
+            )
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{summary['rows']} row(s): {summary['created']} created, {summary['rejected']} rejected "
+                f"({summary['rows'] / elapsed if elapsed else 0:.0f} rows/s). Rejects: {rejects_path}"
+            )
+        )
@@ -0,0 +1,142 @@
+"""
+Duplicate-patient matching on normalized, indexed columns.
+
+Patient.save() keeps four lookup columns in sync with the raw fields:
+- phone_normalized: phone number in E.164 form (+254712345678)
+- national_id_normalized: national ID upper-cased, spaces and dashes removed
+- name_dob_key: blocking key "<YYYYMMDD>:<phonetic key of the last name>"
+- first_name_dob_key: the same for the first name, so a changed surname (marriage) still blocks
+find_matches() probes all four btree indexes in one query and scores the (few) candidates
+in Python, strongest first.
+"""
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from .phonetic import phonetic_keys
+
+# Score per matching signal; a candidate's score is the sum of its signals
+MATCH_WEIGHTS = {
+    "national_id": 100,
+    "phone": 60,
+    "name_dob": 50,
+    "first_name_dob": 30,
+    "first_name": 20,
+}
+# Upper bound on candidates fetched per lookup (blocking keeps real candidate sets tiny)
+MAX_CANDIDATES = 50
+
+_NON_DIGITS = re.compile(r"\D")
+_ID_JUNK = re.compile(r"[\s\-./]")
+
+
+def normalize_phone(raw):
+    """E.164 form of a phone number, or None when it has too few digits to be one."""
+    if not raw:
+        return None
+    raw = str(raw).strip()
+    digits = _NON_DIGITS.sub("", raw)
+    country = settings.PATIENT_DEFAULT_COUNTRY_CODE
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country + digits[1:]
+    elif len(digits) <= 9:
+        digits = country + digits
+    return f"+{digits}" if 8 <= len(digits) <= 15 else None
+
+
+def normalize_national_id(raw):
+    value = _ID_JUNK.sub("", str(raw or "")).upper()
+    return value or None
+
+
+def _as_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return parse_date(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def name_dob_key(name, dob):
+    """
+    Blocking key for name + date of birth matches, or None when either part is missing.
+    Uses the broad (alternate) phonetic key of the name, so spelling variants block together.
+    """
+    _primary, name = phonetic_keys(name)
+    dob = _as_date(dob)
+    if not name or not dob:
+        return None
+    return f"{dob:%Y%m%d}:{name}"
+
+
+def same_name_and_dob(patient, data):
+    """
+    Exact duplicate: same first and last name (case-insensitive, trimmed) and same date of birth.
+    Phonetic name_dob matches are only candidates; this is the check that may reuse a record.
+    """
+    def fold(value):
+        return (value or "").strip().casefold()
+
+    dob = _as_date(data.get("dob"))
+    return (
+        bool(fold(data.get("first_name")) and fold(data.get("last_name")) and dob)
+        and fold(patient.first_name) == fold(data.get("first_name"))
+        and fold(patient.last_name) == fold(data.get("last_name"))
+        and patient.dob == dob
+    )
+
+
+def match_keys(data):
+    """Normalized lookup values for a dict of raw patient fields."""
+    return {
+        "national_id_normalized": normalize_national_id(data.get("national_id")),
+        "phone_normalized": normalize_phone(data.get("phone_number")),
+        "name_dob_key": name_dob_key(data.get("last_name"), data.get("dob")),
+        "first_name_dob_key": name_dob_key(data.get("first_name"), data.get("dob")),
+    }
+
+
+def find_matches(data, queryset=None, limit=10):
+    """
+    Ranked possible duplicates for raw patient fields (one query).
+    Each returned Patient carries `match_score` and `match_reasons` (signals that matched).
+    """
+    from .models import Patient  # local import: models imports this module
+
+    keys = match_keys(data)
+    condition = Q()
+    for field, value in keys.items():
+        if value:
+            condition |= Q(**{field: value})
+    if not condition:
+        return []
+
+    first_name = set(phonetic_keys(data.get("first_name"))) - {None}
+    candidates = (queryset if queryset is not None else Patient.objects.all()).filter(condition)
+    scored = []
+    for patient in candidates.order_by("-id")[:MAX_CANDIDATES]:
+        reasons = []
+        if keys["national_id_normalized"] and patient.national_id_normalized == keys["national_id_normalized"]:
+            reasons.append("national_id")
+        if keys["phone_normalized"] and patient.phone_normalized == keys["phone_normalized"]:
+            reasons.append("phone")
+        if keys["name_dob_key"] and patient.name_dob_key == keys["name_dob_key"]:
+            reasons.append("name_dob")
+        elif keys["first_name_dob_key"] and patient.first_name_dob_key == keys["first_name_dob_key"]:
+            # Same first name and dob under another surname: weaker than a full name + dob match
+            reasons.append("first_name_dob")
+        if first_name & {patient.first_name_phonetic, patient.first_name_phonetic_alt}:
+            reasons.append("first_name")
+        patient.match_reasons = reasons
+        patient.match_score = sum(MATCH_WEIGHTS[reason] for reason in reasons)
+        scored.append(patient)
+    scored.sort(key=lambda patient: patient.match_score, reverse=True)
+    return scored[:limit]
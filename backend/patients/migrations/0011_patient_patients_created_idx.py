@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patients", "0010_alter_patientstatushistory_options_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="patient",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="patients_created_idx"
+            ),
+        ),
+    ]
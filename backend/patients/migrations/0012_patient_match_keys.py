@@ -0,0 +1,116 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:27
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+# Frozen copy of the patients.matching normalizers as of this migration: later edits to the
+# app code (e.g. the phonetic name_dob_key of 0013) must not change what this backfill writes.
+_NON_DIGITS = re.compile(r"\D")
+_ID_JUNK = re.compile(r"[\s\-./]")
+_NAME_JUNK = re.compile(r"[^a-z0-9]")
+
+
+def normalize_phone(raw):
+    if not raw:
+        return None
+    raw = str(raw).strip()
+    digits = _NON_DIGITS.sub("", raw)
+    country = getattr(settings, "PATIENT_DEFAULT_COUNTRY_CODE", "254")
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country + digits[1:]
+    elif len(digits) <= 9:
+        digits = country + digits
+    return f"+{digits}" if 8 <= len(digits) <= 15 else None
+
+
+def normalize_national_id(raw):
+    value = _ID_JUNK.sub("", str(raw or "")).upper()
+    return value or None
+
+
+def normalize_name(raw):
+    value = unicodedata.normalize("NFKD", str(raw or "")).encode("ascii", "ignore").decode()
+    value = _NAME_JUNK.sub("", value.lower())
+    return value or None
+
+
+def name_dob_key(last_name, dob):
+    name = normalize_name(last_name)
+    if not name or not dob or name == "unknown":
+        return None
+    return f"{dob:%Y%m%d}:{name}"
+
+
+def match_keys(data):
+    return {
+        "national_id_normalized": normalize_national_id(data.get("national_id")),
+        "phone_normalized": normalize_phone(data.get("phone_number")),
+        "name_dob_key": name_dob_key(data.get("last_name"), data.get("dob")),
+    }
+
+
+def backfill_match_keys(apps, schema_editor):
+    """Compute the normalized matching columns for existing patients, in batches."""
+    Patient = apps.get_model("patients", "Patient")
+    fields = ("national_id_normalized", "phone_normalized", "name_dob_key")
+    batch = []
+    for patient in Patient.objects.only(
+        "national_id", "phone_number", "last_name", "dob"
+    ).iterator(chunk_size=BATCH_SIZE):
+        keys = match_keys(
+            {
+                "national_id": patient.national_id,
+                "phone_number": patient.phone_number,
+                "last_name": patient.last_name,
+                "dob": patient.dob,
+            }
+        )
+        for field, value in keys.items():
+            setattr(patient, field, value)
+        batch.append(patient)
+        if len(batch) >= BATCH_SIZE:
+            Patient.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Patient.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patients", "0011_patient_patients_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patient",
+            name="name_dob_key",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=120, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="national_id_normalized",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=50, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="phone_normalized",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=16, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_match_keys, migrations.RunPython.noop),
+    ]
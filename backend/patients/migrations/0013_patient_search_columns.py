@@ -0,0 +1,174 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:32
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+FIELDS = (
+    "name_dob_key",
+    "search_name",
+    "first_name_phonetic",
+    "first_name_phonetic_alt",
+    "last_name_phonetic",
+    "last_name_phonetic_alt",
+)
+
+
+# Frozen copy of patients.phonetic / patients.matching as of this migration: later edits to the
+# app code must not change what this backfill writes.
+KEY_LENGTH = 6
+VOWELS = set("aeiou")
+_REWRITES = (
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"(ch|sh)"), "X"),
+    (re.compile(r"ck|q|c(?![eiy])"), "k"),
+    (re.compile(r"c"), "s"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"v"), "f"),
+    (re.compile(r"dh"), "d"),
+    (re.compile(r"gh"), "g"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"ny"), "N"),
+    (re.compile(r"(?<=[aeiou])[wy](?=[aeiou])"), ""),
+    (re.compile(r"(?<=[aeiou])h"), ""),
+)
+_PRENASAL = re.compile(r"[mn](?=[bdjg])")
+_NAME_JUNK = re.compile(r"[^a-z0-9]")
+
+
+def normalize_name(raw):
+    value = unicodedata.normalize("NFKD", str(raw or "")).encode("ascii", "ignore").decode()
+    value = _NAME_JUNK.sub("", value.lower())
+    return value or None
+
+
+def _encode(name, alternate=False):
+    if alternate:
+        name = _PRENASAL.sub("", name).replace("l", "r")
+    key = name[0].upper() if name[0] in VOWELS else ""
+    start = 1 if key else 0
+    previous = None
+    for char in name[start:]:
+        if char in VOWELS:
+            previous = None
+            continue
+        char = char.upper()
+        if char != previous:
+            key += char
+        previous = char
+    return (key or name[0].upper())[:KEY_LENGTH]
+
+
+def phonetic_keys(raw):
+    name = re.sub(r"[^a-z]", "", normalize_name(raw) or "")
+    if not name or name == "unknown":
+        return None, None
+    for pattern, replacement in _REWRITES:
+        name = pattern.sub(replacement, name)
+    return _encode(name), _encode(name, alternate=True)
+
+
+def search_columns(first_name, last_name):
+    parts = [normalize_name(part) for part in (first_name, last_name)]
+    first, first_alt = phonetic_keys(first_name)
+    last, last_alt = phonetic_keys(last_name)
+    return {
+        "search_name": " ".join(part for part in parts if part and part != "unknown") or None,
+        "first_name_phonetic": first,
+        "first_name_phonetic_alt": first_alt,
+        "last_name_phonetic": last,
+        "last_name_phonetic_alt": last_alt,
+    }
+
+
+def name_dob_key(last_name, dob):
+    _primary, name = phonetic_keys(last_name)
+    if not name or not dob:
+        return None
+    return f"{dob:%Y%m%d}:{name}"
+
+
+def backfill_search_columns(apps, schema_editor):
+    """Fill the search columns and re-key name_dob_key on phonetic last names, in batches."""
+    Patient = apps.get_model("patients", "Patient")
+    batch = []
+    for patient in Patient.objects.only("first_name", "last_name", "dob").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        values = search_columns(patient.first_name, patient.last_name)
+        values["name_dob_key"] = name_dob_key(patient.last_name, patient.dob)
+        for field, value in values.items():
+            setattr(patient, field, value)
+        batch.append(patient)
+        if len(batch) >= BATCH_SIZE:
+            Patient.objects.bulk_update(batch, FIELDS)
+            batch = []
+    if batch:
+        Patient.objects.bulk_update(batch, FIELDS)
+
+
+def create_trigram_index(apps, schema_editor):
+    # PostgreSQL only: other backends (local SQLite) search with LIKE instead
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS patients_search_name_trgm "
+        "ON patients_patient USING gin (search_name gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS patients_search_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patients", "0012_patient_match_keys"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patient",
+            name="first_name_phonetic",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=8, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="first_name_phonetic_alt",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=8, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="last_name_phonetic",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=8, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="last_name_phonetic_alt",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=8, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="search_name",
+            field=models.CharField(
+                blank=True, editable=False, max_length=201, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_search_columns, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,219 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:48
+# Status history: small-integer status codes, a (patient, changed_at) index and, on
+# PostgreSQL, monthly range partitioning on changed_at.
+
+import patients.models
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Frozen copies of patients.models / patients.history as of this migration: later edits to the
+# app code must not change what this migration does.
+HISTORY_TABLE = "patients_patientstatushistory"
+DEFAULT_PARTITION = f"{HISTORY_TABLE}_default"
+PATIENT_STATUS_CODES = (
+    (1, "registered"),
+    (2, "sent_to_billing"),
+    (3, "triaged"),
+    (4, "ready_for_doctor"),
+    (5, "waiting_for_doctor"),
+    (6, "in_consultation"),
+    (7, "ready_for_pharmacy"),
+    (8, "discharged"),
+)
+# Monthly partitions created ahead of the current month (cron keeps extending them)
+PARTITIONS_AHEAD = 3
+
+
+def status_code_sql(column):
+    whens = " ".join(f"WHEN '{status}' THEN {code}" for code, status in PATIENT_STATUS_CODES)
+    return f"CASE {column} {whens} END"
+
+
+def add_months(value, count):
+    index = value.year * 12 + value.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def create_partitions(schema_editor, first, last):
+    month = add_months(first, 0)
+    while month <= add_months(last, 0):
+        following = add_months(month, 1)
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {HISTORY_TABLE}_p{month:%Y%m} PARTITION OF {HISTORY_TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+
+
+def encode_statuses(apps, schema_editor):
+    """Copy the varchar statuses into the code columns in one UPDATE; refuse unknown statuses."""
+    known = {status for _code, status in PATIENT_STATUS_CODES}
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT old_status FROM {HISTORY_TABLE} UNION SELECT DISTINCT new_status FROM {HISTORY_TABLE}"
+        )
+        unknown = {row[0] for row in cursor.fetchall()} - known - {None, ""}
+    if unknown:
+        raise RuntimeError(f"Add codes to PATIENT_STATUS_CODES for: {', '.join(sorted(unknown))}")
+    schema_editor.execute(
+        f"UPDATE {HISTORY_TABLE} SET old_status_code = {status_code_sql('old_status')}, "
+        f"new_status_code = {status_code_sql('new_status')}"
+    )
+
+
+def decode_statuses(apps, schema_editor):
+    whens = " ".join(f"WHEN {code} THEN '{status}'" for code, status in PATIENT_STATUS_CODES)
+    schema_editor.execute(
+        f"UPDATE {HISTORY_TABLE} SET old_status = CASE old_status_code {whens} END, "
+        f"new_status = CASE new_status_code {whens} END"
+    )
+
+
+def partition_history(apps, schema_editor):
+    """
+    Rebuild the history table as a partitioned table (PostgreSQL only): same columns,
+    constraints and indexes; primary key (id, changed_at) because it must include the
+    partition key. Rows are copied into monthly partitions. id becomes a plain bigint fed by
+    an owned sequence: identity columns on partitioned tables need PostgreSQL 17.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    old = f"{HISTORY_TABLE}_unpartitioned"
+    sequence = f"{HISTORY_TABLE}_id_seq"
+    user_table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    patient_table = apps.get_model("patients", "Patient")._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT LIKE %s",
+            [HISTORY_TABLE, "%pkey"],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(f"SELECT MIN(changed_at) FROM {HISTORY_TABLE}")
+        first = cursor.fetchone()[0] or timezone.now()
+
+    schema_editor.execute(f"ALTER TABLE {HISTORY_TABLE} RENAME TO {old}")
+    schema_editor.execute(f"ALTER INDEX {HISTORY_TABLE}_pkey RENAME TO {old}_pkey")
+    for name, _definition in indexes:
+        schema_editor.execute(f"ALTER INDEX {name} RENAME TO {name}_old")
+    schema_editor.execute(
+        f"CREATE TABLE {HISTORY_TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+        f"CONSTRAINT {HISTORY_TABLE}_pkey PRIMARY KEY (id, changed_at)) "
+        f"PARTITION BY RANGE (changed_at)"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {HISTORY_TABLE} ADD FOREIGN KEY (patient_id) REFERENCES {patient_table} (id) "
+        f"DEFERRABLE INITIALLY DEFERRED"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {HISTORY_TABLE} ADD FOREIGN KEY (changed_by_id) REFERENCES {user_table} (id) "
+        f"DEFERRABLE INITIALLY DEFERRED"
+    )
+    create_partitions(schema_editor, first, add_months(timezone.now(), PARTITIONS_AHEAD))
+    schema_editor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {HISTORY_TABLE} DEFAULT")
+
+    schema_editor.execute(f"INSERT INTO {HISTORY_TABLE} SELECT * FROM {old}")
+    # Check the copied foreign keys now: indexes cannot be built with trigger events pending
+    schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+    # Dropping the old table also drops its identity sequence, freeing the name
+    schema_editor.execute(f"DROP TABLE {old}")
+    schema_editor.execute(f"CREATE SEQUENCE {sequence} AS bigint OWNED BY {HISTORY_TABLE}.id")
+    schema_editor.execute(
+        f"SELECT setval('{sequence}', (SELECT COALESCE(MAX(id), 0) + 1 FROM {HISTORY_TABLE}), false)"
+    )
+    schema_editor.execute(f"ALTER TABLE {HISTORY_TABLE} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+    # Same index names as before, now on the partitioned table (cascading to every partition)
+    for _name, definition in indexes:
+        schema_editor.execute(definition)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patients", "0013_patient_search_columns"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patientstatushistory",
+            name="old_status_code",
+            field=patients.models.StatusCodeField(
+                blank=True,
+                choices=[
+                    ("registered", "Registered"),
+                    ("sent_to_billing", "Sent to Billing"),
+                    ("triaged", "Triaged"),
+                    ("ready_for_doctor", "Ready for Doctor"),
+                    ("waiting_for_doctor", "Waiting for Doctor"),
+                    ("in_consultation", "In Consultation"),
+                    ("ready_for_pharmacy", "Ready for Pharmacy"),
+                    ("discharged", "Discharged"),
+                ],
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="patientstatushistory",
+            name="new_status_code",
+            field=patients.models.StatusCodeField(
+                choices=[
+                    ("registered", "Registered"),
+                    ("sent_to_billing", "Sent to Billing"),
+                    ("triaged", "Triaged"),
+                    ("ready_for_doctor", "Ready for Doctor"),
+                    ("waiting_for_doctor", "Waiting for Doctor"),
+                    ("in_consultation", "In Consultation"),
+                    ("ready_for_pharmacy", "Ready for Pharmacy"),
+                    ("discharged", "Discharged"),
+                ],
+                null=True,
+            ),
+        ),
+        migrations.RunPython(encode_statuses, decode_statuses),
+        migrations.RemoveField(
+            model_name="patientstatushistory",
+            name="old_status",
+        ),
+        migrations.RemoveField(
+            model_name="patientstatushistory",
+            name="new_status",
+        ),
+        migrations.RenameField(
+            model_name="patientstatushistory",
+            old_name="old_status_code",
+            new_name="old_status",
+        ),
+        migrations.RenameField(
+            model_name="patientstatushistory",
+            old_name="new_status_code",
+            new_name="new_status",
+        ),
+        migrations.AlterField(
+            model_name="patientstatushistory",
+            name="new_status",
+            field=patients.models.StatusCodeField(
+                choices=[
+                    ("registered", "Registered"),
+                    ("sent_to_billing", "Sent to Billing"),
+                    ("triaged", "Triaged"),
+                    ("ready_for_doctor", "Ready for Doctor"),
+                    ("waiting_for_doctor", "Waiting for Doctor"),
+                    ("in_consultation", "In Consultation"),
+                    ("ready_for_pharmacy", "Ready for Pharmacy"),
+                    ("discharged", "Discharged"),
+                ]
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientstatushistory",
+            index=models.Index(
+                fields=["patient", "-changed_at", "-id"],
+                name="patients_history_patient_idx",
+            ),
+        ),
+        # The partitioned table keeps the same columns, so there is nothing to undo for Django
+        migrations.RunPython(partition_history, migrations.RunPython.noop),
+    ]
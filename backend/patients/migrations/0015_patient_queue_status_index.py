@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patients", "0014_status_history_codes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="patient",
+            index=models.Index(
+                condition=models.Q(
+                    (
+                        "status__in",
+                        (
+                            "sent_to_billing",
+                            "ready_for_doctor",
+                            "triaged",
+                            "waiting_for_doctor",
+                            "in_consultation",
+                            "ready_for_pharmacy",
+                        ),
+                    )
+                ),
+                fields=["status", "updated_at"],
+                name="patients_queue_status_idx",
+            ),
+        ),
+    ]
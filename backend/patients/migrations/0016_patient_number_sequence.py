@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:59
+
+import patients.numbering
+from django.db import migrations, models
+
+# The sequence starts after the highest existing number (or id) so sequence numbers never
+# collide with numbers assigned from ids. Frozen here rather than imported from
+# patients.numbering, so later edits to the app code cannot change this migration.
+CREATE_SEQUENCE_SQL = """
+CREATE SEQUENCE IF NOT EXISTS patients_patient_number_seq;
+SELECT setval('patients_patient_number_seq', GREATEST(last_number, 1), last_number > 0) FROM (
+    SELECT GREATEST(
+        (SELECT COALESCE(MAX(substring(patient_number FROM '^PAT-([0-9]+)$')::bigint), 0)
+         FROM patients_patient),
+        (SELECT COALESCE(MAX(id), 0) FROM patients_patient)
+    ) AS last_number
+) AS existing;
+CREATE OR REPLACE FUNCTION patients_next_patient_number() RETURNS varchar LANGUAGE sql VOLATILE AS $$
+    SELECT 'PAT-' || lpad(n::text, GREATEST(7, length(n::text)), '0')
+    FROM (SELECT nextval('patients_patient_number_seq') AS n) AS next_number
+$$;
+"""
+DROP_SEQUENCE_SQL = """
+DROP FUNCTION IF EXISTS patients_next_patient_number();
+DROP SEQUENCE IF EXISTS patients_patient_number_seq;
+"""
+
+
+def create_number_sequence(apps, schema_editor):
+    """Sequence + next-number function backing the patient_number default (PostgreSQL only)."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(CREATE_SEQUENCE_SQL)
+
+
+def drop_number_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(DROP_SEQUENCE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patients", "0015_patient_queue_status_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_number_sequence, drop_number_sequence),
+        migrations.AlterField(
+            model_name="patient",
+            name="patient_number",
+            field=models.CharField(
+                blank=True,
+                db_default=patients.numbering.NextPatientNumber(),
+                db_index=True,
+                help_text="Auto-generated unique patient number (e.g. PAT-0000123).",
+                max_length=32,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
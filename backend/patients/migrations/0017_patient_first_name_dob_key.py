@@ -0,0 +1,104 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:45
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+# Frozen copy of patients.phonetic / patients.matching as of this migration: later edits to the
+# app code must not change what this backfill writes.
+KEY_LENGTH = 6
+VOWELS = set("aeiou")
+_REWRITES = (
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"(ch|sh)"), "X"),
+    (re.compile(r"ck|q|c(?![eiy])"), "k"),
+    (re.compile(r"c"), "s"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"v"), "f"),
+    (re.compile(r"dh"), "d"),
+    (re.compile(r"gh"), "g"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"ny"), "N"),
+    (re.compile(r"(?<=[aeiou])[wy](?=[aeiou])"), ""),
+    (re.compile(r"(?<=[aeiou])h"), ""),
+)
+_PRENASAL = re.compile(r"[mn](?=[bdjg])")
+_NAME_JUNK = re.compile(r"[^a-z0-9]")
+
+
+def normalize_name(raw):
+    value = unicodedata.normalize("NFKD", str(raw or "")).encode("ascii", "ignore").decode()
+    value = _NAME_JUNK.sub("", value.lower())
+    return value or None
+
+
+def _encode(name, alternate=False):
+    if alternate:
+        name = _PRENASAL.sub("", name).replace("l", "r")
+    key = name[0].upper() if name[0] in VOWELS else ""
+    start = 1 if key else 0
+    previous = None
+    for char in name[start:]:
+        if char in VOWELS:
+            previous = None
+            continue
+        char = char.upper()
+        if char != previous:
+            key += char
+        previous = char
+    return (key or name[0].upper())[:KEY_LENGTH]
+
+
+def phonetic_keys(raw):
+    name = re.sub(r"[^a-z]", "", normalize_name(raw) or "")
+    if not name or name == "unknown":
+        return None, None
+    for pattern, replacement in _REWRITES:
+        name = pattern.sub(replacement, name)
+    return _encode(name), _encode(name, alternate=True)
+
+
+def name_dob_key(name, dob):
+    _primary, name = phonetic_keys(name)
+    if not name or not dob:
+        return None
+    return f"{dob:%Y%m%d}:{name}"
+
+
+def backfill_first_name_dob_key(apps, schema_editor):
+    """Fill first_name_dob_key for patients with a date of birth, in batches."""
+    Patient = apps.get_model("patients", "Patient")
+    batch = []
+    for patient in Patient.objects.filter(dob__isnull=False).only("first_name", "dob").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        patient.first_name_dob_key = name_dob_key(patient.first_name, patient.dob)
+        batch.append(patient)
+        if len(batch) >= BATCH_SIZE:
+            Patient.objects.bulk_update(batch, ["first_name_dob_key"])
+            batch = []
+    if batch:
+        Patient.objects.bulk_update(batch, ["first_name_dob_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patients", "0016_patient_number_sequence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patient",
+            name="first_name_dob_key",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=120, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_first_name_dob_key, migrations.RunPython.noop),
+    ]
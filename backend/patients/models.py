@@ -1,12 +1,42 @@
 """
 Patients models: add canonical patient_number, created_by, status and helper.
-- patient_number is generated after initial save using the DB-assigned id (PAT-0000001).
+- patient_number is filled by the INSERT from a database sequence on PostgreSQL, or generated
+  after initial save from the DB-assigned id elsewhere (PAT-0000001); see patients.numbering.
 - Fields are nullable/blank to avoid migration issues for existing installs.
 """
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils.functional import cached_property
 from django.utils import timezone
 
+from .matching import match_keys
+from .numbering import NextPatientNumber, allocate_patient_numbers, format_patient_number
+from .phonetic import search_columns
+
+# Raw fields the normalized matching/search columns are derived from
+MATCH_SOURCE_FIELDS = frozenset({"national_id", "phone_number", "first_name", "last_name", "dob"})
+MATCH_KEY_FIELDS = (
+    "national_id_normalized",
+    "phone_normalized",
+    "name_dob_key",
+    "first_name_dob_key",
+    "search_name",
+    "first_name_phonetic",
+    "first_name_phonetic_alt",
+    "last_name_phonetic",
+    "last_name_phonetic_alt",
+)
+
+# Department queue boards (patients.queues): department -> patient statuses waiting there
+PATIENT_QUEUES = {
+    "billing": ("sent_to_billing",),
+    "doctor": ("ready_for_doctor", "triaged", "waiting_for_doctor"),
+    "consultation": ("in_consultation",),
+    "pharmacy": ("ready_for_pharmacy",),
+}
+QUEUE_STATUSES = tuple(status for statuses in PATIENT_QUEUES.values() for status in statuses)
+
 GENDER_CHOICES = [
         ("male", "Male"),
         ("female", "Female"),
@@ -28,13 +58,15 @@ class Patient(models.Model):
         help_text="Enter phone number e.g. +254712345678",
     )
    
-    # Canonical patient identifier: set after first save using ID to avoid concurrency.
+    # Canonical patient identifier: column default on PostgreSQL (returned by the INSERT),
+    # set after first save using ID elsewhere.
     patient_number = models.CharField(
         max_length=32,
         unique=True,
         blank=True,
         null=True,
         db_index=True,
+        db_default=NextPatientNumber(),
         help_text="Auto-generated unique patient number (e.g. PAT-0000123)."
     )
     address = models.TextField(blank=True, null=True)
@@ -65,20 +97,135 @@ class Patient(models.Model):
     # Optional last visit date, helpful in reports
     last_visit = models.DateTimeField(blank=True, null=True)
 
+    # Normalized duplicate-matching columns, kept in sync by save() (see patients.matching)
+    phone_normalized = models.CharField(max_length=16, blank=True, null=True, db_index=True, editable=False)
+    national_id_normalized = models.CharField(max_length=50, blank=True, null=True, db_index=True, editable=False)
+    name_dob_key = models.CharField(max_length=120, blank=True, null=True, db_index=True, editable=False)
+    first_name_dob_key = models.CharField(max_length=120, blank=True, null=True, db_index=True, editable=False)
+    # Precomputed search columns (see patients.phonetic / patients.search): folded full name for
+    # trigram similarity, and primary/alternate phonetic keys of each name
+    search_name = models.CharField(max_length=201, blank=True, null=True, editable=False)
+    first_name_phonetic = models.CharField(max_length=8, blank=True, null=True, db_index=True, editable=False)
+    first_name_phonetic_alt = models.CharField(max_length=8, blank=True, null=True, db_index=True, editable=False)
+    last_name_phonetic = models.CharField(max_length=8, blank=True, null=True, db_index=True, editable=False)
+    last_name_phonetic_alt = models.CharField(max_length=8, blank=True, null=True, db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the patient list (newest first)
+            models.Index(fields=["-created_at", "-id"], name="patients_created_idx"),
+            # Queue board cold start: only patients waiting in a department (not the discharged bulk)
+            models.Index(
+                fields=["status", "updated_at"],
+                condition=models.Q(status__in=QUEUE_STATUSES),
+                name="patients_queue_status_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.patient_number or 'NEW'} — {self.first_name} {self.last_name or ''}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded status so saves can log status changes without re-fetching the row."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def normalize_match_keys(self):
+        """Recompute the normalized matching and search columns from the raw fields."""
+        keys = match_keys(
+            {
+                "national_id": self.national_id,
+                "phone_number": self.phone_number,
+                "first_name": self.first_name,
+                "last_name": self.last_name,
+                "dob": self.dob,
+            }
+        )
+        keys.update(search_columns(self.first_name, self.last_name))
+        for field, value in keys.items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        self.normalize_match_keys()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and MATCH_SOURCE_FIELDS.intersection(update_fields):
+            kwargs["update_fields"] = set(update_fields) | set(MATCH_KEY_FIELDS)
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or "status" in fields:
+            self._loaded_status = self.__dict__.get("status")
+
     def full_name(self):
         return f"{self.first_name} {self.last_name or ''}".strip()
     
+# Stable small-integer codes for the statuses stored in PatientStatusHistory.
+# Codes are persisted: never renumber or reuse one, only append new statuses.
+PATIENT_STATUS_CODES = (
+    (1, "registered", "Registered"),
+    (2, "sent_to_billing", "Sent to Billing"),
+    (3, "triaged", "Triaged"),
+    (4, "ready_for_doctor", "Ready for Doctor"),
+    (5, "waiting_for_doctor", "Waiting for Doctor"),
+    (6, "in_consultation", "In Consultation"),
+    (7, "ready_for_pharmacy", "Ready for Pharmacy"),
+    (8, "discharged", "Discharged"),
+)
+STATUS_TO_CODE = {status: code for code, status, _label in PATIENT_STATUS_CODES}
+CODE_TO_STATUS = {code: status for code, status, _label in PATIENT_STATUS_CODES}
+
+
+def validate_status_code(value):
+    if value not in STATUS_TO_CODE:
+        raise ValidationError(f"Unknown patient status {value!r}.", code="invalid_status")
+
+
+class StatusCodeField(models.PositiveSmallIntegerField):
+    """
+    Patient status stored as its small-integer code (PATIENT_STATUS_CODES) but read, written and
+    filtered as the status string, so callers never see the codes.
+    """
+
+    @cached_property
+    def validators(self):
+        # Not the inherited integer range validators: values are status strings
+        return [*self._validators, validate_status_code]
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else CODE_TO_STATUS.get(value, f"unknown:{value}")
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return CODE_TO_STATUS.get(value, f"unknown:{value}")
+        return value
+
+    def get_prep_value(self, value):
+        if value is None or value == "":
+            return None
+        if isinstance(value, int):
+            return value
+        try:
+            return STATUS_TO_CODE[value]
+        except KeyError:
+            raise ValueError(f"Unknown patient status {value!r}: add it to PATIENT_STATUS_CODES") from None
+
+
+STATUS_CODE_CHOICES = [(status, label) for _code, status, label in PATIENT_STATUS_CODES]
+
+
 class PatientStatusHistory(models.Model):
     """
     Stores a history of status changes for auditing.
     Each time a patient's status changes, create a row here.
+    Append-only: statuses are stored as small-integer codes and, on PostgreSQL, the table is
+    range-partitioned by month on changed_at (migration 0014, `manage.py archive_status_history`).
     """
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="status_history")
-    old_status = models.CharField(max_length=32, blank=True, null=True)
-    new_status = models.CharField(max_length=32)  # increased from previous shorter length
+    old_status = StatusCodeField(choices=STATUS_CODE_CHOICES, blank=True, null=True)
+    new_status = StatusCodeField(choices=STATUS_CODE_CHOICES)
     changed_at = models.DateTimeField(auto_now_add=True)
     changed_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -88,11 +235,18 @@ class PatientStatusHistory(models.Model):
         related_name="status_changes"
     )
 
+    class Meta:
+        indexes = [
+            # A patient's history, newest first
+            models.Index(fields=["patient", "-changed_at", "-id"], name="patients_history_patient_idx"),
+        ]
+
     def __str__(self):
         return f"{self.patient.patient_number} {self.old_status} → {self.new_status} at {self.changed_at:%Y-%m-%d %H:%M}"
 
 
 # Post-save handler to generate patient_number using DB id (avoids race conditions)
+from django.db.models.expressions import DatabaseDefault
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -100,12 +254,17 @@ from django.dispatch import receiver
 def ensure_patient_number(sender, instance: Patient, created, **kwargs):
     """
     Ensure patient_number is set after initial save.
-    Uses the instance.pk (DB id) to create predictable unique number:
+    On PostgreSQL the INSERT already returned it from the sequence; elsewhere uses the
+    instance.pk (DB id) to create predictable unique number:
     PAT-<id:07d> e.g. PAT-0000123
     This is safe because pk is assigned on first save.
     """
+    if created and isinstance(instance.patient_number, DatabaseDefault):
+        # Database without INSERT ... RETURNING: read back what the column default produced
+        instance.patient_number = Patient.objects.filter(pk=instance.pk).values_list("patient_number", flat=True)[0]
     if created and not instance.patient_number:
-        # Compose patient number using the DB id
-        instance.patient_number = f"PAT-{instance.pk:07d}"
+        # Explicitly saved without a number: take one from the sequence, or compose it from the DB id
+        numbers = allocate_patient_numbers(1, using=kwargs.get("using") or "default")
+        instance.patient_number = numbers[0] if numbers else format_patient_number(instance.pk)
         # Avoid recursion by updating only the patient_number field
         Patient.objects.filter(pk=instance.pk).update(patient_number=instance.patient_number)
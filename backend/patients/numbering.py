@@ -0,0 +1,65 @@
+"""
+Patient numbers: PAT-NNNNNNN (seven digits, more once past 9,999,999).
+
+On PostgreSQL numbers come from the sequence patients_patient_number_seq (migration 0016):
+the patient_number column defaults to patients_next_patient_number(), so the INSERT fills it
+and Django reads it back through RETURNING (no second statement), and bulk callers reserve a
+block of numbers with one query (allocate_patient_numbers). The sequence was started past every
+existing number, so numbers stay unique and in the same format; like any sequence, a rolled
+back insert leaves a gap. Other databases (local SQLite) keep the id-based number written by
+one UPDATE after the insert.
+"""
+from django.db import connections
+from django.db.models import Case, CharField, Func, Value, When
+from django.db.models.functions import Cast, Concat, LPad
+
+PATIENT_NUMBER_PREFIX = "PAT"
+PATIENT_NUMBER_SEQUENCE = "patients_patient_number_seq"
+PATIENT_NUMBER_FUNCTION = "patients_next_patient_number"
+
+
+def format_patient_number(number):
+    return f"{PATIENT_NUMBER_PREFIX}-{number:07d}"
+
+
+def has_number_sequence(using="default"):
+    return connections[using].vendor == "postgresql"
+
+
+class NextPatientNumber(Func):
+    """Column default for patient_number: the next sequence number on PostgreSQL, NULL elsewhere."""
+
+    output_field = CharField()
+    allowed_default = True
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return "NULL", []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return f"{PATIENT_NUMBER_FUNCTION}()", []
+
+
+def allocate_patient_numbers(count, using="default"):
+    """
+    Reserve `count` patient numbers from the sequence in one query (PostgreSQL), e.g. for a
+    bulk import batch. Returns None on databases without the sequence: leave patient_number
+    empty there and number the rows with patient_number_expression() after inserting.
+    """
+    if count < 1:
+        return []
+    if not has_number_sequence(using):
+        return None
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"SELECT {PATIENT_NUMBER_FUNCTION}() FROM generate_series(1, %s)", [count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def patient_number_expression():
+    """SQL equivalent of format_patient_number(id), for numbering rows after insert without the sequence."""
+    padded = LPad(Cast("id", CharField()), 7, Value("0"))
+    return Case(
+        When(id__lt=10_000_000, then=Concat(Value(f"{PATIENT_NUMBER_PREFIX}-"), padded)),
+        default=Concat(Value(f"{PATIENT_NUMBER_PREFIX}-"), Cast("id", CharField())),
+        output_field=CharField(),
+    )
+
@@ -0,0 +1,91 @@
+"""
+Phonetic keys for patient names, in the spirit of Double Metaphone (a primary and an
+alternate key per name) but tuned for Kenyan spellings rather than English ones:
+- ch / sh, c / k / q, z / s, v / f and ph / f sound alike ("Wachira" ~ "Washira")
+- glides between vowels are dropped ("Otieno" ~ "Otiyeno", "Achieng" ~ "Achiyeng")
+- ny is folded into n and the apostrophe of ng' is ignored ("Ng'ang'a" ~ "Nganga")
+- vowels only matter at the start of a name ("Kamau" ~ "Kamao")
+The alternate key also merges l / r (Kikuyu, Luhya) and drops the nasal of prenasalized
+consonants (mb, nd, nj, ng: "Njoroge" ~ "Joroge"), so it is always at least as broad as the
+primary key. Keys are stored in indexed columns (Patient.save) and compared for equality.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+KEY_LENGTH = 6
+
+VOWELS = set("aeiou")
+
+# Applied in order to the folded name, before consonants are encoded
+_REWRITES = (
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"(ch|sh)"), "X"),
+    (re.compile(r"ck|q|c(?![eiy])"), "k"),
+    (re.compile(r"c"), "s"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"v"), "f"),
+    (re.compile(r"dh"), "d"),
+    (re.compile(r"gh"), "g"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"ny"), "N"),
+    (re.compile(r"(?<=[aeiou])[wy](?=[aeiou])"), ""),
+    (re.compile(r"(?<=[aeiou])h"), ""),
+)
+_PRENASAL = re.compile(r"[mn](?=[bdjg])")
+_NAME_JUNK = re.compile(r"[^a-z0-9]")
+
+
+def normalize_name(raw):
+    """Lower-case ASCII letters/digits only: 'Ng'ang'a ' -> 'nganga', 'Wanjirũ' -> 'wanjiru'."""
+    value = unicodedata.normalize("NFKD", str(raw or "")).encode("ascii", "ignore").decode()
+    value = _NAME_JUNK.sub("", value.lower())
+    return value or None
+
+
+def _encode(name, alternate=False):
+    if alternate:
+        name = _PRENASAL.sub("", name).replace("l", "r")
+    key = name[0].upper() if name[0] in VOWELS else ""
+    start = 1 if key else 0
+    previous = None
+    for char in name[start:]:
+        if char in VOWELS:
+            previous = None
+            continue
+        char = char.upper()
+        if char != previous:
+            key += char
+        previous = char
+    return (key or name[0].upper())[:KEY_LENGTH]
+
+
+@lru_cache(maxsize=65536)
+def phonetic_keys(raw):
+    """(primary, alternate) phonetic keys of a single name, or (None, None) if it has no letters."""
+    name = re.sub(r"[^a-z]", "", normalize_name(raw) or "")
+    if not name or name == "unknown":
+        return None, None
+    for pattern, replacement in _REWRITES:
+        name = pattern.sub(replacement, name)
+    return _encode(name), _encode(name, alternate=True)
+
+
+def search_name(first_name, last_name):
+    """Folded "first last" used for trigram similarity ('' parts and placeholders skipped)."""
+    parts = [normalize_name(part) for part in (first_name, last_name)]
+    return " ".join(part for part in parts if part and part != "unknown") or None
+
+
+def search_columns(first_name, last_name):
+    """Values for the precomputed search columns of a patient."""
+    first, first_alt = phonetic_keys(first_name)
+    last, last_alt = phonetic_keys(last_name)
+    return {
+        "search_name": search_name(first_name, last_name),
+        "first_name_phonetic": first,
+        "first_name_phonetic_alt": first_alt,
+        "last_name_phonetic": last,
+        "last_name_phonetic_alt": last_alt,
+    }
@@ -0,0 +1,277 @@
+"""
+Live department queue boards (reception, billing, doctor and pharmacy screens).
+
+One in-memory QueueBoard per process holds the patients waiting in each department
+(PATIENT_QUEUES). It is loaded with one query on first use (served by the partial index
+patients_queue_status_idx) and then kept current by patient status transitions: saves,
+move_patient and deletions publish their changes after commit. Every change is appended once
+to a short event log, and each open Server-Sent Events stream reads its department's events
+from that log, so N screens cost one broadcast per transition instead of N polling queries.
+
+The board only sees transitions made by its own process; changes from other workers or
+processes (bulk imports, scripts) are picked up by a full reload every BOARD_RESYNC_SECONDS,
+one query per process.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import PATIENT_QUEUES, QUEUE_STATUSES, Patient
+
+# Seconds between full reloads of the board (catches transitions made by other processes)
+BOARD_RESYNC_SECONDS = 30
+# Events kept for streams that fall behind or reconnect with Last-Event-ID
+BOARD_EVENT_LOG_SIZE = 1000
+# Idle streams send an SSE comment this often so proxies keep the connection open
+HEARTBEAT_SECONDS = 15
+
+DEPARTMENT_BY_STATUS = {status: department for department, statuses in PATIENT_QUEUES.items() for status in statuses}
+ENTRY_FIELDS = ("id", "patient_number", "first_name", "last_name", "status", "updated_at")
+
+
+def _entry(row):
+    """Board entry for a patient from its ENTRY_FIELDS values."""
+    return {
+        "id": row["id"],
+        "patient_number": row["patient_number"],
+        "name": f"{row['first_name'] or ''} {row['last_name'] or ''}".strip(),
+        "status": row["status"],
+        "since": row["updated_at"],
+    }
+
+
+def patient_entry(patient):
+    return _entry({field: getattr(patient, field) for field in ENTRY_FIELDS})
+
+
+class QueueBoard:
+    """Per-department queues of waiting patients plus a sequence-numbered event log."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._load_lock = threading.Lock()
+        self._waiters = set()  # (event loop, future) of async streams waiting for an event
+        self.clear()
+
+    def clear(self):
+        with self._condition:
+            self._queues = {department: {} for department in PATIENT_QUEUES}
+            self._departments = {}  # patient id -> department it is queued in
+            self._events = deque(maxlen=BOARD_EVENT_LOG_SIZE)
+            self._seq = getattr(self, "_seq", 0)  # keeps increasing, so old stream positions re-snapshot
+            self._loaded_at = None
+
+    # ---- state ----
+
+    def is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > BOARD_RESYNC_SECONDS
+
+    def invalidate(self):
+        """Reload on next use (after changes the board was not told about, e.g. bulk imports)."""
+        self._loaded_at = None
+
+    def load(self):
+        """
+        Rebuild every queue from the database with one query. A reload of an already loaded
+        board is broadcast as the join/leave/update differences, so open screens do not re-snapshot.
+        """
+        rows = (
+            Patient.objects.filter(status__in=QUEUE_STATUSES)
+            .order_by("updated_at", "id")
+            .values(*ENTRY_FIELDS)
+        )
+        entries = {row["id"]: _entry(row) for row in rows}
+        with self._condition:
+            if self._loaded_at is None and not self._departments:
+                for patient_id, entry in entries.items():
+                    department = DEPARTMENT_BY_STATUS[entry["status"]]
+                    self._queues[department][patient_id] = entry
+                    self._departments[patient_id] = department
+            else:
+                for patient_id in set(self._departments) - set(entries):
+                    self._move(patient_id, None, None)
+                for patient_id, entry in entries.items():
+                    current = self._queues.get(self._departments.get(patient_id), {}).get(patient_id)
+                    if current != entry:
+                        self._move(patient_id, entry["status"], entry)
+            self._loaded_at = time.monotonic()
+            self._notify()
+
+    def ensure_loaded(self):
+        if self.is_stale():
+            with self._load_lock:
+                if self.is_stale():
+                    self.load()
+
+    def snapshot(self, department):
+        """(sequence number, patients waiting in `department`, oldest first)."""
+        self.ensure_loaded()
+        with self._condition:
+            return self._seq, list(self._queues[department].values())
+
+    def apply(self, changes):
+        """
+        Apply committed transitions: (patient_id, new_status, entry or None) tuples; new_status
+        None means the patient was deleted. Entries missing for patients that join a queue are
+        fetched with one query.
+        """
+        if self._loaded_at is None:
+            return  # the next load() reads the committed state anyway
+        missing = [
+            patient_id for patient_id, status, entry in changes if entry is None and status in DEPARTMENT_BY_STATUS
+        ]
+        entries = {}
+        if missing:
+            entries = {row["id"]: _entry(row) for row in Patient.objects.filter(pk__in=missing).values(*ENTRY_FIELDS)}
+        with self._condition:
+            for patient_id, status, entry in changes:
+                self._move(patient_id, status, entry or entries.get(patient_id))
+            self._notify()
+
+    def _move(self, patient_id, status, entry):
+        previous = self._departments.get(patient_id)
+        department = DEPARTMENT_BY_STATUS.get(status) if entry else None
+        if previous and previous != department:
+            del self._queues[previous][patient_id]
+            del self._departments[patient_id]
+            self._append(previous, "leave", {"id": patient_id})
+        if department:
+            event = "update" if previous == department else "join"
+            self._queues[department][patient_id] = entry
+            self._departments[patient_id] = department
+            self._append(department, event, entry)
+
+    def _append(self, department, event, data):
+        self._seq += 1
+        self._events.append((self._seq, department, event, data))
+
+    def _notify(self):
+        self._condition.notify_all()
+        for loop, future in list(self._waiters):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+
+    # ---- readers ----
+
+    def events_since(self, seq, department):
+        """
+        (latest sequence number, [(seq, event, data)]) of `department` after `seq`, or None when
+        the event log no longer covers `seq` (stream fell behind, board cleared or restarted)
+        and the stream must re-snapshot.
+        """
+        with self._condition:
+            if seq > self._seq:
+                return None
+            if seq == self._seq:
+                return self._seq, []
+            if not self._events or self._events[0][0] > seq + 1:
+                return None
+            events = [
+                (event_seq, event, data)
+                for event_seq, event_department, event, data in self._events
+                if event_seq > seq and event_department == department
+            ]
+            return self._seq, events
+
+    def wait(self, seq, timeout):
+        """Block until an event after `seq` exists (or `timeout` seconds pass)."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > seq, timeout)
+
+    async def wait_async(self, seq, timeout):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._condition:
+            if self._seq > seq:
+                return
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._waiters.discard(waiter)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+queue_board = QueueBoard()
+
+
+def publish_transitions(changes):
+    """Hand (patient_id, new_status, entry or None) transitions to the board once the transaction commits."""
+    changes = list(changes)
+    if changes:
+        transaction.on_commit(lambda: queue_board.apply(changes))
+
+
+# ---- Server-Sent Events ----
+
+def sse_message(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, cls=DjangoJSONEncoder)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def _snapshot_message(board, department):
+    seq, patients = board.snapshot(department)
+    return seq, sse_message("snapshot", {"department": department, "patients": patients}, seq)
+
+
+def _pending_messages(board, department, seq):
+    """(new seq, messages) for events after `seq`, re-snapshotting when the stream fell behind."""
+    board.ensure_loaded()
+    pending = board.events_since(seq, department)
+    if pending is None:
+        seq, message = _snapshot_message(board, department)
+        return seq, [message]
+    seq, events = pending
+    return seq, [sse_message(event, data, event_seq) for event_seq, event, data in events]
+
+
+def _start(board, department, last_event_id):
+    """Resume after Last-Event-ID when the event log still covers it, else start from a snapshot."""
+    board.ensure_loaded()
+    if last_event_id is not None and board.events_since(last_event_id, department) is not None:
+        return _pending_messages(board, department, last_event_id)
+    seq, message = _snapshot_message(board, department)
+    return seq, [message]
+
+
+def stream_queue(department, last_event_id=None, board=queue_board):
+    """Blocking SSE generator for WSGI servers (one worker thread per open stream)."""
+    seq, messages = _start(board, department, last_event_id)
+    yield from messages
+    yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+    while True:
+        board.wait(seq, HEARTBEAT_SECONDS)
+        seq, messages = _pending_messages(board, department, seq)
+        yield from messages or [": keepalive\n\n"]
+
+
+async def astream_queue(department, last_event_id=None, board=queue_board):
+    """SSE async generator for ASGI servers: idle streams only hold a future, not a thread."""
+    from asgiref.sync import sync_to_async  # local import: only needed under ASGI
+
+    seq, messages = await sync_to_async(_start)(board, department, last_event_id)
+    for message in messages:
+        yield message
+    yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+    while True:
+        await board.wait_async(seq, HEARTBEAT_SECONDS)
+        if board.is_stale():
+            seq, messages = await sync_to_async(_pending_messages)(board, department, seq)
+        else:
+            seq, messages = _pending_messages(board, department, seq)
+        for message in messages or [": keepalive\n\n"]:
+            yield message
@@ -0,0 +1,111 @@
+"""
+Patient search backend (reception typeahead and duplicate lookups).
+
+- Exact fast paths: patient numbers (PAT-...), phone numbers and national IDs, each answered by
+  a btree index on the normalized columns.
+- Names: trigram word similarity on the precomputed search_name column (pg_trgm GIN index,
+  migration 0013), OR-ed with equality on the indexed phonetic keys: trigrams catch typos
+  ("Wanjiku" / "Wanjiru"), phonetic keys catch spelling variants ("Otieno" / "Otiyeno"). Results are ranked by similarity
+  plus a bonus for phonetic hits. The trigram cut-off is PostgreSQL's
+  pg_trgm.word_similarity_threshold (default 0.6), which keeps the GIN index usable.
+  Other databases (local SQLite) use LIKE instead of trigrams. Name queries also take an exact
+  national ID hit, since passport and alphanumeric IDs ("A1234567") look like words.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+
+from .matching import normalize_national_id, normalize_phone
+from .phonetic import normalize_name, phonetic_keys
+
+# Rank bonus when a query word sounds like the first or last name (primary key, alternate key)
+PHONETIC_BONUS = 0.5
+PHONETIC_ALT_BONUS = 0.3
+# Rank bonus for an exact national ID hit on a name query: puts it above any name match
+NATIONAL_ID_BONUS = 2.0
+# Words shorter than this are matched by text only: their phonetic keys are too broad
+MIN_PHONETIC_LENGTH = 3
+
+PATIENT_NUMBER_RE = re.compile(r"^PAT-\d+$", re.IGNORECASE)
+IDENTIFIER_RE = re.compile(r"^\+?[\d\s\-]{6,}$")
+
+
+def _is_postgres(queryset):
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def _phonetic_conditions(words):
+    """(primary, alternate) Q objects matching any query word against the phonetic key columns."""
+    primaries, alternates = set(), set()
+    for word in words:
+        if len(word) >= MIN_PHONETIC_LENGTH:
+            primary, alternate = phonetic_keys(word)
+            if primary:
+                primaries.add(primary)
+                alternates.add(alternate)
+    if not primaries:
+        return None, None
+    primary = Q(first_name_phonetic__in=primaries) | Q(last_name_phonetic__in=primaries)
+    alternate = Q(first_name_phonetic_alt__in=alternates) | Q(last_name_phonetic_alt__in=alternates)
+    return primary, alternate
+
+
+def search_patients(queryset, term):
+    """Filter and rank a Patient queryset by a free-text term; ranked results carry `rank`."""
+    term = (term or "").strip()
+    if not term:
+        return queryset
+
+    if PATIENT_NUMBER_RE.match(term):
+        return queryset.filter(patient_number=term.upper())
+    if IDENTIFIER_RE.match(term):
+        condition = Q(national_id_normalized=normalize_national_id(term))
+        phone = normalize_phone(term)
+        if phone:
+            condition |= Q(phone_normalized=phone)
+        return queryset.filter(condition)
+
+    national_id = normalize_national_id(term)
+    id_match = Q(national_id_normalized=national_id) if national_id else None
+    words = [word for word in (normalize_name(part) for part in term.split()) if word]
+    if not words:
+        return queryset.filter(id_match) if id_match is not None else queryset.none()
+    folded = " ".join(words)
+
+    primary, alternate = _phonetic_conditions(words)
+    bonus = Value(0.0)
+    if primary is not None:
+        bonus = Case(
+            When(primary, then=Value(PHONETIC_BONUS)),
+            When(alternate, then=Value(PHONETIC_ALT_BONUS)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    if id_match is not None:
+        bonus = bonus + Case(
+            When(id_match, then=Value(NATIONAL_ID_BONUS)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    if _is_postgres(queryset):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        text_match = Q(search_name__trigram_word_similar=folded)
+        text_rank = TrigramWordSimilarity(folded, "search_name")
+    else:
+        text_match = Q(search_name__contains=folded)
+        text_rank = Case(
+            When(search_name__startswith=folded, then=Value(1.0)),
+            When(search_name__contains=folded, then=Value(0.6)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    condition = text_match
+    if primary is not None:
+        condition |= primary | alternate
+    if id_match is not None:
+        condition |= id_match
+    return queryset.filter(condition).annotate(rank=text_rank + bonus).order_by("-rank", "-id")
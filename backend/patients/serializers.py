@@ -57,6 +57,23 @@ class PatientSerializer(serializers.ModelSerializer):
         return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
 
 
+class PatientMatchSerializer(PatientSerializer):
+    """Possible duplicate returned by the matching engine, with its score and matched signals."""
+    match_score = serializers.IntegerField(read_only=True)
+    match_reasons = serializers.ListField(child=serializers.CharField(), read_only=True)
+
+    class Meta(PatientSerializer.Meta):
+        fields = PatientSerializer.Meta.fields + ("match_score", "match_reasons")
+
+
+class PatientSearchSerializer(PatientSerializer):
+    """Patient search hit with its relevance rank (absent for exact identifier lookups)."""
+    rank = serializers.FloatField(read_only=True, default=None)
+
+    class Meta(PatientSerializer.Meta):
+        fields = PatientSerializer.Meta.fields + ("rank",)
+
+
 class PatientCreateSerializer(serializers.ModelSerializer):
     """
     Use this for create requests. The view calls the service; serializer only validates the data shape.
@@ -3,37 +3,24 @@ Patient service functions: encapsulate matching & registration logic.
 Used by views and other modules to avoid duplication.
 """
 from typing import List, Dict
-from django.db import transaction
-from .models import Patient
+from django.db import connection, transaction
+from django.utils import timezone
+from .history import status_code_sql
+from .matching import find_matches
+from .models import STATUS_TO_CODE, Patient, PatientStatusHistory
+from .queues import publish_transitions
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
-def find_possible_matches(data: Dict) -> List[Patient]:
-    """
-    Simple matching heuristics:
-    - exact national_id match (highest priority)
-    - exact phone_number match
-    - exact name + dob match
-    Returns a list of matching Patient objects (may be empty).
-    """
-    qs = Patient.objects.none()
-    national_id = data.get("national_id")
-    phone = data.get("phone_number")
-    first = data.get("first_name")
-    last = data.get("last_name")
-    dob = data.get("dob")
-
-    if national_id:
-        qs = qs | Patient.objects.filter(national_id__iexact=national_id)
-    if phone:
-        qs = qs | Patient.objects.filter(phone_number__iexact=phone)
-    if first and dob:
-        qs = qs | Patient.objects.filter(first_name__iexact=first, dob=dob)
-    if last and dob:
-        qs = qs | Patient.objects.filter(last_name__iexact=last, dob=dob)
-
-    # Use distinct to avoid duplicates from unions
-    return qs.distinct()
+def find_possible_matches(data: Dict, limit: int = 10) -> List[Patient]:
+    """
+    Possible duplicates of `data`, strongest first, from one indexed query:
+    - national ID (upper-cased, separators removed)
+    - phone number (E.164)
+    - last name + date of birth (blocking key), boosted when the first name also matches
+    Each Patient carries `match_score` and `match_reasons` (see patients.matching).
+    """
+    return find_matches(data, limit=limit)
 
 @transaction.atomic
 def register_patient(data: Dict, created_by: User = None) -> Dict:
@@ -44,14 +31,14 @@ def register_patient(data: Dict, created_by: User = None) -> Dict:
     If matches exist, returns matches and created=False (caller can decide).
     """
     matches = find_possible_matches(data)
-    if matches.exists():
-        return {"patient": None, "created": False, "matches": list(matches[:10])}
+    if matches:
+        return {"patient": None, "created": False, "matches": matches}
 
     # No match -- create a new Patient. Using atomic ensures create + any side-effects atomic.
     patient = Patient.objects.create(
         first_name=data.get("first_name"),
         last_name=data.get("last_name"),
-        gender=data.get("gender"),
+        gender=data.get("gender") or "other",
         dob=data.get("dob"),
         national_id=data.get("national_id"),
         # nhif_number=data.get("nhif_number"),
@@ -60,3 +47,45 @@ def register_patient(data: Dict, created_by: User = None) -> Dict:
         created_by=created_by,
     )
     return {"patient": patient, "created": True, "matches": []}
+
+
+def log_status_changes(changes, changed_by=None):
+    """
+    Write PatientStatusHistory rows for (patient_id, old_status, new_status) tuples in one
+    bulk INSERT. Used by saves and batch status moves alike.
+    """
+    rows = [
+        PatientStatusHistory(patient_id=patient_id, old_status=old, new_status=new, changed_by=changed_by)
+        for patient_id, old, new in changes
+        if old != new
+    ]
+    return PatientStatusHistory.objects.bulk_create(rows) if rows else []
+
+
+@transaction.atomic
+def move_patient(patient_id, new_status, changed_by=None) -> bool:
+    """
+    Move a patient to `new_status` without loading or saving the instance (patient-flow transitions):
+    - one INSERT ... SELECT writes the history row from the current status (and row-locks the
+      patient where SELECT ... FOR UPDATE exists, so concurrent movers cannot both log a change);
+    - one conditional UPDATE ... WHERE status != new_status moves the patient.
+    Returns True if the patient moved, False if already there (or missing).
+    History statuses are stored as codes, so the SELECT encodes the current status in SQL.
+    """
+    now = timezone.now()
+    qn = connection.ops.quote_name
+    lock = " FOR UPDATE" if connection.features.has_select_for_update else ""
+    sql = (
+        f"INSERT INTO {qn(PatientStatusHistory._meta.db_table)} "
+        f"({qn('patient_id')}, {qn('old_status')}, {qn('new_status')}, {qn('changed_at')}, {qn('changed_by_id')}) "
+        f"SELECT {qn('id')}, {status_code_sql(qn('status'))}, %s, %s, %s FROM {qn(Patient._meta.db_table)} "
+        f"WHERE {qn('id')} = %s AND {qn('status')} <> %s{lock}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [STATUS_TO_CODE[new_status], now, getattr(changed_by, "pk", None), patient_id, new_status])
+        if not cursor.rowcount:
+            return False
+    Patient.objects.filter(pk=patient_id).exclude(status=new_status).update(status=new_status, updated_at=now)
+    # The board fetches the patient's details itself (one query after commit)
+    publish_transitions([(patient_id, new_status, None)])
+    return True
@@ -1,61 +1,65 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.apps import apps
-from .models import Patient, PatientStatusHistory
+from billing.models import Billing
+from billing.signals import billing_status_changed
+from .models import Patient
+from .queues import patient_entry, publish_transitions
+from .services import log_status_changes, move_patient
 
-# Before saving patient: capture old status for comparison
+# Before saving patient: registration goes straight to billing, and the old status comes from
+# the value loaded with the instance (Patient.from_db), so no re-fetch is needed
 @receiver(pre_save, sender=Patient)
-def patient_pre_save(sender, instance, **kwargs):
-    if instance.pk:  # if updating existing patient
-        try:
-            old = Patient.objects.get(pk=instance.pk)
-            instance._old_status = old.status
-        except Patient.DoesNotExist:
-            instance._old_status = None
-    else:
+def patient_pre_save(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        # New patients are handed to billing in the INSERT itself (no second save); the
+        # registered -> sent_to_billing transition is still logged after the insert
         instance._old_status = None
+        if instance.status == "registered":
+            instance.status = "sent_to_billing"
+            instance._old_status = "registered"
+        return
+    instance._old_status = getattr(instance, "_loaded_status", None)
+    if instance._old_status is None and (update_fields is None or "status" in update_fields):
+        # Status was deferred (or the instance was built by hand): fall back to one lookup
+        instance._old_status = Patient.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
 
 
-# After saving patient: check for status updates
+# After saving patient: log status changes
 @receiver(post_save, sender=Patient)
-def patient_post_save(sender, instance, created, **kwargs):
+def patient_post_save(sender, instance, created, update_fields=None, **kwargs):
     """
-    - On creation: if status is 'registered', flip to 'sent_to_billing'.
+    - On creation: log 'registered' -> 'sent_to_billing' (the INSERT already carries the new status).
     - On update: if status changed, log it in PatientStatusHistory.
+    Either way the patient joins/moves on the department queue boards.
     """
     old = getattr(instance, "_old_status", None)
-
-    # If new patient was registered, move to "sent_to_billing"
-    if created and instance.status == "registered":
-        instance.status = "sent_to_billing"
-        instance.save()  # triggers another post_save
+    instance._loaded_status = instance.status
+    if created:
+        if old:
+            log_status_changes([(instance.pk, old, instance.status)])
+        publish_transitions([(instance.pk, instance.status, patient_entry(instance))])
+        return
+    if update_fields is not None and "status" not in update_fields:
         return
-
-    # If status changed, create history record
     if old != instance.status:
-        PatientStatusHistory.objects.create(
-            patient=instance,
-            old_status=old,
-            new_status=instance.status,
-            # changed_by can be filled in views if needed
-        )
+        log_status_changes([(instance.pk, old, instance.status)])
+        publish_transitions([(instance.pk, instance.status, patient_entry(instance))])
 
 
-# Listen to Billing model saves to update patient status
-@receiver(post_save)
-def generic_post_save(sender, instance, **kwargs):
-    """
-    Dynamically check if the saved model is Billing (avoids circular import).
-    If a bill is paid, update patient status to 'ready_for_doctor'.
-    """
-    Billing = apps.get_model("billing", "Billing")
-    if sender is not Billing:
-        return
+@receiver(post_delete, sender=Patient)
+def patient_post_delete(sender, instance, **kwargs):
+    publish_transitions([(instance.pk, None, None)])
+
+
+# Patient flow: bill status -> patient status. Only transitions listed here move a patient.
+BILLING_STATUS_FLOW = {
+    Billing.STATUS_PAID: "ready_for_doctor",  # settled bill: patient joins the doctor queue
+}
 
-    patient = getattr(instance, "patient", None)
 
-    # If bill is paid, move patient to doctor queue
-    if patient and instance.is_paid:
-        if patient.status != "ready_for_doctor":
-            patient.status = "ready_for_doctor"
-            patient.save()
+@receiver(billing_status_changed, sender=Billing)
+def patient_on_billing_status_changed(sender, billing, old_status, new_status, **kwargs):
+    """Move the bill's patient along the flow with one conditional UPDATE (no Patient load/save)."""
+    target = BILLING_STATUS_FLOW.get(new_status)
+    if target and billing.patient_id:
+        move_patient(billing.patient_id, target)
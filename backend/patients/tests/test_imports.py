@@ -0,0 +1,77 @@
+import csv
+import io
+import re
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from patients.imports import IMPORT_FIELDS, import_patients
+from patients.models import Patient, PatientStatusHistory
+
+User = get_user_model()
+
+
+def csv_upload(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=IMPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return SimpleUploadedFile("patients.csv", out.getvalue().encode(), content_type="text/csv")
+
+
+class PatientImportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.existing = Patient.objects.create(
+            first_name="Akinyi", last_name="Odhiambo", dob=date(1985, 3, 2), national_id="22334455"
+        )
+
+    def test_endpoint_imports_and_rejects(self):
+        rows = [
+            {"first_name": "Wanjiru", "last_name": "Kamau", "dob": "1990-05-01", "phone_number": "0712000001"},
+            {"first_name": "Otieno", "last_name": "Ouma", "gender": "male", "national_id": "998877"},
+            {"first_name": "Someone", "national_id": "22-334-455"},  # existing national ID
+            {"first_name": "Akinyi", "last_name": "Odhiambo", "dob": "1985-03-02"},  # existing name+dob
+            {"first_name": "Wanjiru", "last_name": "Kamau", "phone_number": "+254712000001"},  # dup of row 1
+            {"first_name": "", "last_name": ""},
+            {"first_name": "Bad", "dob": "1990-13-45"},
+        ]
+        resp = self.client.post(reverse("patient-bulk-import"), {"file": csv_upload(rows)}, format="multipart")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["summary"], {"rows": 7, "created": 2, "rejected": 5})
+        reasons = {reject["row"]: (reject["reason"], reject["patient_id"]) for reject in resp.data["rejects"]}
+        self.assertEqual(
+            reasons,
+            {
+                3: ("duplicate:national_id", self.existing.pk),
+                4: ("duplicate:name_dob", self.existing.pk),
+                5: ("duplicate_in_file:1", None),
+                6: ("missing_name", None),
+                7: ("invalid_dob", None),
+            },
+        )
+        created = Patient.objects.exclude(pk=self.existing.pk).order_by("pk")
+        numbers = [p.patient_number for p in created]
+        self.assertTrue(all(re.fullmatch(r"PAT-\d{7}", number) for number in numbers))
+        self.assertEqual(len(set(numbers) | {self.existing.patient_number}), 3)
+        self.assertEqual({p.status for p in created}, {"sent_to_billing"})
+        self.assertEqual(created[0].phone_normalized, "+254712000001")
+        self.assertEqual(created[0].created_by, self.user)
+        history = PatientStatusHistory.objects.filter(patient__in=created).order_by("patient_id")
+        self.assertEqual(
+            [(h.patient_id, h.old_status, h.new_status, h.changed_at, h.changed_by_id) for h in history],
+            [(p.pk, "registered", "sent_to_billing", p.created_at, self.user.pk) for p in created],
+        )
+
+    def test_batches_cost_constant_queries(self):
+        rows = [{"first_name": f"P{i}", "last_name": "Import", "national_id": f"ID{i}"} for i in range(50)]
+        # per batch: savepoint, duplicate join, numbers (sequence block or UPDATE), patient INSERT,
+        # history INSERT, release
+        with self.assertNumQueries(12):
+            summary = import_patients(rows, batch_size=25)
+        self.assertEqual(summary["created"], 50)
@@ -0,0 +1,134 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from patients.matching import name_dob_key, normalize_national_id, normalize_phone
+from patients.phonetic import phonetic_keys
+from patients.models import Patient
+from patients.services import find_possible_matches
+
+User = get_user_model()
+
+
+class PatientMatchingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.patient = Patient.objects.create(
+            first_name="Wanjiru",
+            last_name="Kamau",
+            dob=date(1990, 5, 1),
+            national_id="12 345-678",
+            phone_number="0712 345 678",
+        )
+
+    def test_normalizers(self):
+        for raw in ("0712345678", "+254 712 345 678", "254712345678", "712345678", "00254712345678"):
+            self.assertEqual(normalize_phone(raw), "+254712345678")
+        self.assertIsNone(normalize_phone("123"))
+        self.assertEqual(normalize_national_id(" a12-345 "), "A12345")
+        self.assertEqual(name_dob_key("Ng'ang'a", "1990-05-01"), name_dob_key("Nganga", "1990-05-01"))
+
+    def test_columns_follow_raw_fields(self):
+        self.assertEqual(self.patient.phone_normalized, "+254712345678")
+        self.assertEqual(self.patient.national_id_normalized, "12345678")
+        self.patient.phone_number = "0722000000"
+        self.patient.save(update_fields=["phone_number"])
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.phone_normalized, "+254722000000")
+
+    def test_one_query_ranked_matches(self):
+        phone_only = Patient.objects.create(first_name="Other", phone_number="+254712345678")
+        with self.assertNumQueries(1):
+            matches = find_possible_matches(
+                {"first_name": "wanjiru", "last_name": "KAMAU", "dob": "1990-05-01", "phone_number": "712345678"}
+            )
+        self.assertEqual([m.pk for m in matches], [self.patient.pk, phone_only.pk])
+        self.assertEqual(matches[0].match_reasons, ["phone", "name_dob", "first_name"])
+        self.assertGreater(matches[0].match_score, matches[1].match_score)
+
+    def test_surname_change_matches_on_first_name_and_dob(self):
+        self.assertEqual(self.patient.first_name_dob_key, name_dob_key("Wanjiru", "1990-05-01"))
+        matches = find_possible_matches({"first_name": "Wanjiru", "last_name": "Otieno", "dob": "1990-05-01"})
+        self.assertEqual([m.pk for m in matches], [self.patient.pk])
+        self.assertEqual(matches[0].match_reasons, ["first_name_dob", "first_name"])
+        self.assertEqual(find_possible_matches({"first_name": "Wanjiru", "last_name": "Otieno", "dob": "1991-05-01"}), [])
+
+    def test_create_returns_existing_for_national_id(self):
+        resp = self.client.post(reverse("patient-list"), {"first_name": "X", "national_id": "12345678"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["patient"]["id"], self.patient.pk)
+
+    def test_create_returns_existing_only_for_exact_name_and_dob(self):
+        resp = self.client.post(
+            reverse("patient-list"),
+            {"first_name": " wanjiru", "last_name": "KAMAU ", "dob": "1990-05-01"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["patient"]["id"], self.patient.pk)
+
+        # Same phonetic keys, different spelling: a candidate, not the same person
+        resp = self.client.post(
+            reverse("patient-list"),
+            {"first_name": "Wanjiro", "last_name": "Kamao", "dob": "1990-05-01"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resp.data["matches"][0]["id"], self.patient.pk)
+        self.assertIn("name_dob", resp.data["matches"][0]["match_reasons"])
+
+    def test_create_conflict_lists_scored_matches(self):
+        resp = self.client.post(
+            reverse("patient-list"), {"first_name": "Jane", "phone_number": "+254-712-345-678"}, format="json"
+        )
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resp.data["matches"][0]["match_reasons"], ["phone"])
+
+
+class PatientSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.wanjiru = Patient.objects.create(first_name="Wanjiru", last_name="Kamau", phone_number="0712345678")
+        self.otieno = Patient.objects.create(first_name="Brian", last_name="Otieno")
+        Patient.objects.create(first_name="Zawadi", last_name="Mwende")
+
+    def test_phonetic_keys(self):
+        self.assertEqual(phonetic_keys("Otiyeno"), phonetic_keys("Otieno"))
+        self.assertEqual(phonetic_keys("Washira"), phonetic_keys("Wachira"))
+        self.assertEqual(phonetic_keys("Kilonzo")[1], phonetic_keys("Kironzo")[1])
+        self.assertEqual(self.otieno.last_name_phonetic, "OTN")
+        self.assertEqual(self.wanjiru.search_name, "wanjiru kamau")
+
+    def test_spelling_variant_found_and_ranked(self):
+        resp = self.client.get(reverse("patient-search"), {"q": "otiyeno"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["id"] for row in resp.data["results"]], [self.otieno.pk])
+        self.assertGreater(resp.data["results"][0]["rank"], 0)
+
+    def test_prefix_ranks_first_and_paginates(self):
+        resp = self.client.get(reverse("patient-search"), {"q": "wanjiru kam", "page_size": 1})
+        self.assertEqual(resp.data["count"], 1)
+        self.assertEqual(resp.data["results"][0]["id"], self.wanjiru.pk)
+
+    def test_identifier_lookup(self):
+        resp = self.client.get(reverse("patient-search"), {"q": "+254 712 345 678"})
+        self.assertEqual([row["id"] for row in resp.data["results"]], [self.wanjiru.pk])
+        resp = self.client.get(reverse("patient-search"), {"q": self.otieno.patient_number.lower()})
+        self.assertEqual([row["id"] for row in resp.data["results"]], [self.otieno.pk])
+
+    def test_matches_uses_fuzzy_search_for_names(self):
+        resp = self.client.get(reverse("patient-matches"), {"q": "Kamao"})
+        self.assertEqual([row["id"] for row in resp.data], [self.wanjiru.pk])
+
+    def test_matches_finds_alphanumeric_national_id(self):
+        self.otieno.national_id = "a123-4567"
+        self.otieno.save(update_fields=["national_id"])
+        resp = self.client.get(reverse("patient-matches"), {"q": "A1234567"})
+        self.assertEqual([row["id"] for row in resp.data], [self.otieno.pk])
+        resp = self.client.get(reverse("patient-search"), {"q": "a 123 4567"})
+        self.assertEqual([row["id"] for row in resp.data["results"]], [self.otieno.pk])
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+
+from patients.models import Patient
+from patients.queues import astream_queue, queue_board, stream_queue
+from patients.services import move_patient
+from patients.views import PatientViewSet
+
+User = get_user_model()
+
+
+def parse_event(message):
+    fields = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+
+class QueueBoardTests(APITestCase):
+    def setUp(self):
+        queue_board.clear()
+        self.addCleanup(queue_board.clear)
+        self.user = User.objects.create_user(username="doctor", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.waiting = Patient.objects.create(first_name="Amina", last_name="Otieno")
+        Patient.objects.create(first_name="Juma", status="discharged")
+
+    def test_cold_start_is_one_query_then_served_from_memory(self):
+        with self.assertNumQueries(1):
+            _seq, billing = queue_board.snapshot("billing")
+            for _ in range(100):
+                queue_board.snapshot("billing")
+        self.assertEqual([entry["id"] for entry in billing], [self.waiting.pk])
+        self.assertEqual(queue_board.snapshot("pharmacy")[1], [])
+
+    def test_transitions_move_patients_between_queues_after_commit(self):
+        queue_board.ensure_loaded()
+        with self.captureOnCommitCallbacks(execute=True):
+            move_patient(self.waiting.pk, "ready_for_doctor")
+        self.assertEqual(queue_board.snapshot("billing")[1], [])
+        self.assertEqual([entry["id"] for entry in queue_board.snapshot("doctor")[1]], [self.waiting.pk])
+
+        self.waiting.refresh_from_db()
+        self.waiting.status = "discharged"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.waiting.save()
+        self.assertEqual(queue_board.snapshot("doctor")[1], [])
+
+    def test_sse_stream_snapshot_then_events(self):
+        queue_board.ensure_loaded()
+        stream = stream_queue("doctor")
+        event, data = parse_event(next(stream))
+        self.assertEqual((event, data["patients"]), ("snapshot", []))
+        next(stream)  # retry hint
+
+        with self.captureOnCommitCallbacks(execute=True):
+            move_patient(self.waiting.pk, "ready_for_doctor")
+        event, data = parse_event(next(stream))
+        self.assertEqual((event, data["id"], data["status"]), ("join", self.waiting.pk, "ready_for_doctor"))
+
+    def test_async_stream_wakes_on_broadcast(self):
+        queue_board.ensure_loaded()
+        entry = {"id": self.waiting.pk, "patient_number": "PAT-1", "name": "Amina", "status": "ready_for_pharmacy", "since": None}
+
+        async def read_two():
+            stream = astream_queue("pharmacy")
+            messages = [await stream.__anext__(), await stream.__anext__()]
+            pending = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.05)
+            queue_board.apply([(self.waiting.pk, "ready_for_pharmacy", entry)])
+            messages.append(await asyncio.wait_for(pending, 5))
+            await stream.aclose()
+            return messages
+
+        messages = asyncio.run(read_two())
+        self.assertEqual(parse_event(messages[0])[0], "snapshot")
+        self.assertEqual(parse_event(messages[2]), ("join", entry))
+
+    def test_resume_from_last_event_id(self):
+        queue_board.ensure_loaded()
+        seq = queue_board.snapshot("billing")[0]
+        queue_board.apply([(self.waiting.pk, "discharged", None)])
+        event, data = parse_event(next(stream_queue("billing", last_event_id=seq)))
+        self.assertEqual((event, data), ("leave", {"id": self.waiting.pk}))
+        # Positions the event log no longer covers (e.g. from before a restart) re-snapshot
+        self.assertEqual(parse_event(next(stream_queue("billing", last_event_id=seq + 1000)))[0], "snapshot")
+
+    def test_endpoint_json_and_event_stream(self):
+        url = reverse("patient-queue", args=["billing"])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry["id"] for entry in response.data["patients"]], [self.waiting.pk])
+
+        # The stream is read from the view directly: closing a test client streaming response
+        # fires request_finished, which would close the test database connection
+        request = APIRequestFactory().get(url, HTTP_ACCEPT="text/event-stream")
+        force_authenticate(request, user=self.user)
+        view = PatientViewSet.as_view({"get": "queue"}, **PatientViewSet.queue.kwargs)
+        response = view(request, department="billing")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        event, data = parse_event(next(iter(response.streaming_content)).decode())
+        self.assertEqual((event, len(data["patients"])), ("snapshot", 1))
+
+        self.assertEqual(self.client.get(reverse("patient-queue", args=["mortuary"])).status_code, 404)
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from patients.models import Patient, PatientStatusHistory
+from patients.numbering import allocate_patient_numbers, format_patient_number, has_number_sequence
+from patients.services import register_patient
+
+User = get_user_model()
+
+
+class PatientRegistrationQueryTests(TestCase):
+    def test_create_numbers_patient_in_the_insert(self):
+        # PostgreSQL: the INSERT returns the sequence number; elsewhere one UPDATE follows.
+        # Plus one history INSERT for registered -> sent_to_billing.
+        with self.assertNumQueries(2 if has_number_sequence() else 3):
+            patient = Patient.objects.create(first_name="Amina", last_name="Otieno")
+        number = patient.patient_number
+        patient.refresh_from_db()
+        self.assertEqual(patient.status, "sent_to_billing")
+        self.assertEqual(patient.patient_number, number)
+        self.assertRegex(number, r"^PAT-\d{7}$")
+        history = PatientStatusHistory.objects.get(patient=patient)
+        self.assertEqual((history.old_status, history.new_status), ("registered", "sent_to_billing"))
+
+    def test_allocate_patient_numbers(self):
+        numbers = allocate_patient_numbers(3)
+        if not has_number_sequence():
+            self.assertIsNone(numbers)
+            return
+        self.assertEqual(len(set(numbers)), 3)
+        self.assertNotIn(Patient.objects.create(first_name="Amina").patient_number, numbers)
+
+    def test_format_patient_number(self):
+        self.assertEqual(format_patient_number(123), "PAT-0000123")
+        self.assertEqual(format_patient_number(12_345_678), "PAT-12345678")
+
+    def test_register_patient_checks_matches_once(self):
+        # match lookup, savepoint, INSERT (+ patient_number UPDATE without the sequence), history INSERT, release
+        with self.assertNumQueries(5 if has_number_sequence() else 6):
+            result = register_patient({"first_name": "Amina", "phone_number": "+254700000009"})
+        self.assertTrue(result["created"])
+
+    def test_status_change_logged_without_refetch(self):
+        patient = Patient.objects.get(pk=Patient.objects.create(first_name="Amina").pk)
+        patient.status = "triaged"
+        # UPDATE + history INSERT, no SELECT of the old row
+        with self.assertNumQueries(2):
+            patient.save()
+        history = PatientStatusHistory.objects.get(patient=patient, new_status="triaged")
+        self.assertEqual(history.old_status, "sent_to_billing")
+
+        # Saving again without a status change logs nothing
+        with self.assertNumQueries(1):
+            patient.save()
+        self.assertEqual(patient.status_history.count(), 2)
+
+    def test_refresh_resets_loaded_status(self):
+        patient = Patient.objects.create(first_name="Amina")
+        Patient.objects.filter(pk=patient.pk).update(status="triaged")
+        patient.refresh_from_db()
+        patient.save()
+        self.assertFalse(patient.status_history.filter(new_status="triaged").exists())
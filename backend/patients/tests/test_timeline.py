@@ -0,0 +1,99 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from billing.models import Billing
+from consultation.models import Consultation, Diagnosis, Prescription, PrescriptionItem
+from lab.models import LabRequest, LabResult
+from patients.models import Patient
+from pharmacy.models import Dispense, DispenseLine, Drug
+from triage.models import TriageRecord
+
+User = get_user_model()
+
+
+class PatientTimelineTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.patient = Patient.objects.create(first_name="Amina", last_name="Otieno")
+        self.drug = Drug.objects.create(name="Paracetamol", quantity=1000, unit_price=Decimal("5.00"))
+        self.diagnosis = Diagnosis.objects.create(name="Malaria")
+        self.url = reverse("patient-timeline", args=[self.patient.pk])
+
+    def add_visit(self):
+        """One visit: triage, consultation + prescription, lab request + result, dispense, bill."""
+        TriageRecord.objects.create(patient=self.patient, attended_by=self.user, temperature_c=38.5)
+        consultation = Consultation.objects.create(patient=self.patient, doctor_name="Dr. Kip", complaints="Fever")
+        consultation.diagnoses.add(self.diagnosis)
+        prescription = Prescription.objects.create(consultation=consultation)
+        item = PrescriptionItem.objects.create(prescription=prescription, drug=self.drug, quantity_requested=10)
+        lab_request = LabRequest.objects.create(patient=self.patient, consultation=consultation, test_name="BS for MPs")
+        LabResult.objects.create(lab_request=lab_request, result_text="Positive")
+        dispense = Dispense.objects.create(prescription=prescription, performed_by=self.user)
+        DispenseLine.objects.create(
+            dispense=dispense, prescription_item=item, drug=self.drug, quantity_dispensed=10,
+            unit_price_at_dispense=Decimal("5.00"),
+        )
+        Billing.objects.create(patient=self.patient, service="consultation", charged_by=self.user)
+
+    def fetch(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp, len(ctx)
+
+    def test_query_count_is_fixed(self):
+        self.add_visit()
+        resp, one_visit = self.fetch()
+        for _ in range(4):
+            self.add_visit()
+        resp, five_visits = self.fetch()
+        self.assertEqual(one_visit, five_visits)
+
+        types = {event["type"] for event in resp.data["results"]}
+        self.assertTrue({"triage", "consultation", "lab_request", "dispense", "bill"} <= types)
+        consultation = next(event for event in resp.data["results"] if event["type"] == "consultation")
+        self.assertEqual(consultation["data"]["diagnoses"], ["Malaria"])
+        self.assertEqual(consultation["data"]["prescriptions"][0]["items"][0]["drug"], "Paracetamol")
+        lab = next(event for event in resp.data["results"] if event["type"] == "lab_request")
+        self.assertEqual(lab["data"]["result"]["result_text"], "Positive")
+
+    def test_cursor_walks_whole_history_newest_first(self):
+        for _ in range(3):
+            self.add_visit()
+        resp, _ = self.fetch(page_size=100)
+        everything = [(event["type"], event["id"]) for event in resp.data["results"]]
+        self.assertIsNone(resp.data["next"])
+
+        walked, params = [], {"page_size": 4}
+        while True:
+            resp, _ = self.fetch(**params)
+            walked += [(event["type"], event["id"]) for event in resp.data["results"]]
+            if not resp.data["next"]:
+                break
+            params["cursor"] = resp.data["next"].split("cursor=")[1].split("&")[0]
+        self.assertEqual(walked, everything)
+        timestamps = [event["timestamp"] for event in self.fetch(page_size=100)[0].data["results"]]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_since_returns_only_newer_events(self):
+        self.add_visit()
+        since = timezone.now()
+        TriageRecord.objects.create(patient=self.patient, temperature_c=37.0)
+        Billing.objects.create(patient=self.patient, service="consultation", created_at=since + timedelta(seconds=1))
+        resp, _ = self.fetch(since=since.isoformat())
+        self.assertEqual([event["type"] for event in resp.data["results"]], ["bill", "triage"])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "nope"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"since": "yesterday"}).status_code, status.HTTP_400_BAD_REQUEST)
+        missing = reverse("patient-timeline", args=[999999])
+        self.assertEqual(self.client.get(missing).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,213 @@
+"""
+Patient timeline: triage records, consultations (with diagnoses, prescriptions and items),
+lab requests (with results), dispenses (with lines) and bills as one newest-first stream.
+
+Each source is read with one query plus fixed prefetches, limited to the page size, and the
+already-sorted lists are merged in Python, so a page costs the same number of queries however
+long the patient's history is. Events are ordered by (timestamp, type, id); the cursor is the
+last event's key and each source applies it as a keyset filter. `since` keeps only events
+newer than a timestamp (incremental refresh of an open chart).
+"""
+import heapq
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from billing.models import Billing
+from consultation.models import Consultation, PrescriptionItem
+from lab.models import LabRequest
+from pharmacy.models import Dispense, DispenseLine
+from triage.models import TriageRecord
+
+TIMELINE_PAGE_SIZE = 50
+TIMELINE_MAX_PAGE_SIZE = 200
+
+
+def _user_name(user):
+    return user.get_full_name() or user.username if user else None
+
+
+def _triage(record):
+    return {
+        "temperature_c": record.temperature_c,
+        "heart_rate_bpm": record.heart_rate_bpm,
+        "respiratory_rate_bpm": record.respiratory_rate_bpm,
+        "systolic_bp": record.systolic_bp,
+        "diastolic_bp": record.diastolic_bp,
+        "spo2_percent": record.spo2_percent,
+        "weight_kg": record.weight_kg,
+        "height_cm": record.height_cm,
+        "bmi": record.bmi,
+        "attended_by": _user_name(record.attended_by),
+    }
+
+
+def _consultation(consultation):
+    return {
+        "doctor_name": consultation.doctor_name,
+        "complaints": consultation.complaints,
+        "vitals": consultation.vitals,
+        "diagnoses": [diagnosis.name for diagnosis in consultation.diagnoses.all()],
+        "prescriptions": [
+            {
+                "id": prescription.id,
+                "status": prescription.status,
+                "items": [
+                    {
+                        "id": item.id,
+                        "drug": item.drug.name,
+                        "dose": item.dose,
+                        "unit": item.unit,
+                        "frequency": item.frequency,
+                        "duration": item.duration,
+                        "quantity_requested": item.quantity_requested,
+                        "quantity_dispensed": item.quantity_dispensed,
+                    }
+                    for item in prescription.items.all()
+                ],
+            }
+            for prescription in consultation.prescriptions.all()
+        ],
+    }
+
+
+def _lab_request(lab_request):
+    result = getattr(lab_request, "result", None)
+    return {
+        "test_name": lab_request.get_display_name(),
+        "status": lab_request.status,
+        "consultation": lab_request.consultation_id,
+        "result": {
+            "result_text": result.result_text,
+            "result_json": result.result_json,
+            "verified": result.verified,
+            "created_at": result.created_at,
+        }
+        if result
+        else None,
+    }
+
+
+def _dispense(dispense):
+    return {
+        "prescription": dispense.prescription_id,
+        "performed_by": _user_name(dispense.performed_by),
+        "lines": [
+            {
+                "drug": line.drug.name,
+                "quantity_dispensed": line.quantity_dispensed,
+                "unit_price_at_dispense": line.unit_price_at_dispense,
+            }
+            for line in dispense.lines.all()
+        ],
+    }
+
+
+def _bill(bill):
+    return {
+        "invoice_number": bill.invoice_number,
+        "service": bill.service,
+        "amount": bill.amount,
+        "amount_paid": bill.amount_paid,
+        "balance": bill.balance,
+        "currency": bill.currency,
+        "status": bill.status,
+    }
+
+
+# (event type, timestamp field, patient lookup, queryset, serializer); the position in this
+# tuple breaks ties between events of different types that share a timestamp
+TIMELINE_SOURCES = (
+    ("triage", "created_at", "patient_id", lambda: TriageRecord.objects.select_related("attended_by"), _triage),
+    (
+        "consultation",
+        "created_at",
+        "patient_id",
+        lambda: Consultation.objects.prefetch_related(
+            "diagnoses",
+            "prescriptions",
+            Prefetch("prescriptions__items", queryset=PrescriptionItem.objects.select_related("drug")),
+        ),
+        _consultation,
+    ),
+    (
+        "lab_request",
+        "requested_at",
+        "patient_id",
+        lambda: LabRequest.objects.select_related("investigation", "result"),
+        _lab_request,
+    ),
+    (
+        "dispense",
+        "timestamp",
+        "prescription__consultation__patient_id",
+        lambda: Dispense.objects.select_related("performed_by").prefetch_related(
+            Prefetch("lines", queryset=DispenseLine.objects.select_related("drug"))
+        ),
+        _dispense,
+    ),
+    ("bill", "created_at", "patient_id", lambda: Billing.objects.all(), _bill),
+)
+
+
+def encode_cursor(key):
+    timestamp, rank, pk = key
+    return urlsafe_b64encode(f"{timestamp.isoformat()}|{rank}|{pk}".encode()).decode()
+
+
+def decode_cursor(value):
+    """(timestamp, rank, id) from a cursor string; ValueError when it is malformed."""
+    try:
+        timestamp, rank, pk = urlsafe_b64decode(value.encode()).decode().split("|")
+        parsed = parse_datetime(timestamp)
+        if parsed is None:
+            raise ValueError
+        return parsed, int(rank), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def parse_since(value):
+    """Aware datetime from a ?since= value; ValueError when it is not an ISO-8601 timestamp."""
+    parsed = parse_datetime(value or "")
+    if parsed is None:
+        raise ValueError("since must be an ISO-8601 timestamp")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _keyset(field, rank, cursor):
+    """Rows of a source that sort after `cursor` in (timestamp, type rank, id) descending order."""
+    if cursor is None:
+        return Q()
+    timestamp, cursor_rank, pk = cursor
+    if rank < cursor_rank:
+        return Q(**{f"{field}__lte": timestamp})
+    if rank > cursor_rank:
+        return Q(**{f"{field}__lt": timestamp})
+    return Q(**{f"{field}__lt": timestamp}) | Q(**{field: timestamp, "id__lt": pk})
+
+
+def patient_timeline(patient_id, limit=TIMELINE_PAGE_SIZE, cursor=None, since=None):
+    """
+    One page of a patient's timeline, newest first.
+    Returns (events, next_cursor); each event is {"type", "id", "timestamp", "data"}.
+    """
+    streams = []
+    for rank, (event_type, field, patient_lookup, queryset, serialize) in enumerate(TIMELINE_SOURCES):
+        rows = queryset().filter(_keyset(field, rank, cursor), **{patient_lookup: patient_id})
+        if since is not None:
+            rows = rows.filter(**{f"{field}__gt": since})
+        rows = rows.order_by(f"-{field}", "-id")[: limit + 1]
+        streams.append(
+            [((getattr(row, field), rank, row.pk), event_type, row, serialize) for row in rows]
+        )
+
+    merged = list(heapq.merge(*streams, key=lambda entry: entry[0], reverse=True))[: limit + 1]
+    next_cursor = encode_cursor(merged[limit - 1][0]) if len(merged) > limit else None
+    events = [
+        {"type": event_type, "id": row.pk, "timestamp": key[0], "data": serialize(row)}
+        for key, event_type, row, serialize in merged[:limit]
+    ]
+    return events, next_cursor
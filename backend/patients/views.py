@@ -1,19 +1,50 @@
+import csv
+import io
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
-from .models import Patient
-from .serializers import PatientSerializer, PatientCreateSerializer
+from afyaaccess.pagination import KeysetPagination
+
+from .models import PATIENT_QUEUES, Patient
+from .serializers import PatientSerializer, PatientCreateSerializer, PatientMatchSerializer, PatientSearchSerializer
 from .permissions import IsReceptionOrAdmin
+from .imports import import_patients, reject_record
+from .matching import same_name_and_dob
+from .queues import astream_queue, queue_board, stream_queue
+from .search import search_patients
 from .services import register_patient, find_possible_matches
+from .timeline import TIMELINE_MAX_PAGE_SIZE, TIMELINE_PAGE_SIZE, decode_cursor, parse_since, patient_timeline
+
+
+class PatientSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients negotiate text/event-stream; only error bodies are rendered through it."""
+    media_type = "text/event-stream"
+    format = "sse"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
 
 
 class PatientViewSet(viewsets.ModelViewSet):
     queryset = Patient.objects.all().order_by("-created_at")
     serializer_class = PatientSerializer
     permission_classes = [IsAuthenticated, IsReceptionOrAdmin]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -33,51 +64,32 @@ class PatientViewSet(viewsets.ModelViewSet):
         """
         data = request.data
 
-        # ✅ DUPLICATE CHECK
-        # We'll search by national_id first (most reliable), then fall back to
-        # name + dob combination if no national_id is provided.
-        national_id = data.get("national_id")
-        first_name = data.get("first_name")
-        last_name = data.get("last_name")
-        dob = data.get("dob")
-
-        # Try to find an existing patient by national_id (if given)
-        if national_id:
-            existing = Patient.objects.filter(national_id=national_id).first()
-            if existing:
-                serialized = PatientSerializer(existing, context={"request": request})
-                return Response(
-                    {
-                        "detail": "A patient with this national ID already exists.",
-                        "patient": serialized.data,
-                    },
-                    status=status.HTTP_200_OK,  # ✅ Return existing record instead of creating new one
-                )
-
-        # Otherwise, check by name + dob (basic duplication prevention)
-        if first_name and last_name and dob:
-            existing = Patient.objects.filter(
-                first_name__iexact=first_name.strip(),
-                last_name__iexact=last_name.strip(),
-                dob=dob
-            ).first()
-            if existing:
-                serialized = PatientSerializer(existing, context={"request": request})
-                return Response(
-                    {
-                        "detail": "A patient with the same name and date of birth already exists.",
-                        "patient": serialized.data,
-                    },
-                    status=status.HTTP_200_OK,  # ✅ Return existing record instead of creating new one
-                )
-
-        # ✅ If no duplicates found, continue with normal registration
+        # ✅ DUPLICATE CHECK + REGISTRATION
+        # register_patient() runs the indexed matching engine once. The existing record is returned
+        # for the same national ID or an exact name + dob match; phonetic/fuzzy name matches are
+        # only candidates for the 409 list.
         result = register_patient(data, created_by=request.user)
+        matches = result["matches"]
+        existing, detail = None, None
+        for candidate in matches:
+            if "national_id" in candidate.match_reasons:
+                existing, detail = candidate, "A patient with this national ID already exists."
+                break
+        if existing is None:
+            for candidate in matches:
+                if same_name_and_dob(candidate, data):
+                    existing, detail = candidate, "A patient with the same name and date of birth already exists."
+                    break
+        if existing is not None:
+            serialized = PatientSerializer(existing, context={"request": request})
+            return Response(
+                {"detail": detail, "patient": serialized.data},
+                status=status.HTTP_200_OK,  # ✅ Return existing record instead of creating new one
+            )
 
         if not result["created"]:
             # return 409 Conflict with list of possible matches (serialized)
-            matches = result["matches"]
-            serialized = PatientSerializer(matches, many=True, context={"request": request})
+            serialized = PatientMatchSerializer(matches, many=True, context={"request": request})
             return Response(
                 {"detail": "Possible existing patients found.", "matches": serialized.data},
                 status=status.HTTP_409_CONFLICT,
@@ -88,6 +100,107 @@ class PatientViewSet(viewsets.ModelViewSet):
         serialized = PatientSerializer(patient, context={"request": request})
         return Response(serialized.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=["get"])
+    def timeline(self, request, pk=None):
+        """
+        GET /api/patients/<id>/timeline/?page_size=50&cursor=...&since=2025-01-01T08:00:00Z
+        Triage, consultations (diagnoses, prescriptions, items), lab requests (results),
+        dispenses (lines) and bills merged newest first, in a fixed number of queries.
+        """
+        if not Patient.objects.filter(pk=pk).exists():
+            return Response({"detail": "Patient not found."}, status=status.HTTP_404_NOT_FOUND)
+        params = request.query_params
+        try:
+            limit = min(int(params.get("page_size", TIMELINE_PAGE_SIZE)), TIMELINE_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError("page_size must be positive")
+            cursor = decode_cursor(params["cursor"]) if params.get("cursor") else None
+            since = parse_since(params["since"]) if params.get("since") else None
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        events, next_cursor = patient_timeline(pk, limit=limit, cursor=cursor, since=since)
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(request.build_absolute_uri(), "cursor", next_cursor)
+        return Response({"next": next_url, "results": events})
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"queues/(?P<department>[a-z_]+)",
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[JSONRenderer, EventStreamRenderer],
+    )
+    def queue(self, request, department=None):
+        """
+        GET /api/patients/queues/<billing|doctor|consultation|pharmacy>/
+        With `Accept: text/event-stream`: a Server-Sent Events stream of the department's queue
+        (a `snapshot` event, then `join`/`update`/`leave` events; reconnects resume from
+        Last-Event-ID). Otherwise the current queue as JSON. Served from the in-memory board
+        (patients.queues), not a query per request.
+        """
+        if department not in PATIENT_QUEUES:
+            return Response(
+                {"detail": f"Unknown department; choose from {', '.join(PATIENT_QUEUES)}."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if request.accepted_renderer.media_type != EventStreamRenderer.media_type:
+            seq, patients = queue_board.snapshot(department)
+            return Response({"department": department, "seq": seq, "patients": patients})
+
+        last_event_id = request.headers.get("Last-Event-ID")
+        last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+        # Under ASGI an idle stream holds no worker thread; WSGI needs the blocking generator
+        stream = astream_queue if isinstance(request._request, ASGIRequest) else stream_queue
+        response = StreamingHttpResponse(stream(department, last_event_id), content_type=EventStreamRenderer.media_type)
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx: flush events as they are written
+        return response
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def bulk_import(self, request):
+        """
+        Bulk registration: POST a CSV in `file` (header: first_name,last_name,gender,dob,
+        national_id,phone_number,address) or JSON {"rows": [{...}, ...]}.
+        Returns counts plus the rejected rows (reason and matched patient id).
+        """
+        upload = request.FILES.get("file")
+        if upload is not None:
+            rows = csv.DictReader(io.TextIOWrapper(upload.file, encoding="utf-8-sig"))
+        else:
+            rows = request.data.get("rows") if isinstance(request.data, dict) else request.data
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                return Response({"detail": "Provide a CSV file or a list of rows"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rejects = []
+        try:
+            summary = import_patients(
+                rows,
+                created_by=request.user,
+                on_reject=lambda *reject: rejects.append(reject_record(*reject)),
+            )
+        except (UnicodeDecodeError, csv.Error) as exc:
+            return Response({"detail": f"Unreadable CSV: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"summary": summary, "rejects": rejects}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="search")
+    def search(self, request):
+        """
+        GET /api/patients/search/?q=wanjiru kam&page_size=10
+        Ranked, paginated fuzzy/phonetic search (see patients.search); also accepts patient
+        numbers, phone numbers and national IDs.
+        """
+        q = request.query_params.get("q", "").strip()
+        if not q:
+            return Response({"detail": "provide q param (name/phone/national_id/patient number)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        queryset = search_patients(Patient.objects.order_by("-id"), q)
+        paginator = PatientSearchPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serialized = PatientSearchSerializer(page, many=True, context={"request": request})
+        return paginator.get_paginated_response(serialized.data)
+
     @action(detail=False, methods=["get"], url_path="matches")
     def matches(self, request):
         """
@@ -98,9 +211,13 @@ class PatientViewSet(viewsets.ModelViewSet):
         if not q:
             return Response({"detail": "provide q param (phone/national_id/name)"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Try to interpret q: phone or national id or name
-        # Very simple heuristics; your frontend can call more structured endpoint.
+        # Names (and alphanumeric IDs, matched exactly there) go through the fuzzy/phonetic search;
+        # numeric identifiers through the matching engine
+        if any(ch.isalpha() for ch in q):
+            matches = search_patients(Patient.objects.all(), q)[:10]
+            serialized = PatientSearchSerializer(matches, many=True, context={"request": request})
+            return Response(serialized.data)
         data = {"phone_number": q, "national_id": q}
         matches = find_possible_matches(data)
-        serialized = PatientSerializer(matches, many=True, context={"request": request})
+        serialized = PatientMatchSerializer(matches, many=True, context={"request": request})
         return Response(serialized.data)
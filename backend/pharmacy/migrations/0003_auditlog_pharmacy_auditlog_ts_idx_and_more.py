@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultation", "0007_consultation_consultation_created_idx"),
+        ("pharmacy", "0002_alter_dispenseline_quantity_dispensed_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["-timestamp", "-id"], name="pharmacy_auditlog_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dispense",
+            index=models.Index(
+                fields=["-timestamp", "-id"], name="pharmacy_dispense_ts_idx"
+            ),
+        ),
+    ]
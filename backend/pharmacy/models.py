@@ -57,6 +57,12 @@ class Dispense(models.Model):
     # When the dispense happened
     timestamp = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the dispense list (newest first)
+            models.Index(fields=["-timestamp", "-id"], name="pharmacy_dispense_ts_idx"),
+        ]
+
     def __str__(self):
         return f"Dispense #{self.id} for Prescription #{self.prescription_id}"
 
@@ -116,6 +122,12 @@ class AuditLog(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)  # when it happened
     details = models.JSONField(default=dict)  # extra info in JSON format
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the audit trail (newest first)
+            models.Index(fields=["-timestamp", "-id"], name="pharmacy_auditlog_ts_idx"),
+        ]
+
     def __str__(self):
         return f"{self.action} by {self.user} at {self.timestamp}"
 
@@ -1,3 +1,36 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .models import AuditLog
+
+User = get_user_model()
+
+
+class AuditLogCursorPaginationTests(APITestCase):
+    """High-volume lists page by cursor: stable pages, and deep pages cost the same as page 1."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        AuditLog.objects.bulk_create(
+            [AuditLog(user=self.user, action=AuditLog.ACTION_DISPENSE_CONFIRMED, details={"n": i}) for i in range(7)]
+        )
+
+    def test_walk_all_pages(self):
+        url = reverse("pharmacy-auditlog-list")
+        seen, queries = [], []
+        params = {"page_size": 3}
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(url, params)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            seen += [row["id"] for row in resp.data["results"]]
+            queries.append(len(ctx))
+            url, params = resp.data["next"], None
+        self.assertEqual(sorted(seen), sorted(AuditLog.objects.values_list("id", flat=True)))
+        self.assertEqual(len(set(seen)), 7)
+        self.assertEqual(len(set(queries)), 1)
@@ -1,5 +1,7 @@
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
+
+from afyaaccess.pagination import KeysetPagination
 from .models import Drug, Dispense, AuditLog
 from .serializers import DrugSerializer, DispenseSerializer, AuditLogSerializer
 
@@ -22,6 +24,8 @@ class DispenseViewSet(viewsets.ModelViewSet):
     queryset = Dispense.objects.all().order_by("-timestamp") # most recent first
     serializer_class = DispenseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-timestamp", "-id")
 
 
 # ViewSet for Audit Logs
@@ -29,6 +33,8 @@ class AuditLogViewSet(viewsets.ModelViewSet):
     """
     Handles CRUD operations for pharmacy audit logs.
     """
-    queryset = AuditLog.objects.all().order_by("-timestamp")
+    queryset = AuditLog.objects.select_related("user").order_by("-timestamp")
     serializer_class = AuditLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-timestamp", "-id")
@@ -1,3 +1,55 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from billing.models import Billing
+from patients.models import Patient
+
+User = get_user_model()
+
+
+class BillingAgingReportTests(APITestCase):
+    """Outstanding balances land in the right age bucket, in one grouped query."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="a@a.com", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("reports:billing-aging")
+        self.jane = Patient.objects.create(first_name="Jane", last_name="Doe")
+        self.john = Patient.objects.create(first_name="John", last_name="Doe")
+        now = timezone.now()
+        for patient, service, age in ((self.jane, "consultation", 5), (self.jane, "laboratory", 45),
+                                      (self.john, "consultation", 75), (self.john, "imaging", 200)):
+            bill = Billing.objects.create(patient=patient, service=service)
+            Billing.objects.filter(pk=bill.pk).update(created_at=now - timedelta(days=age))
+        partly = Billing.objects.create(patient=self.jane, service="other", amount=Decimal("300.00"))
+        partly.create_payment(amount="100", user=self.user)
+        Billing.objects.create(patient=self.john, service="consultation").cancel(reason="duplicate")
+
+    def test_by_patient_is_paginated(self):
+        with self.assertNumQueries(2):  # count + page
+            resp = self.client.get(self.url, {"page_size": 1})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["count"], 2)
+        top = resp.data["results"][0]
+        self.assertEqual(top["patient_id"], self.john.pk)
+        self.assertEqual(top["days_61_90"], Decimal("1000.00"))
+        self.assertEqual(top["days_90_plus"], Decimal("3000.00"))
+
+    def test_by_service_buckets(self):
+        resp = self.client.get(self.url, {"group_by": "service"})
+        rows = {row["service"]: row for row in resp.data["results"]}
+        self.assertEqual(rows["consultation"]["days_0_30"], Decimal("1000.00"))
+        self.assertEqual(rows["consultation"]["days_61_90"], Decimal("1000.00"))
+        self.assertEqual(rows["laboratory"]["days_31_60"], Decimal("1200.00"))
+        self.assertEqual(rows["other"]["total"], Decimal("200.00"))
+        self.assertEqual(sum(row["bill_count"] for row in rows.values()), 5)
+
+    def test_bad_params(self):
+        self.assertEqual(self.client.get(self.url, {"group_by": "payer"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"as_of": "today"}).status_code, status.HTTP_400_BAD_REQUEST)
@@ -12,6 +12,8 @@ urlpatterns = [
     path("patients/", views.PatientReportView.as_view(), name="patient-report"),
     # Billing-specific reporting
     path("billing/", views.BillingReportView.as_view(), name="billing-report"),
+    # Accounts-receivable aging (outstanding balances by age bucket)
+    path("billing/aging/", views.BillingAgingView.as_view(), name="billing-aging"),
     # Consultations-specific reporting
     path("consultations/", views.ConsultationReportView.as_view(), name="consultation-report"),
     # Triage-specific reporting
@@ -1,12 +1,17 @@
 # reports/views.py
+from decimal import Decimal
+
+from django.utils.dateparse import parse_date
+from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
 
 # Import models from other apps to gather report data
 from users.models import User
 from patients.models import Patient
-from billing.models import Billing
+from billing.models import AGING_BUCKETS, Billing, BillingDailyRollup
 from consultation.models import Consultation
 from triage.models import TriageRecord 
 
@@ -42,19 +47,78 @@ class PatientReportView(APIView):
         return Response(data)
 
 
-# Returns billing summary (paid vs unpaid bills)
+# Returns billing summary (paid vs unpaid bills) from the daily rollup table
 class BillingReportView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        data = {
-            "total_bills": Billing.objects.count(),
-            "paid_bills": Billing.objects.filter(is_paid=True).count(),
-            "unpaid_bills": Billing.objects.filter(is_paid=False).count(),
-        }
+        # Optional inclusive day range: ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+        filters = {}
+        for name in ("date_from", "date_to"):
+            raw = request.query_params.get(name)
+            if raw:
+                filters[name] = parse_date(raw)
+                if filters[name] is None:
+                    return Response({"detail": f"{name} must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rollups = BillingDailyRollup.objects.report_filter(**filters)
+        data = rollups.bill_counts()
+        summary = rollups.report_summary()
+        data.update(
+            {
+                "total_billed": sum((row["total"] for row in summary["by_service"]), Decimal("0.00")),
+                "total_collected": summary["total_collected"],
+                "total_outstanding": summary["total_outstanding"],
+            }
+        )
         return Response(data)
 
 
+# Pagination for the aging report when grouped by patient
+class AgingPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+# Returns outstanding balances bucketed by age (0-30, 31-60, 61-90, 90+ days)
+class BillingAgingView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # ?group_by= value -> grouping columns (currency always included so amounts never mix)
+    GROUPINGS = {
+        "patient": ("patient_id", "patient_name", "currency"),
+        "service": ("service", "currency"),
+        "currency": ("currency",),
+    }
+
+    def get(self, request, *args, **kwargs):
+        """
+        One grouped query per request: ?group_by=patient (default, paginated) | service | currency,
+        optional ?as_of=YYYY-MM-DD, ?service=, ?currency=.
+        """
+        params = request.query_params
+        group_by = params.get("group_by", "patient")
+        if group_by not in self.GROUPINGS:
+            return Response(
+                {"detail": f"group_by must be one of {', '.join(self.GROUPINGS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        raw = params.get("as_of")
+        as_of = parse_date(raw) if raw else None
+        if raw and as_of is None:
+            return Response({"detail": "as_of must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        bills = Billing.objects.report_filter(service=params.get("service"), currency=params.get("currency"))
+        rows = bills.aging(*self.GROUPINGS[group_by], as_of=as_of)
+        if group_by != "patient":
+            return Response({"buckets": [name for name, _low, _high in AGING_BUCKETS], "results": list(rows)})
+
+        paginator = AgingPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(page)
+
+
 # Returns statistics about consultations
 class ConsultationReportView(APIView):
     permission_classes = [IsAuthenticated]
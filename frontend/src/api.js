@@ -44,10 +44,11 @@ export async function createPatient(patientObj) {
   return res.json();
 }
 
-// GET all patients
-export async function fetchPatients() {
+// GET one page of patients: { next, previous, results }
+// pass the previous page's `next` URL to fetch the following page
+export async function fetchPatients(pageUrl = `${API_URL}/patients/`) {
   const token = localStorage.getItem("token");
-  const res = await fetch(`${API_URL}/patients/`, {
+  const res = await fetch(pageUrl, {
     headers: {
       ...(token ? { Authorization: `Bearer ${token}` } : {}),
     },
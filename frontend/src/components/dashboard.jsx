@@ -19,6 +19,7 @@ const STATUS_ORDER = ["billing", "consultation", "lab", "done"];
 
 export default function Dashboard() {
   const [patients, setPatients] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
   const [loading, setLoading] = useState(true);
   const [msg, setMsg] = useState("");
 
@@ -26,11 +27,14 @@ export default function Dashboard() {
     loadPatients();
   }, []);
 
-  async function loadPatients() {
+  // first page, or the page after the ones already shown when given its `next` URL
+  async function loadPatients(pageUrl) {
     try {
       setLoading(true);
-      const data = await fetchPatients();
-      setPatients(Array.isArray(data) ? data : []);
+      const data = await fetchPatients(pageUrl);
+      const results = Array.isArray(data?.results) ? data.results : [];
+      setPatients(prev => (pageUrl ? [...prev, ...results] : results));
+      setNextPage(data?.next || null);
       setLoading(false);
     } catch (err) {
       setLoading(false);
@@ -55,7 +59,7 @@ export default function Dashboard() {
     }
   }
 
-  if (loading) return <div className="container card">Loading...</div>;
+  if (loading && patients.length === 0) return <div className="container card">Loading...</div>;
 
   return (
       <div className="container">
@@ -90,6 +94,12 @@ export default function Dashboard() {
           </div>
         ))}
       </div>
+
+      {nextPage && (
+        <button className="btn" disabled={loading} onClick={() => loadPatients(nextPage)}>
+          {loading ? "Loading..." : "Load more"}
+        </button>
+      )}
     </div>
   );
 }